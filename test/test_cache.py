@@ -0,0 +1,106 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/13 14:10
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for cache.py KvCache
+"""
+
+import time
+import unittest
+
+from tlib.cache import KvCache
+
+
+class TestKvCache(unittest.TestCase):
+    def test_get_set_delete(self):
+        cache = KvCache()
+        cache.set({'a': 1, 'b': 2})
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, 2, None))
+        self.assertTrue(cache.delete('a'))
+        self.assertFalse(cache.delete('a'))
+        self.assertIsNone(cache.get('a'))
+        counters = cache.counters()
+        self.assertEqual((counters['hits'], counters['misses'], counters['items']), (2, 2, 1))
+
+    def test_lru_eviction_order(self):
+        cache = KvCache(max_items=3, policy='lru')
+        cache.set({'a': 1})
+        cache.set({'b': 2})
+        cache.set({'c': 3})
+        cache.get('a')  # b is the least recently used now
+        cache.set({'d': 4})
+        self.assertIsNone(cache.get('b'))
+        cache.set({'e': 5})  # c is next
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual([cache.get(k) for k in 'ade'], [1, 4, 5])
+        self.assertEqual(cache.counters()['evictions'], 2)
+
+    def test_lfu_eviction_order(self):
+        cache = KvCache(max_items=3, policy='lfu')
+        cache.set({'a': 1})
+        cache.set({'b': 2})
+        cache.set({'c': 3})
+        for _ in range(3):
+            cache.get('a')
+        cache.get('c')
+        cache.set({'d': 4})  # b used least
+        self.assertIsNone(cache.get('b'))
+        cache.get('d')
+        cache.set({'e': 5})  # c and d used as often, c less recently
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual([cache.get(k) for k in 'ade'], [1, 4, 5])
+
+    def test_max_bytes(self):
+        cache = KvCache(max_bytes=10, size_func=len)
+        cache.set({'a': 'x' * 4, 'b': 'x' * 4})
+        cache.set({'c': 'x' * 4})
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.counters()['bytes'], 8)
+
+    def test_expire(self):
+        cache = KvCache()
+        cache.set({'a': 1}, expire_sec=0.1)
+        cache.set({'b': 2}, expire_sec=60)
+        cache.set({'c': 3})
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.2)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stat(), (3, 1))
+        self.assertEqual(list(cache.get_expired()), ['a'])
+        self.assertEqual(cache.cleanup_expired(), ['a'])
+        self.assertEqual(cache.stat(), (2, 0))
+        self.assertEqual((cache.get('b'), cache.get('c')), (2, 3))
+
+    def test_expired_evicted_first(self):
+        cache = KvCache(max_items=2)
+        cache.set({'a': 1})
+        cache.set({'b': 2}, expire_sec=0.1)
+        cache.get('a')
+        cache.get('b')
+        time.sleep(0.2)
+        cache.set({'c': 3})  # b expired, a is kept although least recently used
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(cache.counters()['expired'], 1)
+
+    def test_update_expire(self):
+        cache = KvCache()
+        cache.set({'a': 1}, expire_sec=0.1)
+        cache.set({'a': 2}, expire_sec=60)
+        time.sleep(0.2)
+        self.assertEqual(cache.cleanup_expired(), [])
+        self.assertEqual(cache.get('a'), 2)
+
+    def test_expire_heap_bounded(self):
+        for cache in (KvCache(), KvCache(max_items=1000)):
+            for i in range(10000):
+                cache.set({'k': i}, expire_sec=60)
+            self.assertEqual(cache.get('k'), 9999)
+            # one live key, the stale entries are compacted on insert
+            self.assertLessEqual(len(cache._expire_heap), 2 + 64 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/10 16:10
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for decorators.py Memoize
+"""
+
+import gc
+import weakref
+import unittest
+
+from tlib import decorators
+
+
+class Api(object):
+    def __init__(self):
+        self.calls = 0
+        self.ip = None
+
+    @decorators.Memoize(expire_sec=300)
+    def get_ip(self, name):
+        self.calls += 1
+        return self.ip
+
+    @decorators.Memoize(expire_sec=300, cache_none=True)
+    def get_ip_cache_none(self, name):
+        self.calls += 1
+        return self.ip
+
+    @decorators.Memoize(expire_sec=300)
+    def get_ips(self, names, options=None):
+        self.calls += 1
+        return list(names)
+
+
+class Unhashable(object):
+    __hash__ = None
+
+
+class TestMemoize(unittest.TestCase):
+    def test_none_not_cached(self):
+        api = Api()
+        self.assertIsNone(api.get_ip('node1'))
+        api.ip = '10.0.0.1'
+        self.assertEqual(api.get_ip('node1'), '10.0.0.1')
+        self.assertEqual(api.get_ip('node1'), '10.0.0.1')
+        self.assertEqual(api.calls, 2)
+
+    def test_cache_none(self):
+        api = Api()
+        self.assertIsNone(api.get_ip_cache_none('node1'))
+        api.ip = '10.0.0.1'
+        self.assertIsNone(api.get_ip_cache_none('node1'))
+        self.assertEqual(api.calls, 1)
+
+    def test_cache_delete(self):
+        api = Api()
+        api.ip = '10.0.0.1'
+        api.get_ip('node1')
+        api.ip = '10.0.0.2'
+        self.assertEqual(api.get_ip('node1'), '10.0.0.1')
+        self.assertTrue(api.get_ip.cache_delete(api, 'node1'))
+        self.assertEqual(api.get_ip('node1'), '10.0.0.2')
+
+    def test_instance_not_kept_alive(self):
+        api = Api()
+        api.ip = '10.0.0.1'
+        api.get_ip('node1')
+        api_ref = weakref.ref(api)
+        del api
+        gc.collect()
+        self.assertIsNone(api_ref())
+        other = Api()
+        self.assertIsNone(other.get_ip('node1'))
+
+    def test_unhashable_args(self):
+        api = Api()
+        for _ in range(5):
+            self.assertEqual(api.get_ips(['node1', 'node2'], options={'type': ['ExternalIP']}),
+                             ['node1', 'node2'])
+        self.assertEqual(api.calls, 1)
+        api.get_ips(('node1', 'node2'), options={'type': ['ExternalIP']})
+        api.get_ips(['node1', 'node2'], options={'type': ['InternalIP']})
+        self.assertEqual(api.calls, 3)
+        self.assertTrue(api.get_ips.cache_delete(api, ['node1', 'node2'], options={'type': ['ExternalIP']}))
+
+    def test_not_keyed_bypass(self):
+        api = Api()
+        api.get_ips([Unhashable()])
+        api.get_ips([Unhashable()])
+        self.assertEqual(api.calls, 2)
+        self.assertFalse(api.get_ips.cache_delete(api, [Unhashable()]))
+
+    def test_reused_address(self):
+        # instances freed one after another, their ids are often reused
+        for n in range(20):
+            api = Api()
+            api.ip = n
+            self.assertEqual(api.get_ip('node1'), n)
+            api.get_ips(['node1'])
+            # a new instance never hits the results of a dead one
+            self.assertEqual(api.calls, 2)
+            del api
+
+
+if __name__ == '__main__':
+    unittest.main()
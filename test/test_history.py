@@ -0,0 +1,106 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/14 10:20
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for stressrunner/history.py RegressionComparator and HistoryStore
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from tlib.stressrunner import sinks
+from tlib.stressrunner.history import HistoryStore, RegressionComparator, lower_is_better, median_durations
+
+
+class TestLowerIsBetter(unittest.TestCase):
+    def test_lower(self):
+        for metric in ('duration', 'time_mean_ms', 'read_time_p99_ms', 'p99_latency', 'elapsed', 'rebuild_s'):
+            self.assertTrue(lower_is_better(metric), metric)
+
+    def test_higher(self):
+        # the benchmark name is a prefix, the unit suffix decides
+        for metric in ('read_latency_ops_per_s', 'read_latency_mb_per_s', 'write_mb_per_s', 'iops',
+                       'time_series_throughput', 'hit_ratio'):
+            self.assertFalse(lower_is_better(metric), metric)
+
+
+class TestRegressionComparator(unittest.TestCase):
+    def setUp(self):
+        self.comparator = RegressionComparator({
+            ('tc', 'duration'): [10.0, 10.2, 9.8, 10.1, 9.9],
+            ('tc', 'read_latency_mb_per_s'): [100.0, 102.0, 98.0, 101.0, 99.0],
+            ('tc', 'few'): [1.0, 1.0],
+        }, min_runs=3, mad_k=3.0, min_delta=0.1)
+
+    def test_lower_is_better(self):
+        self.assertTrue(self.comparator.compare('tc', 'duration', 12.0)['regression'])
+        self.assertFalse(self.comparator.compare('tc', 'duration', 10.5)['regression'])
+        # faster is never a regression
+        self.assertFalse(self.comparator.compare('tc', 'duration', 5.0)['regression'])
+
+    def test_higher_is_better(self):
+        result = self.comparator.compare('tc', 'read_latency_mb_per_s', 80.0)
+        self.assertTrue(result['regression'])
+        self.assertAlmostEqual(result['delta'], -0.2)
+        self.assertFalse(self.comparator.compare('tc', 'read_latency_mb_per_s', 95.0)['regression'])
+        self.assertFalse(self.comparator.compare('tc', 'read_latency_mb_per_s', 150.0)['regression'])
+
+    def test_not_enough_history(self):
+        self.assertIsNone(self.comparator.compare('tc', 'few', 100.0))
+        self.assertIsNone(self.comparator.compare('other', 'duration', 100.0))
+        self.assertIsNone(self.comparator.compare('tc', 'duration', None))
+
+    def test_compare_case(self):
+        results = self.comparator.compare_case('tc', 12.0, {'read_latency_mb_per_s': 150.0, 'new_metric': 1.0})
+        self.assertEqual([(r['metric'], r['regression']) for r in results],
+                         [('duration', True), ('read_latency_mb_per_s', False)])
+        self.assertEqual(list(self.comparator.regressions), [('tc', 'duration')])
+
+    def test_median_durations(self):
+        self.assertEqual(median_durations({('tc', 'duration'): [3, 1, 2], ('tc', 'x_ms'): [5]}), {'tc': 2})
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = HistoryStore(os.path.join(self.tmp_dir, 'history.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_save_load(self):
+        for run in range(3):
+            self.store.save_run('run{0}'.format(run), '1.0', 'suite', [
+                dict(test='tc', **{'pass': 1, 'duration_avg': 10.0 + run, 'metrics': {'x_per_s': run}}),
+                dict(test='failed', **{'pass': 0, 'duration_avg': 1.0})])
+        baseline = self.store.load_baseline('suite', last_runs=2)
+        self.assertEqual(sorted(baseline), [('tc', 'duration'), ('tc', 'x_per_s')])
+        self.assertEqual(sorted(baseline[('tc', 'duration')]), [11.0, 12.0])
+        self.assertEqual(self.store.load_baseline('other'), {})
+
+    def test_connection_closed(self):
+        closed = []
+        real_close_db = sinks.close_db
+
+        def close_db(db_obj):
+            conn = db_obj.conn
+            real_close_db(db_obj)
+            closed.append(conn)
+
+        with mock.patch('tlib.stressrunner.history.close_db', close_db):
+            self.store.save_run('run', '1.0', 'suite', [dict(test='tc', **{'pass': 1, 'duration_avg': 1.0})])
+            self.store.load_baseline('suite')
+        self.assertEqual(len(closed), 2)
+        for conn in closed:
+            self.assertRaises(sqlite3.ProgrammingError, conn.cursor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/10 11:05
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for stressrunner/loader.py
+"""
+
+import os
+import shutil
+import argparse
+import tempfile
+import unittest
+
+from tlib.stressrunner import StressRunner
+from tlib.stressrunner.loader import get_case_id, build_case, rebuild_case, is_rebuildable
+
+
+def check_function():
+    assert True
+
+
+class MethodCase(unittest.TestCase):
+    def test_method(self):
+        pass
+
+
+class ParamCase(unittest.TestCase):
+    """A parametrized case with a custom __init__"""
+
+    def __init__(self, method_name='runTest', value=0):
+        super(ParamCase, self).__init__(method_name)
+        self.value = value
+
+    def runTest(self):
+        self.assertGreaterEqual(self.value, 0)
+
+
+class TestLoader(unittest.TestCase):
+    def test_method_case(self):
+        case = MethodCase('test_method')
+        self.assertTrue(is_rebuildable(case))
+        new_case = build_case(get_case_id(case))
+        self.assertIsInstance(new_case, MethodCase)
+        self.assertEqual(new_case._testMethodName, 'test_method')
+        self.assertIsNot(rebuild_case(case), case)
+
+    def test_function_case(self):
+        case = unittest.FunctionTestCase(check_function)
+        self.assertFalse(is_rebuildable(case))
+        for new_case in (rebuild_case(case), build_case(get_case_id(case), case)):
+            self.assertIsNot(new_case, case)
+            self.assertEqual(new_case.id(), case.id())
+            self.assertTrue(unittest.TestSuite([new_case]).run(unittest.TestResult()).wasSuccessful())
+        self.assertRaises(Exception, build_case, get_case_id(case))
+
+    def test_custom_init_case(self):
+        case = ParamCase(value=3)
+        self.assertFalse(is_rebuildable(case))
+        for new_case in (rebuild_case(case), build_case(get_case_id(case), case)):
+            self.assertIsNot(new_case, case)
+            self.assertEqual(new_case.value, 3)
+            self.assertTrue(unittest.TestSuite([new_case]).run(unittest.TestResult()).wasSuccessful())
+
+    def test_runner(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for workers in (1, 2):
+                suite = unittest.TestSuite([unittest.FunctionTestCase(check_function), ParamCase(value=1),
+                                            MethodCase('test_method')])
+                runner = StressRunner(report_path=os.path.join(tmp_dir, 'report.html'), title='test_loader',
+                                      user_args=argparse.Namespace(project='tlib', suite='test'), workers=workers)
+                result, status = runner.run(suite)
+                self.assertEqual(status, 'PASSED', 'workers={0}'.format(workers))
+                self.assertEqual(result.success_count, 3, 'workers={0}'.format(workers))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/10 14:30
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for fileop/metadata_ops.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tlib.fileop.metadata_ops import MetadataOps
+from tlib.fileop.namespace_index import NamespaceIndex
+
+
+class TestMetadataOps(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.files = []
+        for n in range(10):
+            path = os.path.join(self.tmp_dir, 'file_{0}.dat'.format(n))
+            open(path, 'w').close()
+            self.files.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_rename(self):
+        pairs = [(path, path + '.new') for path in self.files]
+        result = MetadataOps(workers=4, batch_size=3).rename(pairs)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.outputs, [new_path for _, new_path in pairs])
+        self.assertEqual(result.histogram.total_count, len(pairs))
+        self.assertTrue(all(os.path.exists(new_path) for _, new_path in pairs))
+
+    def test_failures_collected(self):
+        missing = os.path.join(self.tmp_dir, 'missing.dat')
+        result = MetadataOps(workers=4, batch_size=3).delete(self.files[:5] + [missing] + self.files[5:])
+        self.assertEqual((result.total, result.succeeded), (11, 10))
+        self.assertEqual([path for path, _ in result.failures], [missing])
+        self.assertIsInstance(result.failures[0][1], OSError)
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+        self.assertTrue(MetadataOps().delete([missing], missing_ok=True).ok)
+
+    def test_non_os_errors_collected(self):
+        def _op(path):
+            if path.endswith('file_3.dat'):
+                raise ValueError('bad path')
+            return path
+
+        result = MetadataOps(workers=2, batch_size=2).run('check', _op, self.files)
+        self.assertEqual(result.succeeded, 9)
+        self.assertIsInstance(result.failures[0][1], ValueError)
+
+    def test_index_updated(self):
+        index = NamespaceIndex.from_scan(self.tmp_dir)
+        ops = MetadataOps(workers=4, index=index)
+        ops.rename([(self.files[0], self.files[0] + '.new')])
+        ops.delete(self.files[1:])
+        self.assertEqual(index.listdir(self.tmp_dir), ['file_0.dat.new'])
+
+    def test_rate_limit(self):
+        result = MetadataOps(workers=4, ops_per_s=100).touch(self.files)
+        self.assertTrue(result.ok)
+        self.assertGreaterEqual(result.elapsed, 0.08)
+
+
+if __name__ == '__main__':
+    unittest.main()
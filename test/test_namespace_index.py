@@ -0,0 +1,105 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/13 16:40
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for fileop/namespace_index.py
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from tlib.fileop.namespace_index import NamespaceIndex
+from tlib.fileop.tree_generator import TreeSpec, TreeGenerator
+
+
+class TestNamespaceIndex(unittest.TestCase):
+    def setUp(self):
+        self.root = os.path.join(tempfile.gettempdir(), 'ns_root')
+        self.index = NamespaceIndex(self.root)
+        self.path = lambda *parts: os.path.join(self.root, *parts)
+
+    def test_add_exists(self):
+        self.index.add(self.path('d1', 'd2', 'f1'))
+        self.assertTrue(self.index.exists(self.path('d1', 'd2', 'f1')))
+        self.assertTrue(self.index.is_file(self.path('d1', 'd2', 'f1')))
+        # the missing parents are added as dirs
+        self.assertTrue(self.index.is_dir(self.path('d1', 'd2')))
+        self.assertIn(self.path('d1'), self.index)
+        self.assertFalse(self.index.exists(self.path('d1', 'f1')))
+        self.assertFalse(self.index.exists(self.path('d1', 'd2', 'f1', 'x')))
+        self.assertFalse(self.index.exists('/out/of/root'))
+        self.assertEqual((self.index.dir_count, self.index.file_count, len(self.index)), (2, 1, 3))
+        # added twice, counted once
+        self.index.add(self.path('d1', 'd2', 'f1'))
+        self.assertEqual(len(self.index), 3)
+
+    def test_remove(self):
+        self.index.add(self.path('d1', 'f1'))
+        self.index.add(self.path('d1', 'd2', 'f2'))
+        self.index.add(self.path('f3'))
+        self.assertTrue(self.index.remove(self.path('f3')))
+        self.assertFalse(self.index.remove(self.path('f3')))
+        self.assertTrue(self.index.remove(self.path('d1')))
+        self.assertFalse(self.index.exists(self.path('d1', 'd2', 'f2')))
+        self.assertEqual(len(self.index), 0)
+
+    def test_rename(self):
+        self.index.add(self.path('d1', 'f1'))
+        self.index.add(self.path('d1', 'd2', 'f2'))
+        self.index.add(self.path('d3', 'f4'))
+        self.assertTrue(self.index.rename(self.path('d1', 'f1'), self.path('d1', 'f1.new')))
+        self.assertEqual(self.index.listdir(self.path('d1')), ['d2', 'f1.new'])
+        # a dir moves with its sub tree
+        self.assertTrue(self.index.rename(self.path('d1'), self.path('d3', 'd1')))
+        self.assertFalse(self.index.exists(self.path('d1')))
+        self.assertTrue(self.index.is_file(self.path('d3', 'd1', 'd2', 'f2')))
+        self.assertEqual((self.index.dir_count, self.index.file_count), (3, 3))
+        # an existing target is replaced like os.rename
+        self.assertTrue(self.index.rename(self.path('d3', 'f4'), self.path('d3', 'd1', 'f1.new')))
+        self.assertEqual((self.index.dir_count, self.index.file_count), (3, 2))
+        self.assertEqual(self.index.list(self.path('d3')), [
+            self.path('d3', 'd1'), self.path('d3', 'd1', 'd2'), self.path('d3', 'd1', 'd2', 'f2'),
+            self.path('d3', 'd1', 'f1.new')])
+        self.assertEqual(self.index.depth(self.path('d3', 'd1', 'd2', 'f2')), 4)
+        self.assertEqual(self.index.depth(self.path('d3', 'd1', 'd2', 'f2'), self.path('d3')), 3)
+
+    def test_listdir_not_indexed(self):
+        self.index.add(self.path('f1'))
+        self.assertRaises(Exception, self.index.listdir, self.path('d1'))
+        self.assertRaises(Exception, self.index.listdir, self.path('f1'))
+
+    def test_random_path(self):
+        for n in range(5):
+            self.index.add(self.path('d{0}'.format(n), 'f{0}'.format(n)))
+        rng = random.Random(1)
+        for _ in range(20):
+            self.assertTrue(self.index.is_file(self.index.random_path(dirs=False, rng=rng)))
+            self.assertTrue(self.index.is_dir(self.index.random_path(files=False, rng=rng)))
+
+
+class TestNamespaceIndexLoad(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp_dir, 'tree')
+        spec = TreeSpec(depth=2, fan_out=2, files_per_dir=2, size=10)
+        self.summary = TreeGenerator(spec, workers=4).generate(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_scan_and_manifest(self):
+        scanned = NamespaceIndex.from_scan(self.root, workers=4)
+        loaded = NamespaceIndex.from_manifest(self.root, self.summary['manifest'])
+        self.assertEqual((scanned.dir_count, scanned.file_count), (6, 14))
+        self.assertEqual((loaded.dir_count, loaded.file_count), (6, 14))
+        self.assertEqual(scanned.list(self.root), loaded.list(self.root))
+
+
+if __name__ == '__main__':
+    unittest.main()
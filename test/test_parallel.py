@@ -0,0 +1,91 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/10 10:20
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for stressrunner/parallel.py
+"""
+
+import os
+import shutil
+import argparse
+import tempfile
+import unittest
+
+from tlib.stressrunner import StressRunner
+
+
+class ClassFixtureCase(unittest.TestCase):
+    """setUpClass must run again for each case after tearDownClass"""
+    ready = False
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ready = True
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ready = False
+
+    def test_1(self):
+        self.assertTrue(self.ready)
+
+    def test_2(self):
+        self.assertTrue(self.ready)
+
+    def test_3(self):
+        self.assertTrue(self.ready)
+
+    def test_4(self):
+        self.assertTrue(self.ready)
+
+
+class BigRecordCase(unittest.TestCase):
+    """the records fill the result queue pipe if nobody reads them"""
+    __test__ = False  # run by TestParallel only
+
+    def test_1(self):
+        self.fail('x' * 256 * 1024)
+
+    def test_2(self):
+        self.fail('x' * 256 * 1024)
+
+
+class TestParallel(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def run_suite(self, workers):
+        suite = unittest.TestLoader().loadTestsFromTestCase(ClassFixtureCase)
+        runner = StressRunner(report_path=os.path.join(self.tmp_dir, 'report.html'), title='test_parallel',
+                              user_args=argparse.Namespace(project='tlib', suite='test'), workers=workers)
+        return runner.run(suite)
+
+    def test_class_fixtures(self):
+        for workers in (1, 2):
+            result, status = self.run_suite(workers)
+            self.assertEqual(status, 'PASSED', 'workers={0}'.format(workers))
+            self.assertEqual((result.success_count, result.failure_count), (4, 0), 'workers={0}'.format(workers))
+
+    def test_stop_on_error(self):
+        # a case which can't be sent to the workers fails the iteration while
+        # tasks are queued, the workers are terminated instead of draining them
+        suite = unittest.TestLoader().loadTestsFromTestCase(BigRecordCase)
+        suite.addTest(unittest.FunctionTestCase(lambda: None))
+        suite.addTests(unittest.TestLoader().loadTestsFromTestCase(BigRecordCase))
+        runner = StressRunner(report_path=os.path.join(self.tmp_dir, 'report.html'), title='test_parallel',
+                              user_args=argparse.Namespace(project='tlib', suite='test'), workers=2)
+        rtn = runner.run(suite)
+        # no record was merged, run() returns the result only
+        result = rtn[0] if isinstance(rtn, tuple) else rtn
+        self.assertEqual(result.failure_count, 0)
+        self.assertEqual(result.success_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
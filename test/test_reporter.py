@@ -0,0 +1,124 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/14 14:30
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for stressrunner/reporter.py, CaseStats and the capture OutputSpool
+"""
+
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from tlib.stressrunner.capture import OutputSpool
+from tlib.stressrunner.reporter import CaseStats, IncrementalReporter, JSONL_OUTPUT_LIMIT, PASS_ELAPSED_WINDOW
+
+
+class SampleCase(unittest.TestCase):
+    def runTest(self):
+        pass
+
+
+class TestOutputSpool(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_iter_text(self):
+        spool = OutputSpool(max_memory=1024, spool_dir=self.tmp_dir)
+        text = u'中' * 1000 + 'end'  # multi bytes chars across the chunks
+        spool.write(text)
+        spool.finish()
+        self.assertTrue(spool.path)
+        self.assertEqual(''.join(spool.iter_text(chunk_size=100)), text)
+        self.assertEqual(spool.head(4), (u'中', True))
+        spool.cleanup()
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    def test_pickle(self):
+        for size in (10, 4096):
+            spool = OutputSpool(max_memory=1024, spool_dir=self.tmp_dir)
+            spool.write('x' * size)
+            copied = pickle.loads(pickle.dumps(spool))
+            self.assertEqual(copied.read(), 'x' * size)
+            copied.write('y')
+            self.assertEqual(len(copied), size + 1)
+            copied.cleanup()
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+
+class TestCaseStats(unittest.TestCase):
+    def test_pass_elapsed(self):
+        stats = CaseStats('tc')
+        for elapsed, status in (('0:00:01', 0), ('0:00:02', 0), ('0:01:40', 0), ('0:00:50', 1)):
+            stats.add(status, elapsed, 1)
+        self.assertEqual((stats.pass_elapsed_median, stats.pass_elapsed_avg), (2, 103.0 / 3))
+        self.assertEqual(CaseStats('tc').pass_elapsed_median, 0)
+
+    def test_pass_elapsed_window(self):
+        stats = CaseStats('tc')
+        for _ in range(PASS_ELAPSED_WINDOW):
+            stats.add(0, '0:01:00', 1)
+        for _ in range(PASS_ELAPSED_WINDOW // 2 + 1):
+            stats.add(0, '0:00:01', 2)
+        self.assertEqual(len(stats.pass_elapsed_recent), PASS_ELAPSED_WINDOW)
+        self.assertEqual(stats.pass_elapsed_median, 1)
+        self.assertEqual(pickle.loads(pickle.dumps(stats)).pass_elapsed_median, 1)
+
+
+class TestIncrementalReporter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.spool_dir = os.path.join(self.tmp_dir, 'spool')
+        os.mkdir(self.spool_dir)
+        self.reporter = IncrementalReporter(os.path.join(self.tmp_dir, 'report.html'), title='test')
+        self.reporter.start('heading')
+
+    def tearDown(self):
+        self.reporter.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def read_jsonl(self):
+        with open(self.reporter.jsonl_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_big_output(self):
+        spool = OutputSpool(max_memory=1024, spool_dir=self.spool_dir)
+        line = 'line <%d>\n'
+        for n in range(20000):
+            spool.write(line % n)
+        spool.finish()
+        size = len(spool)
+        self.reporter.add_record((0, SampleCase(), spool, '', '0:00:01', 1), metrics={'ops_per_s': 1.0})
+        self.reporter.finish('test', 'heading', dict(count=1, Pass=1, fail=0, error=0, skip=0, passrate='100%'))
+
+        with open(self.reporter.report_path) as f:
+            html = f.read()
+        self.assertIn('Metrics: ops_per_s=1.0\nline &lt;0&gt;\n', html)
+        self.assertIn('line &lt;19999&gt;\n', html)
+        record = self.read_jsonl()[0]
+        self.assertEqual(record['output_size'], size)
+        self.assertTrue(record['output_truncated'])
+        self.assertEqual(len(record['output']), JSONL_OUTPUT_LIMIT)
+        # the spool file is removed once reported
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_str_output(self):
+        self.reporter.add_record((1, SampleCase(), 'out', 'Traceback', '0:00:01', 1))
+        self.reporter.add_record((0, SampleCase(), '', '', '0:00:01', 2))
+        records = self.read_jsonl()
+        self.assertEqual([(r['output'], r['output_size'], r['output_truncated']) for r in records],
+                         [('out', 3, False), ('', 0, False)])
+        with open(self.reporter.report_path) as f:
+            self.assertIn('outTraceback', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/14 16:10
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for stressrunner/scheduler.py DeadlineScheduler
+"""
+
+import unittest
+
+from tlib.stressrunner.scheduler import DeadlineScheduler, priority, get_priority
+
+
+class SampleCase(unittest.TestCase):
+    __test__ = False
+
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        pass
+
+    def test_c(self):
+        pass
+
+    @priority(10)
+    def test_critical(self):
+        pass
+
+
+def case_id(name):
+    return '{0}.SampleCase.{1}'.format(__name__, name)
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+    def setUp(self):
+        self.cases = [SampleCase(name) for name in ('test_a', 'test_b', 'test_c', 'test_critical')]
+        self.durations = {case_id('test_a'): 1.0, case_id('test_b'): 5.0,
+                          case_id('test_c'): 3.0, case_id('test_critical'): 2.0}
+
+    @staticmethod
+    def names(cases):
+        return [case._testMethodName for case in cases]
+
+    def test_priority(self):
+        self.assertEqual([get_priority(case) for case in self.cases], [0, 0, 0, 10])
+
+    def test_priority_lpt_order(self):
+        planned, deferred, makespan = DeadlineScheduler(self.durations).plan(self.cases)
+        # priority first, then the longest first
+        self.assertEqual(self.names(planned), ['test_critical', 'test_b', 'test_c', 'test_a'])
+        self.assertEqual(deferred, [])
+        self.assertEqual(makespan, 11.0)
+
+        planned, _, _ = DeadlineScheduler(self.durations, lpt=False).plan(self.cases)
+        self.assertEqual(self.names(planned), ['test_critical', 'test_a', 'test_b', 'test_c'])
+
+    def test_makespan(self):
+        # critical(2) and b(5) start at once, c(3) follows critical, a(1) follows c
+        planned, deferred, makespan = DeadlineScheduler(self.durations, workers=2).plan(self.cases)
+        self.assertEqual(self.names(planned), ['test_critical', 'test_b', 'test_c', 'test_a'])
+        self.assertEqual(makespan, 6.0)
+
+    def test_deferred(self):
+        planned, deferred, makespan = DeadlineScheduler(self.durations).plan(self.cases, budget=6.0)
+        # b does not fit after critical, the smaller ones after it still do
+        self.assertEqual(self.names(planned), ['test_critical', 'test_c', 'test_a'])
+        self.assertEqual([(case._testMethodName, expected) for case, expected in deferred], [('test_b', 5.0)])
+        self.assertEqual(makespan, 6.0)
+
+        planned, deferred, makespan = DeadlineScheduler(self.durations, workers=2).plan(self.cases, budget=4.0)
+        self.assertEqual(self.names(planned), ['test_critical', 'test_c', 'test_a'])
+        self.assertEqual(makespan, 3.0)
+
+        planned, deferred, makespan = DeadlineScheduler(self.durations).plan(self.cases, budget=0)
+        self.assertEqual((planned, len(deferred), makespan), ([], 4, 0.0))
+
+    def test_expected(self):
+        scheduler = DeadlineScheduler({case_id('test_a'): 1.0, case_id('test_b'): 5.0, case_id('test_c'): 3.0})
+        # unknown: the median of the known cases
+        self.assertEqual(scheduler.expected(self.cases[3]), 3.0)
+        scheduler.update({case_id('test_critical'): 2.0, case_id('test_a'): 4.0})
+        self.assertEqual([scheduler.expected(case) for case in self.cases], [4.0, 5.0, 3.0, 2.0])
+        self.assertEqual(DeadlineScheduler(default_duration=7.0).expected(self.cases[0]), 7.0)
+        self.assertEqual(DeadlineScheduler().expected(self.cases[0]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/13 15:20
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for fileop/tree_compare.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tlib.fileop.tree_compare import TreeComparator, MultiTreeComparator
+
+
+def write_file(path, data):
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+class TestTreeComparator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.left = os.path.join(self.tmp_dir, 'left')
+        self.right = os.path.join(self.tmp_dir, 'right')
+        for path, data in (('a.txt', 'aaaa'), ('d1/b.txt', 'bbbb'), ('d1/d2/c.txt', 'cccc')):
+            write_file(os.path.join(self.left, path), data)
+        shutil.copytree(self.left, self.right)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_in_sync(self):
+        diff = TreeComparator(self.left, self.right, check_data=True, workers=4).compare()
+        self.assertTrue(diff.in_sync)
+        self.assertEqual(len(diff), 0)
+
+    def test_diff(self):
+        write_file(os.path.join(self.left, 'd1/new/e.txt'), 'eeee')
+        write_file(os.path.join(self.left, 'f.txt'), 'ffff')
+        write_file(os.path.join(self.right, 'g.txt'), 'gggg')
+        os.remove(os.path.join(self.right, 'd1/b.txt'))
+        os.mkdir(os.path.join(self.right, 'd1/b.txt'))
+        # same size, different data and mtime
+        write_file(os.path.join(self.right, 'd1/d2/c.txt'), 'CCCC')
+        os.utime(os.path.join(self.right, 'd1/d2/c.txt'), (1, 1))
+
+        diff = TreeComparator(self.left, self.right, check_data=True, workers=4).compare()
+        self.assertFalse(diff.in_sync)
+        # a dir on one side only is reported at the top most level
+        self.assertEqual(diff.left_only, ['d1/new', 'f.txt'])
+        self.assertEqual(diff.right_only, ['g.txt'])
+        self.assertEqual(diff.funny, ['d1/b.txt'])
+        self.assertEqual(diff.diff_files, ['d1/d2/c.txt'])
+
+        diff = TreeComparator(self.left, self.right, check_data=False, workers=4).compare()
+        self.assertEqual(diff.diff_files, [])
+        self.assertFalse(diff.meta_synced)
+
+    def test_same_data_different_mtime(self):
+        os.utime(os.path.join(self.right, 'a.txt'), (1, 1))
+        diff = TreeComparator(self.left, self.right, check_data=True, workers=4).compare()
+        self.assertTrue(diff.in_sync)
+
+    def test_incremental(self):
+        write_file(os.path.join(self.left, 'd1/new/e.txt'), 'eeee')
+        write_file(os.path.join(self.left, 'd1/new/f.txt'), 'ffff')
+        comparator = TreeComparator(self.left, self.right, check_data=True, workers=4)
+        self.assertEqual(comparator.compare().left_only, ['d1/new'])
+        self.assertEqual(comparator.lag(), dict(missing=2, extra=0, differing=0, bytes_behind=8))
+
+        # the dir was created on the right, its sub tree is compared now
+        write_file(os.path.join(self.right, 'd1/new/e.txt'), 'eeee')
+        self.assertEqual(comparator.compare().left_only, ['d1/new/f.txt'])
+
+        write_file(os.path.join(self.right, 'd1/new/f.txt'), 'ffff')
+        self.assertTrue(comparator.compare().in_sync)
+        self.assertEqual(comparator.pending, set())
+
+    def test_multi(self):
+        replica = os.path.join(self.tmp_dir, 'replica')
+        shutil.copytree(self.left, replica)
+        os.remove(os.path.join(replica, 'a.txt'))
+        comparator = MultiTreeComparator(self.left, [self.right, replica], check_data=True, workers=4)
+        diffs = comparator.compare()
+        self.assertEqual(list(diffs), [self.right, replica])
+        self.assertTrue(diffs[self.right].in_sync)
+        self.assertEqual(diffs[replica].left_only, ['a.txt'])
+        self.assertEqual(comparator.lag_report()[replica],
+                         dict(in_sync=False, missing=1, extra=0, differing=0, bytes_behind=4))
+
+        self.assertEqual(comparator.confirmed, {self.right})
+        # a confirmed replica is not compared again
+        write_file(os.path.join(self.right, 'late.txt'), 'late')
+        diffs = comparator.compare()
+        self.assertTrue(diffs[self.right].in_sync)
+        self.assertNotIn('late.txt', comparator.comparators[self.right].manifests[1])
+        self.assertEqual(diffs[replica].left_only, ['a.txt'])
+
+        shutil.copy2(os.path.join(self.left, 'a.txt'), replica)
+        self.assertTrue(all(diff.in_sync for diff in comparator.compare().values()))
+        self.assertEqual(comparator.confirmed, {self.right, replica})
+
+
+if __name__ == '__main__':
+    unittest.main()
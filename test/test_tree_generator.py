@@ -0,0 +1,70 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/13 16:00
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for fileop/tree_generator.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tlib.fileop.tree_generator import TreeSpec, TreeGenerator, load_manifest, verify_manifest
+
+
+class TestTreeGenerator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp_dir, 'tree')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_generate(self):
+        spec = TreeSpec(depth=2, fan_out=2, files_per_dir=3, size=(100, 5000), seed=1)
+        summary = TreeGenerator(spec, workers=4, checksum=True).generate(self.root)
+        self.assertEqual((summary['dirs'], summary['files']), (6, 21))
+        manifest = load_manifest(summary['manifest'])
+        self.assertEqual(len(manifest), spec.file_count)
+        self.assertEqual(summary['bytes'], sum(size for size, _ in manifest.values()))
+        for path, (size, md5) in manifest.items():
+            self.assertEqual(os.path.getsize(os.path.join(self.root, path)), size)
+        self.assertEqual(verify_manifest(self.root, summary['manifest'], workers=4, check_data=True),
+                         dict(missing=[], wrong_size=[], wrong_data=[]))
+
+    def test_leaf_only(self):
+        spec = TreeSpec(depth=2, fan_out=2, files_per_dir=2, size=10, leaf_only=True)
+        summary = TreeGenerator(spec, workers=4).generate(self.root)
+        self.assertEqual(summary['files'], 8)
+        # no files in the root
+        self.assertEqual(sorted(os.listdir(self.root)), ['dname_0', 'dname_1'])
+        self.assertTrue(all(path.count(os.sep) == 2 for path in load_manifest(summary['manifest'])))
+
+    def test_same_seed_same_tree(self):
+        spec = TreeSpec(depth=1, fan_out=2, files_per_dir=2, size=[(10, 1), (3000, 1)], seed=7)
+        first = TreeGenerator(spec, checksum=True).generate(self.root)
+        other = TreeGenerator(spec, checksum=True).generate(os.path.join(self.tmp_dir, 'other'))
+        # the rows are in the order the dirs were written
+        self.assertEqual(dict(load_manifest(first['manifest'])), dict(load_manifest(other['manifest'])))
+
+    def test_verify(self):
+        spec = TreeSpec(depth=1, fan_out=1, files_per_dir=3, size=100)
+        summary = TreeGenerator(spec, checksum=True).generate(self.root)
+        paths = list(load_manifest(summary['manifest']))
+        os.remove(os.path.join(self.root, paths[0]))
+        with open(os.path.join(self.root, paths[1]), 'ab') as f:
+            f.write(b'x')
+        with open(os.path.join(self.root, paths[2]), 'r+b') as f:
+            first = f.read(1)
+            f.seek(0)
+            f.write(bytes([first[0] ^ 0xff]))
+        result = verify_manifest(self.root, summary['manifest'], check_data=True)
+        self.assertEqual(result, dict(missing=[paths[0]], wrong_size=[paths[1]], wrong_data=[paths[2]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
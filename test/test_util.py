@@ -0,0 +1,109 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/13 10:30
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""
+Test suite: TestCases for utils/util.py random data file writes
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from tlib.utils import util
+
+
+class TestWriteRandomFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'data')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_write(self):
+        md5 = util.write_random_file(self.path, '10k', block_size='4k')
+        self.assertEqual(os.path.getsize(self.path), 10 * 1024)
+        self.assertEqual(md5, util.hash_md5(self.path))
+
+    def test_write_truncate(self):
+        util.write_random_file(self.path, '8k')
+        util.write_random_file(self.path, '4k', mode='w')
+        self.assertEqual(os.path.getsize(self.path), 4 * 1024)
+
+    def test_append(self):
+        util.write_random_file(self.path, '4k')
+        md5 = util.write_random_file(self.path, '4k', mode='a')
+        self.assertEqual(os.path.getsize(self.path), 8 * 1024)
+        self.assertEqual(md5, util.hash_md5(self.path))
+
+    def test_overwrite_keeps_length(self):
+        util.write_random_file(self.path, '8k', seed=1)
+        with open(self.path, 'rb') as f:
+            tail = f.read()[4 * 1024:]
+        md5 = util.write_random_file(self.path, '4k', seed=2, mode='r+')
+        self.assertEqual(os.path.getsize(self.path), 8 * 1024)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read()[4 * 1024:], tail)
+        self.assertEqual(md5, util.hash_md5(self.path))
+
+    def test_overwrite_not_create(self):
+        self.assertRaises(OSError, util.write_random_file, self.path, '4k', mode='r+')
+
+    def test_seed(self):
+        md5 = util.write_random_file(self.path, '10k', block_size='4k', seed=1)
+        self.assertEqual(util.write_random_file(self.path, '10k', block_size='4k', seed=1), md5)
+
+
+class TestDirectWriteFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'data')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_write(self):
+        rc = util.direct_write_file(self.path, 10000, block_size=4096)
+        self.assertEqual(os.path.getsize(self.path), 10000)
+        self.assertEqual((rc['size'], rc['writes']), (10000, 3))
+
+    def test_blocks_differ(self):
+        util.direct_write_file(self.path, 16 * 4096, block_size=4096)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        blocks = set(data[i:i + 4096] for i in range(0, len(data), 4096))
+        self.assertEqual(len(blocks), 16)
+
+    def test_files_differ(self):
+        other = os.path.join(self.tmp_dir, 'other')
+        util.direct_write_file(self.path, 4096, block_size=4096)
+        util.direct_write_file(other, 4096, block_size=4096)
+        self.assertNotEqual(util.hash_md5(self.path), util.hash_md5(other))
+
+    def test_reopen_failed_closed_once(self):
+        real_open, real_close = os.open, os.close
+        opened, closed = [], []
+
+        def fake_open(path, flags, mode=0o777):
+            # O_DIRECT is not supported everywhere, the first open without it
+            if opened:
+                raise OSError('reopen failed')
+            opened.append(real_open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode))
+            return opened[-1]
+
+        def fake_close(fd):
+            closed.append(fd)
+            real_close(fd)
+
+        with mock.patch.object(util.os, 'open', fake_open), mock.patch.object(util.os, 'close', fake_close):
+            self.assertRaises(OSError, util.direct_write_file, self.path, 4096 + 100, block_size=4096, direct=True)
+        self.assertEqual(closed, opened)
+
+
+if __name__ == '__main__':
+    unittest.main()
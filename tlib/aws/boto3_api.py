@@ -22,6 +22,7 @@ from botocore.exceptions import ClientError
 from botocore.client import Config
 
 from tlib import log
+from tlib import decorators
 from tlib.retry import retry
 
 urllib3.disable_warnings()
@@ -362,6 +363,7 @@ class EC2Obj(object):
 
         raise Exception('{cidr} subnet is not exist!'.format(cidr=cidr))
 
+    @decorators.Memoize(expire_sec=600)
     def get_image_id_by_name(self, image_name):
         filters = [{'Name': 'name', 'Values': [image_name]}]
         response = self.ec2_client.describe_images(Filters=filters)
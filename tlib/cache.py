@@ -6,46 +6,197 @@
 
 """
 :description:
-    decorators related module
+    Key-Value cache related module
 """
+import sys
 import time
+import heapq
+import threading
 import collections
 import contextlib
 
-import tlib
-from tlib.utils.util import thread
+from tlib import log
+
+# =============================
+# --- Global
+# =============================
+logger = log.get_logger()
+EVICTION_POLICIES = ('lru', 'lfu')
 
 
 class KvCache(object):
     """
     Key-Value Cache object
+
+    Bounded by max_items and/or max_bytes(measured by size_func), expired items
+    are evicted first, then the least recently(lru) or least frequently(lfu)
+    used items. Expire times are kept in a heap, so cleanup_expired costs
+    O(expired) instead of scanning all keys.
     """
     _STAT = collections.namedtuple(
         'kvcache_stat', 'key_num expired_num'
     )
 
-    def __init__(self):
-        # store kv_data
-        self._kv_data = {}
-        self._lock = thread.RWLock()
+    def __init__(self, max_items=None, max_bytes=None, policy='lru',
+                 size_func=sys.getsizeof):
+        if policy not in EVICTION_POLICIES:
+            raise Exception('Not support eviction policy {0}, choices: {1}'.format(
+                policy, EVICTION_POLICIES))
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.size_func = size_func
+        # store kv_data: key -> (value, expire_value, size), ordered by recent use for lru
+        self._kv_data = collections.OrderedDict()
+        # lfu: key -> use count, use count -> keys ordered by recent use
+        self._freq = {}
+        self._freq_keys = collections.defaultdict(collections.OrderedDict)
+        self._min_freq = 0
+        # expire heap: (expire_value, seq, key), stale entries are skipped
+        self._expire_heap = []
+        self._seq = 0
+        self._bytes = 0
+        self._counters = dict(hits=0, misses=0, evictions=0, expired=0)
+        self._lock = threading.RLock()
 
     @contextlib.contextmanager
     def _lock_release(self, b_rw_lock):
-        if b_rw_lock is True:
-            self._lock.acquire_writelock()
-        else:
-            self._lock.acquire_readlock()
+        # lru/lfu bookkeeping mutates on read too, so reads and writes share one lock
+        self._lock.acquire()
         try:
             yield
         # pylint: disable=W0703
         except Exception as error:
-            tlib.log.warn('something happend in cache:%s' % error)
+            logger.warning('something happend in cache:%s' % error)
         finally:
-            if b_rw_lock is True:
-                self._lock.release_writelock()
-            else:
-                self._lock.release_readlock()
+            self._lock.release()
+
+    # ---------------- bookkeeping ----------------
+    def _touch(self, key):
+        if self.policy == 'lru':
+            self._kv_data.move_to_end(key)
+            return
+        freq = self._freq[key]
+        keys = self._freq_keys[freq]
+        del keys[key]
+        if not keys:
+            del self._freq_keys[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._freq_keys[freq + 1][key] = None
+
+    def _insert(self, key, value, expire_value):
+        size = self.size_func(value) if self.max_bytes is not None else 0
+        if key in self._kv_data:
+            self._bytes -= self._kv_data[key][2]
+            self._kv_data[key] = (value, expire_value, size)
+            self._touch(key)
+        else:
+            self._kv_data[key] = (value, expire_value, size)
+            if self.policy == 'lfu':
+                self._freq[key] = 1
+                self._freq_keys[1][key] = None
+                self._min_freq = 1
+        self._bytes += size
+        if expire_value is not None:
+            self._seq += 1
+            heapq.heappush(self._expire_heap, (expire_value, self._seq, key))
+            self._compact_expire_heap()
+
+    def _remove(self, key):
+        self._bytes -= self._kv_data.pop(key)[2]
+        if self.policy == 'lfu':
+            freq = self._freq.pop(key)
+            keys = self._freq_keys[freq]
+            del keys[key]
+            if not keys:
+                del self._freq_keys[freq]
+        if not self._kv_data:
+            self._expire_heap = []
+
+    def _iter_victims(self):
+        """keys in eviction order"""
+        if self.policy == 'lru':
+            for key in self._kv_data:
+                yield key
+            return
+        while self._min_freq not in self._freq_keys:
+            self._min_freq = min(self._freq_keys)
+        for key in self._freq_keys[self._min_freq]:
+            yield key
+        # only reached when the least used keys are all protected
+        for freq in sorted(self._freq_keys):
+            if freq != self._min_freq:
+                for key in self._freq_keys[freq]:
+                    yield key
+
+    def _victim(self, protected=()):
+        """the key to evict, the keys just set are evicted last"""
+        for key in self._iter_victims():
+            if key not in protected:
+                return key
+        return next(self._iter_victims())
+
+    def _over_capacity(self):
+        if self.max_items is not None and len(self._kv_data) > self.max_items:
+            return True
+        if self.max_bytes is not None and self._bytes > self.max_bytes:
+            return True
+        return False
 
+    def _evict(self, protected=()):
+        if not self._over_capacity():
+            return
+        self._cleanup_expired()
+        while self._kv_data and self._over_capacity():
+            self._remove(self._victim(protected))
+            self._counters['evictions'] += 1
+
+    def _is_live_entry(self, expire_value, key):
+        item = self._kv_data.get(key)
+        return item is not None and item[1] == expire_value
+
+    def _get_expired_keys(self):
+        """Walk only the heap nodes that expired, skip the stale entries"""
+        now = time.time()
+        heap = self._expire_heap
+        expired_keys = []
+        stack = [0] if heap else []
+        while stack:
+            i = stack.pop()
+            expire_value, _, key = heap[i]
+            if expire_value > now:
+                continue
+            if self._is_live_entry(expire_value, key):
+                expired_keys.append(key)
+            stack.extend(c for c in (2 * i + 1, 2 * i + 2) if c < len(heap))
+        return expired_keys
+
+    def _cleanup_expired(self):
+        now = time.time()
+        heap = self._expire_heap
+        expired_keys = []
+        while heap and heap[0][0] <= now:
+            expire_value, _, key = heapq.heappop(heap)
+            if self._is_live_entry(expire_value, key):
+                self._remove(key)
+                expired_keys.append(key)
+        self._counters['expired'] += len(expired_keys)
+        self._compact_expire_heap()
+        return expired_keys
+
+    def _compact_expire_heap(self):
+        """
+        Updated/deleted keys leave stale entries behind, drop them when they
+        dominate, so the heap stays O(live keys) at amortized O(1) per insert
+        """
+        heap = self._expire_heap
+        if len(heap) > 2 * len(self._kv_data) + 64:
+            self._expire_heap = [e for e in heap if self._is_live_entry(e[0], e[2])]
+            heapq.heapify(self._expire_heap)
+
+    # ---------------- API ----------------
     def set(self, kvlist, expire_sec=None):
         """
         set cache with kvlist
@@ -60,9 +211,9 @@ class KvCache(object):
             expire_value = expire_sec + time.time()
         with self._lock_release(b_rw_lock=True):
             for key in kvlist:
-                if key in self._kv_data:
-                    tlib.log.debug('Key:%s of KvCache updated.' % key)
-                self._kv_data[key] = (kvlist[key], expire_value)
+                self._insert(key, kvlist[key], expire_value)
+            # a new lfu key has the min use count, don't evict it right away
+            self._evict(protected=kvlist)
 
     def get(self, key):
         """
@@ -71,24 +222,28 @@ class KvCache(object):
         If the key does not exist, it will return None.
         """
         with self._lock_release(b_rw_lock=False):
-            if key not in self._kv_data:
+            item = self._kv_data.get(key)
+            if item is None:
+                self._counters['misses'] += 1
                 return None
-            value, expire_sec = self._kv_data[key]
+            value, expire_sec, _ = item
             if expire_sec is not None and time.time() > expire_sec:
+                self._counters['misses'] += 1
                 return None
-            else:
-                tlib.log.debug('key:%s of kvCache fetched.' % key)
-                return value
+            self._counters['hits'] += 1
+            self._touch(key)
+            return value
         return None
 
-    def _get_expired_keys(self):
-        expired_keys = []
-        keys = self._kv_data.keys()
-        for key in keys:
-            expire_sec = self._kv_data[key][1]
-            if expire_sec is not None and time.time() > expire_sec:
-                expired_keys.append(key)
-        return expired_keys
+    def delete(self, key):
+        """
+        Delete the item of key, return True if it was cached
+        """
+        with self._lock_release(b_rw_lock=True):
+            if key in self._kv_data:
+                self._remove(key)
+                return True
+        return False
 
     def cleanup_expired(self):
         """
@@ -96,10 +251,8 @@ class KvCache(object):
         """
         expired_keys = None
         with self._lock_release(b_rw_lock=True):
-            expired_keys = self._get_expired_keys()
-            for key in expired_keys:
-                del self._kv_data[key]
-                tlib.log.debug('key:%s cleaned up' % key)
+            expired_keys = self._cleanup_expired()
+        logger.debug('%d expired keys cleaned up' % len(expired_keys or []))
         return expired_keys
 
     def get_expired(self):
@@ -116,8 +269,7 @@ class KvCache(object):
         with self._lock_release(b_rw_lock=False):
             keys = self._get_expired_keys()
             for key in keys:
-                value = self._kv_data[key]
-                kvlist[key] = (value)
+                kvlist[key] = self._kv_data[key][:2]
         return kvlist
 
     def stat(self):
@@ -130,12 +282,28 @@ class KvCache(object):
             expired_num = len(self._get_expired_keys())
         return (key_num, expired_num)
 
+    def counters(self):
+        """
+        :return:
+            a dict with hits, misses, evictions, expired(cleaned up),
+            items and bytes(0 if max_bytes is None)
+        """
+        with self._lock_release(b_rw_lock=False):
+            counters = dict(self._counters)
+            counters['items'] = len(self._kv_data)
+            counters['bytes'] = self._bytes
+        return counters
+
     def clear(self):
         """
         remove all kv cache inside.
         """
         with self._lock_release(b_rw_lock=True):
-            del self._kv_data
-            self._kv_data = {}
+            self._kv_data = collections.OrderedDict()
+            self._freq = {}
+            self._freq_keys = collections.defaultdict(collections.OrderedDict)
+            self._min_freq = 0
+            self._expire_heap = []
+            self._bytes = 0
 
 # vi:set tw=0 ts=4 sw=4 nowrap fdm=indent
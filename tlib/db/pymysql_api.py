@@ -21,8 +21,9 @@ class MySQLAPI(object):
     """
     MySQLdb obj
     """
-    def __init__(self, host, user, password, port, database, show=True):
+    def __init__(self, host, user, password, port, database, show=True, connect_timeout=10):
         super(MySQLAPI, self).__init__()
+        self.connect_timeout = connect_timeout
         self.host = host
         self.user = user
         self.password = password
@@ -55,7 +56,8 @@ class MySQLAPI(object):
         try:
             conn = pymysql.connect(host=self.host, user=self.user,
                                    passwd=self.password, db=self.database,
-                                   port=self.port, charset='utf8')
+                                   port=self.port, charset='utf8',
+                                   connect_timeout=self.connect_timeout)
             return conn
         except Exception as e:
             raise e
@@ -127,6 +129,25 @@ class MySQLAPI(object):
         else:
             logger.info('The [{}] is empty or equal None!'.format(sql))
 
+    def executemany(self, sql, data):
+        """
+        execute sql with each args in data, one commit for all(batch insert)
+        :param sql:
+        :param data: list of args
+        :return:
+        """
+        if self.show:
+            logger.info('execute sql:[{}],rows:[{}]'.format(sql, len(data)))
+
+        try:
+            rows = self.cur.executemany(sql, data)
+            self.conn.commit()
+            return rows
+        except Exception as e:
+            logger.warning('{err}, rollback commit ...'.format(err=e))
+            self.conn.rollback()
+            raise e
+
     def fetchall(self, sql):
         if self.show:
             logger.info('execute sql:[{}]'.format(sql))
@@ -50,10 +50,11 @@ SQLite数据库是一款非常小巧的嵌入式开源数据库软件，也就
 
 class SQLiteAPI(object):
 
-    def __init__(self, db_path, show=True):
+    def __init__(self, db_path, show=True, create_db=False):
         super(SQLiteAPI, self).__init__()
         self.db_path = db_path
         self.show = show
+        self.create_db = create_db
         self.conn = self.connect()
         self.cur = self.conn.cursor()
 
@@ -79,7 +80,7 @@ class SQLiteAPI(object):
         :return:
         """
 
-        if os.path.exists(self.db_path) and os.path.isfile(self.db_path):
+        if (os.path.exists(self.db_path) and os.path.isfile(self.db_path)) or self.create_db:
             if self.show:
                 print('Connect SQLite: [{}]'.format(self.db_path))
             conn = sqlite3.connect(self.db_path)
@@ -147,6 +148,24 @@ class SQLiteAPI(object):
         else:
             print('The [{}] is empty or equal None!'.format(sql))
 
+    def executemany(self, sql, data):
+        """
+        execute sql with each args in data, one commit for all(batch insert)
+        :param sql:
+        :param data: list of args
+        :return:
+        """
+        if self.show:
+            print('execute sql:[{}],rows:[{}]'.format(sql, len(data)))
+
+        try:
+            self.cur.executemany(sql, data)
+            self.conn.commit()
+            return self.cur.rowcount
+        except Exception as e:
+            self.conn.rollback()
+            raise Exception(e)
+
     def fetchall(self, sql):
         if self.show:
             print('execute sql:[{}]'.format(sql))
@@ -12,16 +12,18 @@
 import os
 import time
 import platform
+import weakref
 import threading
 from functools import wraps
 from datetime import datetime as datetime_in
 
 from tlib import exceptions as err
 from tlib import log
+from tlib.cache import KvCache
 
 __all__ = [
-    'Singleton', 'print_for_call', 'TraceUsedTime', 'needlinux', 'needposix',
-    'needmac', 'py_versioncheck'
+    'Singleton', 'print_for_call', 'TraceUsedTime', 'Memoize', 'needlinux',
+    'needposix', 'needmac', 'py_versioncheck'
 ]
 
 logger = log.get_logger()
@@ -226,6 +228,175 @@ class TraceUsedTime(object):
         return _wrapper_log
 
 
+class _WeakKey(object):
+    """
+    Key part of an instance by weakref: hashed by id, equal only to the same
+    live instance, so a new instance at a reused address never hits the
+    results of a dead one
+    """
+    __slots__ = ('ref', 'id')
+
+    def __init__(self, obj):
+        self.ref = weakref.ref(obj)
+        self.id = id(obj)
+
+    def __hash__(self):
+        return self.id
+
+    def __eq__(self, other):
+        if not isinstance(other, _WeakKey) or other.id != self.id:
+            return False
+        obj = self.ref()
+        return obj is not None and obj is other.ref()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def _freeze(obj):
+    """list/tuple/dict/set -> hashable tuples(tagged by type), recursively"""
+    if isinstance(obj, (list, tuple)):
+        return type(obj), tuple(_freeze(item) for item in obj)
+    if isinstance(obj, dict):
+        return dict, tuple(sorted(((k, _freeze(v)) for k, v in obj.items()), key=repr))
+    if isinstance(obj, (set, frozenset)):
+        return frozenset, frozenset(_freeze(item) for item in obj)
+    return obj
+
+
+def _default_memoize_key(args, kwargs):
+    """
+    (args, sorted kwargs), lists/dicts/sets converted to tuples. The first arg
+    (self of a method) is held by a weakref, so the cache never keeps an
+    instance alive, and the results of a dead instance are never hit again
+    :return: the key, None if still unhashable(the cache is bypassed)
+    """
+    first = ()
+    if args:
+        try:
+            first = (_WeakKey(args[0]),)
+            args = args[1:]
+        except TypeError:
+            # int, str, tuple ... can't be weak referenced, keep them
+            pass
+    key = (first, _freeze(tuple(args)), _freeze(kwargs))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class Memoize(object):
+    """
+    Memoize the function result in a tlib.cache.KvCache.
+
+    Concurrent callers with the same key wait for the one in-flight call
+    (single flight) instead of all calling the function, exceptions are
+    raised to all of them and never cached.
+
+    example::
+
+        from tlib import decorators
+
+        class KubernetesApi(object):
+            @decorators.Memoize(expire_sec=300)
+            def get_node_ip_by_name(self, node_name, ip_type='ExternalIP'):
+                pass
+
+        # key by node_name only, share the cache between instances
+        @decorators.Memoize(expire_sec=60, key_func=lambda args, kwargs: args[1])
+
+        # drop the cached result of one call, or all
+        api.get_node_ip_by_name.cache_delete(api, node_name)
+        api.get_node_ip_by_name.cache_clear()
+    """
+    def __init__(self, expire_sec=None, key_func=None, max_items=1024,
+                 single_flight=True, cache=None, cache_none=False):
+        """
+        :param expire_sec:
+            ttl of the cached results, None means never expire
+
+        :param key_func:
+            key_func(args, kwargs) -> hashable cache key, None to bypass the
+            cache, default: (args, sorted kwargs)
+
+        :param max_items:
+            max cached results of the function, lru evicted
+
+        :param single_flight:
+            concurrent callers with the same key wait for one call if True
+
+        :param cache:
+            a KvCache to store the results, default: a new KvCache per function
+
+        :param cache_none:
+            cache None results too if True, default: a None result (eg: not
+            ready yet) is not cached, the next call tries again
+        """
+        self._expire_sec = expire_sec
+        self._key_func = key_func or _default_memoize_key
+        self._single_flight = single_flight
+        self._cache = cache if cache is not None else KvCache(max_items=max_items)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._cache_none = cache_none
+
+    def _call(self, function, key, args, kwargs):
+        rtn = function(*args, **kwargs)
+        if rtn is not None or self._cache_none:
+            # wrapped in a tuple, so a cached None is told from a miss
+            self._cache.set({key: (rtn,)}, self._expire_sec)
+        return rtn
+
+    def _cache_delete(self, args, kwargs):
+        key = self._key_func(args, kwargs)
+        return key is not None and self._cache.delete(key)
+
+    def _call_single_flight(self, function, key, args, kwargs):
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = {'event': threading.Event()}
+
+        if not leader:
+            flight['event'].wait()
+            if 'error' in flight:
+                raise flight['error']
+            return flight['result']
+
+        try:
+            flight['result'] = self._call(function, key, args, kwargs)
+            return flight['result']
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight['event'].set()
+
+    def __call__(self, function):
+        @wraps(function)
+        def _wrapper_memoize(*args, **kwargs):
+            key = self._key_func(args, kwargs)
+            if key is None:
+                # can't be keyed, not cached
+                return function(*args, **kwargs)
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached[0]
+            if self._single_flight:
+                return self._call_single_flight(function, key, args, kwargs)
+            return self._call(function, key, args, kwargs)
+
+        _wrapper_memoize.cache = self._cache
+        _wrapper_memoize.cache_clear = self._cache.clear
+        _wrapper_memoize.cache_delete = lambda *args, **kwargs: self._cache_delete(args, kwargs)
+        return _wrapper_memoize
+
+
 # Things below for unittest
 @TraceUsedTime(False)
 def _test_trace_time():
@@ -8,7 +8,10 @@
 """数据结构"""
 
 import sys
+import math
+import array
 import base64
+import threading
 from datetime import date, datetime
 from collections import OrderedDict
 
@@ -242,5 +245,241 @@ def ordered_yaml_dump(data, stream=None, Dumper=yaml.SafeDumper, **kwds):
     return yaml.dump(data, stream, OrderedDumper, **kwds)
 
 
+# 统计 counters/histogram
+class ThreadShards(object):
+    """
+    Per-thread shards: each thread gets its own shard object created by factory,
+    the lock is only taken once per thread to register the shard, never on update.
+    The reader merges all shards at read time.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def local(self):
+        """The shard of current thread"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self.factory()
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def shards(self):
+        with self._lock:
+            return list(self._shards)
+
+
+class ShardedCounter(ThreadShards):
+    """
+    Lock-free named counters, sharded per thread and merged at read time
+    Example:
+        counter = ShardedCounter(('success', 'failure'))
+        counter.add('success')
+        counter.values()  # {'success': 1, 'failure': 0}
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._index = dict((field, i) for i, field in enumerate(self.fields))
+        super(ShardedCounter, self).__init__(lambda: [0] * len(self.fields))
+
+    def add(self, field, value=1):
+        self.local()[self._index[field]] += value
+
+    def value(self, field):
+        i = self._index[field]
+        return sum(shard[i] for shard in self.shards())
+
+    def values(self):
+        merged = [0] * len(self.fields)
+        for shard in self.shards():
+            for i, v in enumerate(shard):
+                merged[i] += v
+        return dict(zip(self.fields, merged))
+
+
+class LatencyHistogram(object):
+    """
+    HDR-style histogram with fixed log-linear buckets for non-negative int values
+    (e.g. latency in microseconds): values below 2^sub_bucket_bits are exact, above
+    that the relative error is bounded by 1/2^(sub_bucket_bits-1), values over
+    2^max_value_bits are clamped into the last bucket.
+    """
+
+    def __init__(self, sub_bucket_bits=7, max_value_bits=36):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_value_bits = max_value_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count >> 1
+        self.bucket_count = self.sub_bucket_count + (max_value_bits - sub_bucket_bits) * self.sub_bucket_half
+        self.counts = [0] * self.bucket_count
+        self.total_count = 0
+        self.total_sum = 0
+
+    @classmethod
+    def from_counts(cls, counts, total_sum=0, **kwargs):
+        histogram = cls(**kwargs)
+        assert len(counts) == histogram.bucket_count
+        histogram.counts = list(counts)
+        histogram.total_count = sum(histogram.counts)
+        histogram.total_sum = total_sum
+        return histogram
+
+    def bucket_index(self, value):
+        value = max(int(value), 0)
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        index = self.sub_bucket_count + (shift - 1) * self.sub_bucket_half + ((value >> shift) - self.sub_bucket_half)
+        return min(index, self.bucket_count - 1)
+
+    def bucket_value(self, index):
+        """The middle value of the bucket"""
+        if index < self.sub_bucket_count:
+            return index
+        offset = index - self.sub_bucket_count
+        shift = offset // self.sub_bucket_half + 1
+        top = offset % self.sub_bucket_half + self.sub_bucket_half
+        return (top << shift) + (1 << (shift - 1))
+
+    def record(self, value, count=1):
+        self.counts[self.bucket_index(value)] += count
+        self.total_count += count
+        self.total_sum += value * count
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+        return self
+
+    def copy(self):
+        return self.from_counts(self.counts, self.total_sum, sub_bucket_bits=self.sub_bucket_bits,
+                                max_value_bits=self.max_value_bits)
+
+    def diff(self, previous):
+        """The histogram of values recorded since the previous snapshot(copy)"""
+        counts = [c - p for c, p in zip(self.counts, previous.counts)]
+        return self.from_counts(counts, self.total_sum - previous.total_sum, sub_bucket_bits=self.sub_bucket_bits,
+                                max_value_bits=self.max_value_bits)
+
+    @property
+    def mean(self):
+        return self.total_sum / float(self.total_count) if self.total_count else 0
+
+    @property
+    def min(self):
+        for i, count in enumerate(self.counts):
+            if count:
+                return self.bucket_value(i)
+        return 0
+
+    @property
+    def max(self):
+        for i in range(self.bucket_count - 1, -1, -1):
+            if self.counts[i]:
+                return self.bucket_value(i)
+        return 0
+
+    def percentile(self, percent):
+        if not self.total_count:
+            return 0
+        target = max(int(-(-percent * self.total_count // 100)), 1)  # ceil
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return self.bucket_value(i)
+        return self.max
+
+    def percentiles(self, percents=(50, 90, 99, 99.9)):
+        return OrderedDict((p, self.percentile(p)) for p in percents)
+
+
+class RingBuffer(object):
+    """
+    Fixed capacity time series, one array('d') per field plus the timestamps,
+    the oldest samples are overwritten when full.
+    """
+
+    def __init__(self, fields, capacity=3600):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._times = array.array('d', [0.0] * capacity)
+        self._columns = [array.array('d', [0.0] * capacity) for _ in self.fields]
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, values):
+        """
+        :param timestamp: time.time() of the sample
+        :param values: one value per field
+        :return:
+        """
+        with self._lock:
+            i = self._next
+            self._times[i] = timestamp
+            for column, value in zip(self._columns, values):
+                column[i] = value
+            self._next = (i + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def latest(self):
+        """
+        The newest sample
+        :return: (timestamp, OrderedDict(field -> value)), None if no sample
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            i = (self._next - 1) % self.capacity
+            return self._times[i], OrderedDict(
+                (field, column[i]) for field, column in zip(self.fields, self._columns))
+
+    def _indexes(self):
+        start = (self._next - self._count) % self.capacity
+        return [(start + n) % self.capacity for n in range(self._count)]
+
+    def window(self, start=None, end=None):
+        """
+        The samples with start <= timestamp <= end, oldest first
+        :return: (timestamps, OrderedDict(field -> values))
+        """
+        with self._lock:
+            indexes = [i for i in self._indexes()
+                       if (start is None or self._times[i] >= start) and
+                       (end is None or self._times[i] <= end)]
+            times = [self._times[i] for i in indexes]
+            columns = OrderedDict(
+                (field, [column[i] for i in indexes]) for field, column in zip(self.fields, self._columns))
+        return times, columns
+
+    def summary(self, start=None, end=None, percent=95):
+        """
+        min/avg/max/percentile of each field in the window
+        :return: OrderedDict(field -> (min, avg, max, p<percent>)), empty if no sample
+        """
+        _, columns = self.window(start, end)
+        summary = OrderedDict()
+        for field, values in columns.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            rank = max(int(math.ceil(percent / 100.0 * len(ordered))) - 1, 0)
+            summary[field] = (ordered[0], sum(ordered) / len(ordered), ordered[-1],
+                              ordered[min(rank, len(ordered) - 1)])
+        return summary
+
 if __name__ == '__main__':
     pass
@@ -65,6 +65,9 @@ class ElasticsearchParser(object):
         arg_group = arg_parser.add_argument_group('Elasticsearch Stress Parameters')
         arg_group.add_argument("--clients", type=int, default=1,
                                help="Number of threads that send bulks to ES, default:1")
+        arg_group.add_argument("--client-mode", dest="client_mode", default="thread",
+                               choices=['thread', 'process'],
+                               help="Run clients as threads or as processes(scale with cores), default:thread")
         arg_group.add_argument("--seconds", type=int, default=60,
                                help="How long should the test run. Note: it might take a bit longer, as sending of all bulks who's creation has been initiated is allowed")
         arg_group.add_argument("--number-of-shards", type=int, default=3,
@@ -10,13 +10,17 @@ FYI: https://elasticsearch-py.readthedocs.io/en/master/api.html
 
 import sys
 import json
+import time
+import threading
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from elasticsearch import Elasticsearch
-from elasticsearch import ElasticsearchException
-from elasticsearch.helpers import streaming_bulk
+from elasticsearch import ElasticsearchException, TransportError
+from elasticsearch.helpers import streaming_bulk, expand_action
 from elasticsearch.serializer import JSONSerializer
 
 from tlib import log
+from tlib import decorators
 from tlib.retry import retry
 
 if sys.version_info > (3, 0, 0):
@@ -33,6 +37,8 @@ else:
 logger = log.get_logger()
 ES_CONN_TIMEOUT = 36000
 ES_OPERATION_TIMEOUT = '60m'
+# bulk refresh policy: None(no refresh), 'true'(every chunk), 'wait_for'(every chunk), 'end'(once at the end)
+BULK_REFRESH_POLICIES = (None, 'true', 'wait_for', 'end')
 
 
 # print the func Enter/Output info
@@ -62,6 +68,33 @@ class CustomerJSONSerializer(JSONSerializer):
         return JSONSerializer.default(self, data)
 
 
+class BulkSummary(object):
+    """The summary of a (parallel) bulk: docs, errors, retries on 429, elapsed seconds"""
+
+    def __init__(self):
+        self.docs = 0
+        self.errors = 0
+        self.retries = 0
+        self.chunks = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, docs, errors, retries):
+        with self._lock:
+            self.docs += docs
+            self.errors += errors
+            self.retries += retries
+            self.chunks += 1
+
+    @property
+    def docs_per_second(self):
+        return self.docs / self.elapsed if self.elapsed else 0
+
+    def __repr__(self):
+        return 'BulkSummary(docs={0}, errors={1}, retries={2}, chunks={3}, elapsed={4:.2f}s, {5:.0f} docs/s)'.format(
+            self.docs, self.errors, self.retries, self.chunks, self.elapsed, self.docs_per_second)
+
+
 class ESApi(object):
     _conn = None
 
@@ -193,7 +226,7 @@ class ESApi(object):
         return self.conn.bulk(body, index, doc_type)
 
     def bulk_actions(self, index_name, actions, bulk_size=500, doc_type='doc',
-                     max_retries=3, **kwargs):
+                     max_retries=3, refresh='true', **kwargs):
         """
         Streaming bulk consumes actions from the iterable passed in and
         yields results per action.
@@ -203,9 +236,12 @@ class ESApi(object):
         :param doc_type:
         :param max_retries: maximum number of times a document will be retried
         when ``429`` is received, set to 0 (default) for no retries on ``429``
+        :param refresh: refresh param of every chunk, 'true', 'wait_for' or None
         :param kwargs:
         :return:
         """
+        if refresh is not None:
+            kwargs['refresh'] = refresh
         num = 0
         pre_num = 0
         for ok, info in streaming_bulk(
@@ -215,7 +251,6 @@ class ESApi(object):
             chunk_size=bulk_size,
             doc_type=doc_type,
             max_retries=max_retries,
-            refresh='true',
             **kwargs
         ):
             action, result = info.popitem()
@@ -233,6 +268,118 @@ class ESApi(object):
         logger.info("Streaming bulk total {0} docs to {1} done".format(num, index_name))
         return True
 
+    def _bulk_chunk(self, index_name, doc_type, chunk, refresh, max_retries,
+                    initial_backoff, max_backoff):
+        """
+        Send one chunk of expanded (action, data) pairs, retry the docs
+        rejected with ``429`` with exponential backoff
+        :return: (docs, errors, retries)
+        """
+        serializer = self.conn.transport.serializer
+        kwargs = {'refresh': refresh} if refresh in ('true', 'wait_for') else {}
+        docs, errors, retries = 0, 0, 0
+        to_send = chunk
+        for attempt in range(max_retries + 1):
+            if attempt:
+                retries += len(to_send)
+                time.sleep(min(max_backoff, initial_backoff * 2 ** (attempt - 1)))
+            body = []
+            for action, data in to_send:
+                body.append(serializer.dumps(action))
+                if data is not None:
+                    body.append(serializer.dumps(data))
+            body.append('')
+            try:
+                resp = self.conn.bulk('\n'.join(body), index_name, doc_type,
+                                      timeout=ES_OPERATION_TIMEOUT, **kwargs)
+            except TransportError as e:
+                if e.status_code == 429 and attempt < max_retries:
+                    continue
+                logger.error("Bulk chunk failed: {0}".format(e))
+                return docs, errors + len(to_send), retries
+
+            to_retry = []
+            for item, pair in zip(resp['items'], to_send):
+                op_type, result = item.popitem()
+                status = result.get('status', 500)
+                if 200 <= status < 300:
+                    docs += 1
+                elif status == 429 and attempt < max_retries:
+                    to_retry.append(pair)
+                else:
+                    errors += 1
+                    if errors == 1:
+                        logger.error("Failed to {0} document: {1!r}".format(op_type, result))
+            if not to_retry:
+                break
+            to_send = to_retry
+        return docs, errors, retries
+
+    def parallel_bulk_actions(self, index_name, actions, bulk_size=500,
+                              doc_type='doc', max_retries=3, thread_count=4,
+                              queue_size=None, refresh=None,
+                              initial_backoff=2, max_backoff=600):
+        """
+        Parallel bulk: keep thread_count chunks in flight on a thread pool, the
+        actions iterable is consumed only while less than thread_count + queue_size
+        chunks are pending (backpressure against the generator)
+        :param index_name: Default index for items which don't provide one
+        :param actions: iterable containing the actions to be executed
+        :param bulk_size: number of docs in one chunk sent to es (default: 500)
+        :param doc_type:
+        :param max_retries: maximum number of times a document will be retried
+        when ``429`` is received
+        :param thread_count: number of chunks in flight
+        :param queue_size: number of chunks waiting for a thread, default: thread_count
+        :param refresh: refresh policy, None: no refresh, 'true'/'wait_for': every chunk,
+        'end': refresh index_name(or '_all') once after all chunks done
+        :param initial_backoff: seconds to wait before the first retry, doubles on every retry
+        :param max_backoff: maximum seconds a retry will wait
+        :return: BulkSummary
+        """
+        if refresh not in BULK_REFRESH_POLICIES:
+            raise Exception("Not support refresh policy {0}, choices: {1}".format(
+                refresh, BULK_REFRESH_POLICIES))
+        queue_size = thread_count if queue_size is None else queue_size
+        pending = threading.BoundedSemaphore(thread_count + queue_size)
+        summary = BulkSummary()
+        start = time.time()
+
+        def done_callback(future, chunk_size):
+            pending.release()
+            e = future.exception()
+            if e is not None:
+                # the whole chunk is lost, count its docs as errors
+                logger.error("Bulk chunk failed: {0}".format(e))
+                summary.add(0, chunk_size, 0)
+            else:
+                summary.add(*future.result())
+
+        def submit(chunk):
+            pending.acquire()
+            future = pool.submit(self._bulk_chunk, index_name, doc_type, chunk,
+                                 refresh, max_retries, initial_backoff, max_backoff)
+            future.add_done_callback(lambda f: done_callback(f, len(chunk)))
+
+        pool = ThreadPoolExecutor(max_workers=thread_count)
+        try:
+            chunk = []
+            for action in actions:
+                chunk.append(expand_action(action))
+                if len(chunk) >= bulk_size:
+                    submit(chunk)
+                    chunk = []
+            if chunk:
+                submit(chunk)
+        finally:
+            pool.shutdown(wait=True)
+
+        if refresh == 'end':
+            self.refresh_index(index_name or '_all')
+        summary.elapsed = time.time() - start
+        logger.info("Parallel bulk to {0} done: {1}".format(index_name, summary))
+        return summary
+
     # ===============
     # search
     # ===============
@@ -278,6 +425,7 @@ class ESApi(object):
         """
         return self.conn.indices.get_alias(index_name, alias_name)
 
+    @decorators.Memoize(expire_sec=60)
     def get_index_settings(self, index_name):
         """
         Returns settings for one or more indices.
@@ -491,6 +639,7 @@ class ESApi(object):
             empty string to perform the operation on all indices
         :return:
         """
+        self.get_index_settings.cache_clear()
         return self.conn.indices.put_settings(body, index_name,
                                               timeout=ES_OPERATION_TIMEOUT)
 
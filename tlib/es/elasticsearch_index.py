@@ -9,8 +9,14 @@ import random
 import uuid
 import string
 import json
+import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from tlib.es.elasticsearch_super import EsSuper
 from tlib.es.example_settings import CREATE_INDEX_BODY
 from tlib import log
@@ -21,6 +27,7 @@ from tlib.utils import util
 # --- Global
 # =============================
 logger = log.get_logger()
+DOC_CHARS = string.ascii_letters + string.digits
 
 
 class ElasticsearchIndex(EsSuper):
@@ -83,6 +90,110 @@ class ElasticsearchIndex(EsSuper):
         for _ in range(docs_num):
             yield self.generate_doc()
 
+    # ---------------- batch docs ----------------
+    @staticmethod
+    def random_ints(count, min_value, max_value):
+        """A column of count random ints in [min_value, max_value]"""
+        if np is not None:
+            return np.random.randint(min_value, max_value + 1, size=count).tolist()
+        return random.choices(range(min_value, max_value + 1), k=count)
+
+    def random_strings(self, count, max_size, min_size=3, chars=DOC_CHARS):
+        """
+        A column of count random strings, length in [min_size, max_size], all sliced
+        from one random pool generated for the whole column
+        """
+        lengths = self.random_ints(count, min_size, max_size)
+        total = sum(lengths)
+        if np is not None:
+            char_array = np.frombuffer(chars.encode('ascii'), dtype=np.uint8)
+            pool = char_array[np.random.randint(0, len(chars), size=total)].tobytes().decode('ascii')
+        else:
+            pool = ''.join(random.choices(chars, k=total))
+        column = []
+        pos = 0
+        for length in lengths:
+            column.append(pool[pos:pos + length])
+            pos += length
+        return column
+
+    @staticmethod
+    def random_uuids(count):
+        """A column of count uuid4 strings, from one urandom call"""
+        raw = os.urandom(16 * count)
+        return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
+    def generate_doc_batch(self, batch_size):
+        """
+        Generate batch_size docs like generate_doc, the random fields are generated by columns
+        (NumPy vectorized if installed) instead of ~15 random calls per doc
+        :param batch_size:
+        :return: list of docs
+        """
+        now = util.get_current_time()
+        names = self.random_strings(batch_size, 10)
+        name_terms = self.random_strings(batch_size, 10)
+        exts = self.random_strings(batch_size * 2, 3)
+        dir_ids = self.random_ints(batch_size, 1, 100)
+        paths = ["", "/", "/dir", None]
+        path_ids = self.random_ints(batch_size, 0, len(paths) - 1)
+        file_ids = self.random_strings(batch_size, 31, 31, string.digits)
+        first_digits = self.random_strings(batch_size, 1, 1, string.digits[1:])
+        columns = zip(
+            self.random_uuids(batch_size), self.random_strings(batch_size, 15), self.random_strings(batch_size, 5),
+            names, name_terms, exts[:batch_size], exts[batch_size:], path_ids, dir_ids,
+            self.random_strings(batch_size, 5), self.random_ints(batch_size, 1, 1000000),
+            self.random_ints(batch_size, 0, 10), self.random_uuids(batch_size), self.random_strings(batch_size, 10),
+            self.random_ints(batch_size, 0, 10), first_digits, file_ids, self.random_strings(batch_size, 20)
+        )
+
+        docs = []
+        for (cc_id, cc_name, tenant, name, name_term, ext, ext_term, path_id, dir_id, file_system, size, uid,
+             app_id, app_name, gid, first_digit, file_id, file_name) in columns:
+            path = paths[path_id]
+            docs.append({
+                "doc_c_time": now,
+                "cc_id": cc_id,
+                "cc_name": cc_name,
+                "tenant": tenant,
+                "name": '{0}.{1}'.format(name, ext),
+                "name_term": '{0}.{1}'.format(name_term, ext_term),
+                "is_file": True,
+                "path": "/dir{0}".format(dir_id) if path is None else path,
+                "last_used_time": now,
+                'file_system': file_system,
+                "atime": now,
+                "mtime": now,
+                "ctime": now,
+                "size": size,
+                "is_folder": False,
+                "app_type": "test Index & Search",
+                "uid": uid,
+                "denied": [],
+                "app_id": app_id,
+                "app_name": app_name,
+                "gid": gid,
+                "doc_i_time": now,
+                "file_id": first_digit + file_id,
+                "file": file_name,
+                "allowed": ["FULL"]
+            })
+        return docs
+
+    def generate_doc_chunks(self, docs_num, chunk_size):
+        """
+        Stream docs_num docs as ready-to-send bulk chunks of chunk_size docs,
+        memory is bounded by one chunk instead of the whole corpus
+        :param docs_num:
+        :param chunk_size:
+        :return: generator of doc lists
+        """
+        remaining = docs_num
+        while remaining > 0:
+            batch_size = min(chunk_size, remaining)
+            remaining -= batch_size
+            yield self.generate_doc_batch(batch_size)
+
     # ---------------- index ----------------
     @util.print_for_call
     @retry(tries=120, delay=30)
@@ -177,10 +288,8 @@ class ElasticsearchIndex(EsSuper):
 
             # 2.) Index - multi thread or not
             logger.info("Start creating docs")
-            data_dict_list = list(self.generate_docs(self.documents))
-            div_data_dict_lists = util.div_list_len(data_dict_list, self.max_bulk_size)
-            for div_data_dict_list in div_data_dict_lists:
-                self.multi_index_docs(indices_name, div_data_dict_list, self.max_bulk_size)
+            for doc_chunk in self.generate_doc_chunks(self.documents, self.max_bulk_size):
+                self.multi_index_docs(indices_name, doc_chunk, self.max_bulk_size)
 
             # logger.info("Start refresh")
             # self.multi_refresh(indices_name)
@@ -60,19 +60,26 @@ class ESIndex(ESApi):
         assert all([future.result() for future in as_completed(futures)])
         return indices
 
+    def index_actions_generator(self, index_name_list, doc_count):
+        """
+        doc_count docs for each index, interleaved across the indices
+        :param index_name_list:
+        :param doc_count:
+        :return:
+        """
+        docs_generators = [self.docs_generator(doc_count) for _ in index_name_list]
+        for docs in zip(*docs_generators):
+            for index_name, doc in zip(index_name_list, docs):
+                yield {'_index': index_name, '_source': doc}
+
     @util.print_for_call
     def multi_index_docs(self, index_name_list, doc_count, bulk_size,
-                         doc_type='doc', max_retries=3):
-        pool = ThreadPoolExecutor(max_workers=100)
-        futures = []
-        for index_name in index_name_list:
-            futures.append(
-                pool.submit(self.bulk_actions,
-                            index_name,
-                            self.docs_generator(doc_count),
-                            bulk_size, doc_type, max_retries))
-        pool.shutdown()
-        return all([future.result() for future in as_completed(futures)])
+                         doc_type='doc', max_retries=3, thread_count=8):
+        summary = self.parallel_bulk_actions(
+            None, self.index_actions_generator(index_name_list, doc_count),
+            bulk_size, doc_type, max_retries, thread_count=thread_count)
+        self.refresh_index(','.join(index_name_list))
+        return summary.errors == 0
 
     @util.print_for_call
     def multi_delete_indices(self, index_list, name_start=None):
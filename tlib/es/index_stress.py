@@ -12,11 +12,12 @@ FYI: https://github.com/logzio/elasticsearch-stress-test
 import random
 import string
 import time
-import sys
+import signal
 import json
 # import urllib3
 import threading
-from threading import Lock, Thread, Condition, Event
+import multiprocessing
+from threading import Thread, Condition, Event
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from elasticsearch import Elasticsearch
@@ -25,6 +26,7 @@ from elasticsearch.exceptions import TransportError
 
 
 from tlib import log
+from tlib.ds import ThreadShards, ShardedCounter, LatencyHistogram
 from tlib.retry import retry
 from tlib.utils import util
 
@@ -36,6 +38,11 @@ logger = log.get_logger()
 
 ES_CONN_TIMEOUT = 10800  # 180 min = 180 * 60 = 10800
 ES_OPERATION_TIMEOUT = '180m'
+CLIENT_MODES = ('thread', 'process')
+STATS_FIELDS = ('success', 'failure', 'size')
+# Process mode stats slot per worker: success, failure, size, latency sum, latency buckets
+LATENCY_LAYOUT = LatencyHistogram()
+STATS_SLOT_SIZE = len(STATS_FIELDS) + 1 + LATENCY_LAYOUT.bucket_count
 
 
 class ElasticsearchObj(object):
@@ -168,7 +175,7 @@ class ESIndexStress(ElasticsearchObj):
 
     def __init__(self, esaddress, username, password, port, cafile, no_verify, indices, documents, clients, seconds,
                  number_of_shards, number_of_replicas, bulk_size, max_fields_per_document, max_size_per_field, cleanup,
-                 stats_frequency, green, index_name=None):
+                 stats_frequency, green, index_name=None, client_mode='thread'):
         super(ESIndexStress, self).__init__(esaddress, username, password, port, cafile, no_verify)
         self.esaddress = esaddress
         self.indices = indices
@@ -184,46 +191,96 @@ class ESIndexStress(ElasticsearchObj):
         self.stats_frequency = stats_frequency
         self.green = green
         self.index_name = index_name
+        if client_mode not in CLIENT_MODES:
+            raise Exception("Not support client mode {0}, choices: {1}".format(client_mode, CLIENT_MODES))
+        self.client_mode = client_mode  # thread: clients share one GIL, process: one process per client
 
         # Placeholders
         self.start_timestamp = 0
-        self.success_bulks = 0
-        self.failed_bulks = 0
-        self.total_size = 0
-
-        # Thread safe
-        self.success_lock = Lock()
-        self.fail_lock = Lock()
-        self.size_lock = Lock()
+
+        # Lock-free: per thread counter/latency(us) histogram shards, merged at read time
+        self.counters = ShardedCounter(STATS_FIELDS)
+        self.latency_shards = ThreadShards(LatencyHistogram)
+
+        # Process mode: per worker stats slots, each slot has only one writer
+        self.worker_id = None
+        self.shared_stats = None
+        self.shutdown_event = Event()
+
+    def __getstate__(self):
+        # Thread locals, locks, events and the ES connection can't be pickled to a worker process
+        state = self.__dict__.copy()
+        for key in ('_conn', 'counters', 'latency_shards', 'shutdown_event'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._conn = None
+        self.counters = ShardedCounter(STATS_FIELDS)
+        self.latency_shards = ThreadShards(LatencyHistogram)
         self.shutdown_event = Event()
 
     # Helper functions
     def increment_success(self):
-        # First, lock
-        self.success_lock.acquire()
-        try:
-            self.success_bulks += 1
-        finally:  # Just in case
-            # Release the lock
-            self.success_lock.release()
+        if self.shared_stats is not None:
+            self.shared_stats[self.worker_id * STATS_SLOT_SIZE] += 1
+            return
+        self.counters.add('success')
 
     def increment_failure(self):
-        # First, lock
-        self.fail_lock.acquire()
-        try:
-            self.failed_bulks += 1
-        finally:  # Just in case
-            # Release the lock
-            self.fail_lock.release()
+        if self.shared_stats is not None:
+            self.shared_stats[self.worker_id * STATS_SLOT_SIZE + 1] += 1
+            return
+        self.counters.add('failure')
 
     def increment_size(self, size):
-        # First, lock
-        self.size_lock.acquire()
-        try:
-            self.total_size += size
-        finally:  # Just in case
-            # Release the lock
-            self.size_lock.release()
+        if self.shared_stats is not None:
+            self.shared_stats[self.worker_id * STATS_SLOT_SIZE + 2] += size
+            return
+        self.counters.add('size', size)
+
+    def record_latency(self, latency_us):
+        latency_us = int(latency_us)
+        if self.shared_stats is not None:
+            offset = self.worker_id * STATS_SLOT_SIZE
+            self.shared_stats[offset + 3] += latency_us
+            self.shared_stats[offset + 4 + LATENCY_LAYOUT.bucket_index(latency_us)] += 1
+            return
+        self.latency_shards.local().record(latency_us)
+
+    @property
+    def success_bulks(self):
+        return self.get_stats()[0]
+
+    @property
+    def failed_bulks(self):
+        return self.get_stats()[1]
+
+    @property
+    def total_size(self):
+        return self.get_stats()[2]
+
+    def get_stats(self):
+        """
+        Merge the counter shards of the thread clients and the slots of all worker processes
+        :return: (success_bulks, failed_bulks, total_size, latency_histogram)
+        """
+        counters = self.counters.values()
+        success_bulks, failed_bulks, total_size = counters['success'], counters['failure'], counters['size']
+        histogram = LatencyHistogram()
+        for shard in self.latency_shards.shards():
+            histogram.merge(shard)
+
+        if self.shared_stats is not None and self.worker_id is None:
+            stats = self.shared_stats[:]
+            for offset in range(0, len(stats), STATS_SLOT_SIZE):
+                slot = stats[offset:offset + STATS_SLOT_SIZE]
+                success_bulks += slot[0]
+                failed_bulks += slot[1]
+                total_size += slot[2]
+                histogram.merge(LatencyHistogram.from_counts(slot[4:], slot[3]))
+        return success_bulks, failed_bulks, total_size, histogram
 
     def has_timeout(self, start_timestamp):
         # Match to the timestamp
@@ -275,25 +332,53 @@ class ESIndexStress(ElasticsearchObj):
             document_list.append(temp_doc)
         return document_list
 
+    @staticmethod
+    def serialize_bulk_lines(indices, document_list):
+        """
+        Pre-serialize the bulk action lines (one per index) and the documents
+        (one per filled document) into newline terminated bytes, so the bulk
+        body can be assembled without any json.dumps in the send loop.
+        :param indices:
+        :param document_list:
+        :return: (action_lines, doc_lines)
+        """
+        action_lines = [
+            json.dumps({"index": {"_index": index, "_type": "stresstest"}}).encode('utf-8') + b'\n'
+            for index in indices]
+        doc_lines = [json.dumps(doc).encode('utf-8') + b'\n' for doc in document_list]
+        return action_lines, doc_lines
+
+    def build_bulk_body(self, action_lines, doc_lines):
+        """
+        Assemble a bulk body from the pre-serialized buffers
+        :param action_lines:
+        :param doc_lines:
+        :return: bulk body bytes
+        """
+        choice = random.choice
+        body = []
+        for _ in range(self.bulk_size):
+            body.append(choice(action_lines))
+            body.append(choice(doc_lines))
+        return b''.join(body)
+
     def client_worker(self, indices, document_list):
         # Running until timeout
         thread_id = threading.current_thread()
         logger.info("Perform the bulk operation, bulk_size:{0} ({1})...".format(self.bulk_size, thread_id))
+        action_lines, doc_lines = self.serialize_bulk_lines(indices, document_list)
         while (not self.has_timeout(self.start_timestamp)) and (not self.shutdown_event.is_set()):
-            curr_bulk = ""
-            # Iterate over the bulk size
-            for _ in range(self.bulk_size):
-                # Generate the bulk operation
-                curr_bulk += "{0}\n".format(json.dumps({"index": {"_index": random.choice(indices),
-                                                                  "_type": "stresstest"}}))
-                curr_bulk += "{0}\n".format(json.dumps(random.choice(document_list)))
+            # Generate the bulk operation
+            curr_bulk = self.build_bulk_body(action_lines, doc_lines)
             try:
                 # Perform the bulk operation
+                start = time.perf_counter()
                 self.conn.bulk(body=curr_bulk, timeout=ES_OPERATION_TIMEOUT)
+                self.record_latency((time.perf_counter() - start) * 1000000)
                 # Adding to success bulks
                 self.increment_success()
-                # Adding to size (in bytes)
-                self.increment_size(sys.getsizeof(str(curr_bulk)))
+                # Adding to size (payload in bytes)
+                self.increment_size(len(curr_bulk))
             except Exception as e:
                 # Failed. incrementing failure
                 self.increment_failure()
@@ -311,6 +396,35 @@ class ESIndexStress(ElasticsearchObj):
         # Return the clients
         return temp_clients
 
+    def process_client_worker(self, worker_id, indices, documents_templates, shared_stats, shutdown_event):
+        """
+        Client worker run in a child process: own ES connection, own document list,
+        counters reported to the parent by the shared stats slot of worker_id
+        """
+        # The parent handles Ctrl-c and sets the shutdown event
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self._conn = None  # never reuse a connection forked from the parent
+        self.worker_id = worker_id
+        self.shared_stats = shared_stats
+        self.shutdown_event = shutdown_event
+        document_list = self.fill_documents(documents_templates)
+        self.client_worker(indices, document_list)
+
+    def generate_processes(self, indices, documents_templates):
+        # Shared counters: one stats slot per worker, no lock needed with a single writer per slot
+        self.shared_stats = multiprocessing.Array('Q', self.clients * STATS_SLOT_SIZE, lock=False)
+        self.shutdown_event = multiprocessing.Event()
+        temp_clients = []
+        for worker_id in range(self.clients):
+            # Each worker gets its own slice of indices, all indices if not enough to share
+            worker_indices = indices[worker_id::self.clients] if len(indices) >= self.clients else indices
+            temp_process = multiprocessing.Process(
+                target=self.process_client_worker,
+                args=(worker_id, worker_indices, documents_templates, self.shared_stats, self.shutdown_event))
+            temp_process.daemon = True
+            temp_clients.append(temp_process)
+        return temp_clients
+
     def generate_documents(self):
         # Documents placeholder
         temp_documents = []
@@ -336,12 +450,18 @@ class ESIndexStress(ElasticsearchObj):
         self.multi_create_indices(temp_indices, self.number_of_shards, self.number_of_replicas)
         return temp_indices
 
+    @staticmethod
+    def format_latency(histogram):
+        return ', '.join('p{0}={1:.2f}ms'.format(p, v / 1000.0) for p, v in histogram.percentiles().items())
+
     def print_stats(self):
         # Calculate elpased time
         elapsed_time = (int(time.time()) - self.start_timestamp)
 
+        success_bulks, failed_bulks, total_size, histogram = self.get_stats()
+
         # Calculate size in MB
-        size_mb = self.total_size / 1024 / 1024
+        size_mb = total_size / 1024 / 1024
 
         # Protect division by zero
         if elapsed_time == 0:
@@ -351,11 +471,28 @@ class ESIndexStress(ElasticsearchObj):
 
         # Print stats to the user
         logger.info("Elapsed time: {0} seconds".format(elapsed_time))
-        logger.info("Successful bulks: {0} ({1} documents)".format(self.success_bulks, (self.success_bulks * self.bulk_size)))
-        logger.info("Failed bulks: {0} ({1} documents)".format(self.failed_bulks, (self.failed_bulks * self.bulk_size)))
+        logger.info("Successful bulks: {0} ({1} documents)".format(success_bulks, (success_bulks * self.bulk_size)))
+        logger.info("Failed bulks: {0} ({1} documents)".format(failed_bulks, (failed_bulks * self.bulk_size)))
         logger.info("Indexed approximately {0} MB which is {1:.2f} MB/s".format(size_mb, mbs))
+        logger.info("Bulk latency: {0}, max={1:.2f}ms".format(self.format_latency(histogram), histogram.max / 1000.0))
         logger.info("")
 
+    def print_interval_stats(self, previous, interval):
+        """
+        Print the docs/s, MB/s and bulk latency percentiles since the previous stats
+        :param previous: the previous get_stats() result
+        :param interval: seconds since the previous stats
+        :return: current get_stats() result
+        """
+        current = self.get_stats()
+        success_bulks = current[0] - previous[0]
+        size_mb = (current[2] - previous[2]) / 1024 / 1024
+        histogram = current[3].diff(previous[3])
+        interval = interval or 1
+        logger.info("Interval {0:.0f}s: {1:.0f} docs/s, {2:.2f} MB/s, bulk latency: {3}".format(
+            interval, success_bulks * self.bulk_size / interval, size_mb / interval, self.format_latency(histogram)))
+        return current
+
     def print_stats_worker(self):
         # Create a conditional lock to be used instead of sleep (prevent dead locks)
         lock = Condition()
@@ -363,6 +500,9 @@ class ESIndexStress(ElasticsearchObj):
         # Acquire it
         lock.acquire()
 
+        previous = self.get_stats()
+        previous_time = time.time()
+
         # Print the stats every STATS_FREQUENCY seconds
         while (not self.has_timeout(self.start_timestamp)) and (not self.shutdown_event.is_set()):
 
@@ -373,6 +513,9 @@ class ESIndexStress(ElasticsearchObj):
             if not self.has_timeout(self.start_timestamp):
                 # Print stats
                 self.print_stats()
+                now = time.time()
+                previous = self.print_interval_stats(previous, now - previous_time)
+                previous_time = now
 
     def run(self):
         clients = []
@@ -398,16 +541,17 @@ class ESIndexStress(ElasticsearchObj):
             self.wait_for_green()
             logger.info("Done!")
 
-        logger.info("Generating documents and workers.. ")  # Generate the clients
-        clients.extend(self.generate_clients(indices, document_list))
+        logger.info("Generating documents and workers({0}).. ".format(self.client_mode))  # Generate the clients
+        if self.client_mode == 'process':
+            clients.extend(self.generate_processes(indices, documents_templates))
+        else:
+            clients.extend(self.generate_clients(indices, document_list))
         logger.info("Done!")
 
         logger.info("Starting the test. Will print stats every {0} seconds.".format(self.stats_frequency))
         logger.info("The test would run for {0} seconds, but it might take a bit more "
                        "because we are waiting for current bulk operation to complete.".format(self.seconds))
 
-        original_active_count = threading.active_count()
-
         # Run the clients!
         for d in clients:
             d.start()
@@ -425,27 +569,13 @@ class ESIndexStress(ElasticsearchObj):
                     logger.info("Ctrl-c received! Sending kill to threads...")
                     self.shutdown_event.set()
 
-                    # set loop flag true to get into loop
-                    flag = True
-                    while flag:
+                    # wait the bulk threads/processes complete!
+                    bulk_active_count = len([t for t in clients if t.is_alive()])
+                    while bulk_active_count > 0:
+                        print('bulk_active_count: {0}'.format(bulk_active_count))
                         # sleep 2 secs that we don't loop to often
                         time.sleep(2)
-                        '''
-                        # set loop flag to false. If there is no thread still alive it will stay false
-                        flag = False
-                        # loop through each running thread and check if it is alive
-                        for t in threading.enumerate():
-                            # if one single thread is still alive repeat the loop
-                            if t.isAlive():
-                                flag = True
-                        '''
-                        # wait the bulk threads complete!
-                        bulk_active_count = threading.active_count() - original_active_count
-                        if bulk_active_count > 0:
-                            print('bulk_active_count: {0}'.format(bulk_active_count))
-                            flag = True
-                        else:
-                            flag = False
+                        bulk_active_count = len([t for t in clients if t.is_alive()])
 
                     if self.cleanup:
                         logger.info("Cleaning up created indices.. ")
@@ -45,6 +45,7 @@ BULK_SIZE = args.bulk_size
 
 # Elasticsearch Stress Optional Parameters
 NUMBER_OF_CLIENTS = args.clients
+CLIENT_MODE = args.client_mode
 NUMBER_OF_SECONDS = args.seconds
 NUMBER_OF_SHARDS = args.number_of_shards
 NUMBER_OF_REPLICAS = args.number_of_replicas
@@ -99,7 +100,7 @@ class ESIndexStressTestCase(unittest.TestCase):
             NUMBER_OF_INDICES, NUMBER_OF_DOCUMENTS, NUMBER_OF_CLIENTS,
             NUMBER_OF_SECONDS, NUMBER_OF_SHARDS, NUMBER_OF_REPLICAS, BULK_SIZE,
             MAX_FIELDS_PER_DOCUMENT, MAX_SIZE_PER_FIELD, CLEANUP,
-            STATS_FREQUENCY, WAIT_FOR_GREEN, index_name='es_stress')
+            STATS_FREQUENCY, WAIT_FOR_GREEN, index_name='es_stress', client_mode=CLIENT_MODE)
         es_stress_obj.run()
 
     def test_cleanup(self):
@@ -4,4 +4,4 @@
 # @Author  : Tao.Xu
 # @Email   : tao.xu2008@outlook.com
 
-__all__ = ['lock_file']
\ No newline at end of file
+__all__ = ['lock_file', 'tree_compare', 'tree_generator', 'namespace_index', 'metadata_ops']
\ No newline at end of file
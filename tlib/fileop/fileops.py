@@ -15,12 +15,12 @@ import time
 import random
 import hashlib
 import itertools
-import filecmp
 import json
 import copy
 
 from tlib import log
 from tlib.utils import util
+from tlib.fileop.tree_compare import TreeComparator, MultiTreeComparator
 
 
 # ======================
@@ -53,6 +53,7 @@ class FileOps(object):
         self.FilesInNestedDir = []  # this will store all files in nested dir
         self.FilesInNewNestedDir = []  # this will store all files after nested dir rename
         self.Md5Csum = {}  # dict with filename as the key to hold md5 checksum after file creation
+        self.SyncLagReport = {}  # replica -> lag of the last wait_data_sync_list(fan_out=True) poll
         self.TopLevelDir = "Dir_" + time.strftime("%H%M%S")
         # self.cc_drive1 = sys.argv[1]
         # self.cc_drive2 = sys.argv[2]
@@ -728,71 +729,99 @@ class FileOps(object):
             logger.error(str(e))
             return False
 
-    def wait_data_sync(self, drive1, drive2, check_data=False, check_acls=False, retry=360):
+    def wait_data_sync(self, drive1, drive2, check_data=False, check_acls=False, retry=360, interval=30,
+                       workers=16):
         """
-        wait for data sync between drive1 and drive2
+        wait for data sync between drive1 and drive2, the whole tree is
+        compared at the first poll, then only the entries not synced yet
         @params:
           (char) drive1
           (char) drive2
+          (bool) check_data -- compare the files data, not only the names
+          (bool) check_acls -- compare the acls of all dirs
+          (int) retry -- the max polls
+          (int) interval -- seconds between polls
+          (int) workers -- threads to scandir/stat/hash the trees
         @output:
           (bool) True / False
         """
 
+        comparator = TreeComparator(drive1, drive2, check_data, workers)
+        acl_dirs = None  # the dirs to check acls, all common dirs at first
+        tree_synced = False  # only the acls are waited once the tree passed
         for x in range(1, retry + 1):
             sync_flag = False
             try:
-                obj_filecmp = filecmp.dircmp(drive1, drive2)
-                left_right_only = obj_filecmp.left_only + obj_filecmp.right_only
-                if left_right_only:
-                    sync_flag = False
-                    logger.warning('FAIL: Check meta sync between %s and %s ' % (drive1, drive2))
-                    logger.warning("Wait to meta sync between %s and %s --> \n %s" % (drive1, drive2, json.dumps(left_right_only, indent=4)))
-                    util.sleep_progressbar(30)
-                    continue
-                else:
-                    if check_data and obj_filecmp.diff_files:
-                        # logger.warning('FAIL: Check data sync(all file the same) between %s and %s ' % (drive1, drive2))
+                if not tree_synced:
+                    diff = comparator.compare()
+                    if not diff.meta_synced:
+                        logger.warning('FAIL: Check meta sync between %s and %s ' % (drive1, drive2))
+                        logger.warning("Wait to meta sync between %s and %s --> \n %s" % (
+                            drive1, drive2, json.dumps(diff.left_only + diff.right_only + diff.funny, indent=4)))
+                        util.sleep_progressbar(interval)
+                        continue
+                    if check_data and diff.diff_files:
                         logger.warning("Wait to data sync between %s and %s --> \n %s" % (
-                                            drive1, drive2, json.dumps(obj_filecmp.diff_files, indent=4)))
-                        util.sleep_progressbar(30)
+                                            drive1, drive2, json.dumps(diff.diff_files, indent=4)))
+                        util.sleep_progressbar(interval)
                         continue
-                    if check_acls:
-                        drive1_acls = self.get_acls(drive1)
-                        drive2_acls = self.get_acls(drive2)
-                        not_sync_acls_list = util.get_list_difference(drive1_acls, drive2_acls)
-                        if not_sync_acls_list:
-                            sync_flag = False
-                            # logger.warning('FAIL: Check acls sync between %s and %s ' % (drive1, drive2))
-                            logger.warning("Wait to acls sync between %s and %s --> \n %s" % (
-                                                drive1, drive2, json.dumps(not_sync_acls_list, indent=4)))
-                            util.sleep_progressbar(30)
-                            continue
-
-                    sync_flag = True
-                    logger.info('PASS: Check data sync between %s and %s (check_data=%s, check_acls=%s)' % (drive1, drive2, check_data, check_acls))
-                    break
+                    tree_synced = True
+                if check_acls:
+                    if acl_dirs is None:
+                        acl_dirs = comparator.common_dirs()
+                    not_sync_acls = self.diff_acls(drive1, drive2, acl_dirs)
+                    acl_dirs = sorted(not_sync_acls)
+                    if not_sync_acls:
+                        logger.warning("Wait to acls sync between %s and %s --> \n %s" % (
+                                            drive1, drive2, json.dumps(not_sync_acls, indent=4)))
+                        util.sleep_progressbar(interval)
+                        continue
+
+                sync_flag = True
+                logger.info('PASS: Check data sync between %s and %s (check_data=%s, check_acls=%s)' % (drive1, drive2, check_data, check_acls))
+                break
             except Exception as e:
                 logger.error("ERROR: run wait_data_sync, Will retry %d/%d \n %s" % (x, retry, str(e)))
                 if 'Access is denied' in str(e):
                     break
-                util.sleep_progressbar(30)
+                util.sleep_progressbar(interval)
                 continue
         else:
             sync_flag = False
             logger.error('Check data sync timeout between %s and %s (check_data=%s, check_acls=%s)...' % (drive1, drive2, check_data, check_acls))
 
-        if len(obj_filecmp.common_dirs) > 0:
-            for item in obj_filecmp.common_dirs:
-                self.wait_data_sync(os.path.join(drive1,item), os.path.abspath(os.path.join(drive2,item)), check_data, check_acls, retry)
-
         return sync_flag
 
-    def wait_data_sync_list(self, drive_base, drive_list, check_data=False, check_acls=False, retry=360):
+    def diff_acls(self, drive1, drive2, rel_dirs):
+        """
+        the acls differences of the dirs between drive1 and drive2
+        @params:
+          (char) drive1
+          (char) drive2
+          (list) rel_dirs -- the dirs relative to the drives, '' for the drive
+        @output:
+          (dict) rel_dir -> not synced acls
+        """
+        not_sync_acls = {}
+        for rel_dir in rel_dirs:
+            drive1_acls = self.get_acls(os.path.join(drive1, rel_dir))
+            drive2_acls = self.get_acls(os.path.join(drive2, rel_dir))
+            not_sync_acls_list = util.get_list_difference(drive1_acls, drive2_acls)
+            if not_sync_acls_list:
+                not_sync_acls[rel_dir] = not_sync_acls_list
+        return not_sync_acls
+
+    def wait_data_sync_list(self, drive_base, drive_list, check_data=False, check_acls=False, retry=360,
+                            fan_out=False, interval=30, workers=16):
         """
         wait for data sync between drive_base and all drive_list, return False once anyone can not sync
         @params:
           (char) drive_base
           (char) drive_list
+          (bool) fan_out -- scan drive_base once per poll and check all drives
+            concurrently, the per drive lag is saved in self.SyncLagReport
+          (int) interval -- seconds between polls
+          (int) workers -- threads to scandir/stat/hash per tree
         @output:
           (bool) True / False
         """
@@ -805,13 +834,59 @@ class FileOps(object):
             logger.warning("No drive need to be sync from %s!" % drive_base)
             return True
 
+        if fan_out:
+            return self._wait_data_sync_fan_out(drive_base, sync_drive_list, check_data, check_acls, retry,
+                                                interval, workers)
+
         for drive_tmp in sync_drive_list:
-            sync_flag = self.wait_data_sync(drive_base, drive_tmp, check_data, check_acls, retry)
+            sync_flag = self.wait_data_sync(drive_base, drive_tmp, check_data, check_acls, retry, interval, workers)
             if not sync_flag:
                 return False
 
         return True
 
+    def _wait_data_sync_fan_out(self, drive_base, drive_list, check_data, check_acls, retry, interval, workers):
+        """
+        wait for data sync between drive_base and all drive_list concurrently
+        """
+        comparator = MultiTreeComparator(drive_base, drive_list, check_data, workers)
+        acl_dirs = {}  # drive -> the dirs to check acls
+        for x in range(1, retry + 1):
+            try:
+                diffs = comparator.compare()
+                self.SyncLagReport = comparator.lag_report()
+                not_sync = {}
+                for drive_tmp, diff in diffs.items():
+                    if not diff.meta_synced:
+                        not_sync[drive_tmp] = 'meta'
+                    elif check_data and diff.diff_files:
+                        not_sync[drive_tmp] = 'data'
+                    elif check_acls:
+                        if drive_tmp not in acl_dirs:
+                            acl_dirs[drive_tmp] = comparator.comparators[drive_tmp].common_dirs()
+                        not_sync_acls = self.diff_acls(drive_base, drive_tmp, acl_dirs[drive_tmp])
+                        acl_dirs[drive_tmp] = sorted(not_sync_acls)
+                        if not_sync_acls:
+                            not_sync[drive_tmp] = 'acls'
+                            self.SyncLagReport[drive_tmp]['acls'] = not_sync_acls
+                if not not_sync:
+                    logger.info('PASS: Check data sync between %s and %s (check_data=%s, check_acls=%s)' % (
+                        drive_base, drive_list, check_data, check_acls))
+                    return True
+                logger.warning("Wait to sync from %s, poll %d/%d --> \n %s" % (
+                    drive_base, x, retry, json.dumps(
+                        dict((drive_tmp, dict(self.SyncLagReport[drive_tmp], wait=wait))
+                             for drive_tmp, wait in not_sync.items()), indent=4, default=str)))
+            except Exception as e:
+                logger.error("ERROR: run wait_data_sync_list, Will retry %d/%d \n %s" % (x, retry, str(e)))
+                if 'Access is denied' in str(e):
+                    return False
+            util.sleep_progressbar(interval)
+
+        logger.error('Check data sync timeout between %s and %s (check_data=%s, check_acls=%s)...' % (
+            drive_base, drive_list, check_data, check_acls))
+        return False
+
 
     def create_longname_dir(self, drive, number_dirs):
         """
@@ -27,6 +27,9 @@ from collections import Iterable
 
 from tlib import log
 from tlib.platform.cmd import DosCmd, MacCmd
+from tlib.fileop.tree_generator import TreeSpec, TreeGenerator
+from tlib.fileop.namespace_index import NamespaceIndex
+from tlib.fileop.metadata_ops import MetadataOps
 
 # =============================
 # --- Global
@@ -280,12 +283,46 @@ class IFS(Base):
 
 class IPath(Base):
     """ Represents a path for a directory, file or link """
+    _index = None
 
     def __init__(self, cache=None):
         """
         debug  - Set to true if the caller wants debug to be enabled
         """
         Base.__init__(self, cache)
+        self.LastOpsResult = None  # MetadataResult of the last batched metadata operation
+
+    def SetIndex(self, index):
+        """
+        Set the namespace index shared by all IPath/IDir/IFile, kept up to date by
+        Create/Rename/Delete, and queried by the useIndex/inIndex options
+        :param index: NamespaceIndex, or None to stop indexing
+        """
+        IPath._index = index
+        return 0
+
+    def GetIndex(self):
+        return IPath._index
+
+    def BuildIndex(self, root, manifest=None, workers=16):
+        """
+        Build and set the namespace index of root
+        :param root: Path of the tree root
+        :param manifest: The csv manifest of CreateTree, else scan the tree
+        :param workers: Number of threads to scan the tree
+        :return: Returns the NamespaceIndex
+        """
+        if manifest:
+            index = NamespaceIndex.from_manifest(root, manifest)
+        else:
+            index = NamespaceIndex.from_scan(root, workers)
+        self.SetIndex(index)
+        return index
+
+    def _GetIndex(self):
+        if IPath._index is None:
+            raise Exception('Namespace index is not set, see IPath.BuildIndex')
+        return IPath._index
 
     def PathExists(self, path):
         """
@@ -387,21 +424,46 @@ class IPath(Base):
         """ Rename file/dir in source path to destination path, throws exception otherwise """
         try:
             os.rename(path, newPath)
+            if IPath._index is not None:
+                IPath._index.rename(path, newPath)
             return 0
         except Exception as e:
             logger.error("Path: Rename failed. %s -> %s\n%s: %s" % (path, newPath, e.__class__.__name__, e))
             raise
 
-    def RenameAll(self, filelist, newprefix="prerenamed", prefixflag=True):
+    def RenameAll(self, filelist, newprefix="prerenamed", prefixflag=True, workers=1, opsPerSec=None):
         """
         Rename the files from filelist by adding newprefix
         :param filelist: List of files to rename
         :param newprefix: The prefix used on rename. Default to prerenamed
-        :return: Return the final list of filenames
-        """
+        :param workers: Number of threads renaming in parallel
+        :param opsPerSec: Rate limit of the renames, None for no limit
+        :return: Return the final list of filenames, the MetadataResult of the parallel renames
+                 (workers > 1 or opsPerSec) is in self.LastOpsResult
+        """
+        if workers == 1 and not opsPerSec:
+            return self._RenameAllSerial(filelist, newprefix, prefixflag)
+        logger.info("filelist len %s newprefix %s workers %s opsPerSec %s" % \
+                    (len(filelist), newprefix, workers, opsPerSec))
+        pairs = []
+        for filename in filelist:
+            dname = os.path.dirname(filename)
+            fname = os.path.basename(filename)
+            if prefixflag:
+                dest_name = os.path.join(dname, "%s_%s" % (newprefix, fname))
+            else:
+                dest_name = os.path.join(dname, "%s_%s" % (fname, newprefix))
+            pairs.append((filename, dest_name))
+        self.LastOpsResult = MetadataOps(workers, opsPerSec, index=IPath._index).rename(pairs)
+        if self.LastOpsResult.failures:
+            error_list = [pair for pair, _ in self.LastOpsResult.failures]
+            logger.warning("error_list: len %s %s" % (len(error_list), error_list))
+            return [1]
+        return self.LastOpsResult.outputs
+
+    def _RenameAllSerial(self, filelist, newprefix="prerenamed", prefixflag=True):
         logger.info("filelist %s newprefix %s" % (filelist, newprefix))
         error_list = []
-        new_list = []
         # Only returns the final list
         new_list = []
         for filename in filelist:
@@ -488,14 +550,22 @@ class IPath(Base):
         else:
             raise Exception('ValidatePathExists: Unsupported validation type %d' % vType)
 
-    def GetDirListing(self, dirlist, vType, list_flag=True):
+    def GetDirListing(self, dirlist, vType, list_flag=True, useIndex=False):
         """
         Get directory listing for all directories in dirlist
         :param filelist: List of files in full path that exists in filesystem
         :param vType: Supported vType is 1 for exists and 0 for not exists
         :param list_flag: Set this flag to list directory content
+        :param useIndex: Get the listing from the namespace index, no filesystem calls
         :return: Returns a list of files from dirlist with each directory name as key
         """
+        if useIndex:
+            index = self._GetIndex()
+            dlisting = {}
+            for dname in set(os.path.dirname(fpath) for fpath in dirlist):
+                if index.is_dir(dname) and vType == 1:
+                    dlisting[dname] = index.listdir(dname) if list_flag else []
+            return dlisting
         logger.info("dirlist %s vType %s list_flag %s" % \
                        (dirlist, vType, list_flag))
         dset = set([fpath[:fpath.rindex('\\')] for fpath in dirlist])
@@ -516,15 +586,25 @@ class IPath(Base):
                                (dname, retcode))
         return dlisting
 
-    def ValidateAllPathExists(self, filelist, vType=1):
+    def ValidateAllPathExists(self, filelist, vType=1, useIndex=False):
         """
         Validates all paths in filelist exists
         :param filelist: List of files in full path that exists in filesystem
         :param vType: Supported vType is 1 for exists and 0 for not exists
+        :param useIndex: Validate against the namespace index, no filesystem calls
         Return Value:
         0     - In case of success
         1     - In case of Error
         """
+        if useIndex:
+            index = self._GetIndex()
+            error_list = [filename for filename in filelist if index.exists(filename) != (vType == 1)]
+            logger.info("found_cnt %s len filelist %s in index" % (len(filelist) - len(error_list), len(filelist)))
+            if error_list:
+                dlisting = self.GetDirListing(error_list, 1, useIndex=True)
+                raise Exception("ValidateAllPathExists error cnt %s errorlst %s dlisting %s" % \
+                                (len(error_list), error_list, dlisting))
+            return 0
         found_cnt = 0
         error_list = []
         for filename in filelist:
@@ -556,12 +636,16 @@ class IPath(Base):
             raise Exception("ValidateAllPathExists error cnt %s errorlst %s dlisting %s" % \
                             (len(error_list), error_list, dlisting))
 
-    def getPathDepth(self, path, startFrom=None):
+    def getPathDepth(self, path, startFrom=None, useIndex=False):
         """
         # Returns depth of dir or file path
         # param path: File or dirpath whose depth to be returned
         # param startFrom: If None returns absolute depth else relative to startFrom
+        # param useIndex: Depth of an indexed path from the index root, or relative to startFrom
         """
+        if useIndex:
+            return self._GetIndex().depth(path, startFrom)
+
         if os.name != 'nt':
             raise Exception('Not implemented for Unix platform.')
 
@@ -628,6 +712,8 @@ class IDir(IPath):
             if recursive and not os.path.isdir(parent):
                 self.__Create(parent, recursive, fail_if_exists)
             os.mkdir(path)
+            if IPath._index is not None:
+                IPath._index.add(path, is_dir=True)
 
         except OSError as e:
             if not fail_if_exists and str(e).startswith("[Error 183]"):
@@ -635,7 +721,9 @@ class IDir(IPath):
             logger.error('Failed to create dir %s\n%s: %s' % (path, type(e).__name__, e))
             raise
 
-    def List(self, path, incDir=True, recursive=True, inCache=False):
+    def List(self, path, incDir=True, recursive=True, inCache=False, inIndex=False):
+        if inIndex:
+            return self._GetIndex().list(path, incDir, recursive)
         if inCache:
             return self._ListInCache(path, incDir, recursive)
         else:
@@ -682,6 +770,8 @@ class IDir(IPath):
                         continue
                     IFile().Delete(p)
             os.rmdir(dirPath)
+            if IPath._index is not None:
+                IPath._index.remove(dirPath)
 
         except Exception as e:
             logger.error('Failed to delete dir %s\n%s: %s' % (dirPath, e.__class__.__name__, e))
@@ -712,10 +802,23 @@ class IDir(IPath):
             files.append(p)
         return files
 
-    def GetRandomPath(self, path, dir, dirDepth):
+    def GetRandomPath(self, path, dir, dirDepth, useIndex=False):
         if path == None or path == '' or dir == None or dir == '' or dirDepth == 0:
             raise Exception('GetRandomPath: path, dir or dir depth is empty')
 
+        if useIndex:
+            # A random one of the existing path/dir, path/dir/dir, ... in the index
+            index = self._GetIndex()
+            paths = []
+            for _ in range(dirDepth):
+                path = os.path.join(path, dir)
+                if not index.is_dir(path):
+                    break
+                paths.append(path)
+            if not paths:
+                raise Exception('GetRandomPath: %s not in the index' % path)
+            return random.choice(paths)
+
         depth = random.randint(1, dirDepth)
         while depth > 0:
             path = os.path.join(path, dir)
@@ -844,6 +947,38 @@ class IFile(IPath):
         else:
             return filelist
 
+    def CreateTree(self, path, levels, subdirs, fname, ncnt, size, ext, data=None, mode="rw", subdirname="dname",
+                   workers=16, manifest=None, checksum=False, leaf_only=False, seed=None):
+        """
+        Bulk create a tree of subdirs ** levels directories with ncnt files in each directory,
+        on a thread pool, see tree_generator. Only a summary is logged, the files are listed
+        in the manifest, check them by tree_generator.verify_manifest
+        :param path: Path to base directory
+        :param levels: Number of levels of directory to create
+        :param subdirs: Number of sub-directories to create in each directory
+        :param fname: Name prefix for filename
+        :param ncnt: Number of files to create in each directory
+        :param size: Size of files in bytes, or (min, max), or [(size, weight), ...]
+        :param ext: File extension name
+        :param data: The data to repeat. If none then random lines, or 'random'/'zero'
+        :param mode: Supported mode or 'r' and 'rw'
+        :param subdirname: Name of the prefix in sub-directories
+        :param workers: Number of writer threads
+        :param manifest: Path of the csv manifest, default <path>.manifest.csv
+        :param checksum: md5 of each file in the manifest
+        :param leaf_only: create files in the deepest directories only
+        :param seed: same seed same sizes, and same data if not random
+        :return: Returns the summary dict(root, manifest, dirs, files, bytes, elapsed, files_per_s, mb_per_s)
+        """
+        spec = TreeSpec(depth=levels, fan_out=subdirs, files_per_dir=ncnt, size=size,
+                        pattern='text' if data is None else data, dir_prefix=subdirname,
+                        file_prefix=fname, ext=ext, leaf_only=leaf_only, seed=seed)
+        mode = stat.S_IREAD if mode.lower() == "r" else None
+        summary = TreeGenerator(spec, workers, mode, checksum).generate(path, manifest)
+        if IPath._index is not None:
+            IPath._index.load_manifest(summary['manifest'], path)
+        return summary
+
     def _flatten(self, items, ignore_types=(str, bytes)):
         """
         Flatten a multi-level deep list into a single level list
@@ -900,6 +1035,8 @@ class IFile(IPath):
                 self.CheckExists(path)
             if mode is not None and ext != '.slog':
                 os.chmod(path, mode)
+            if IPath._index is not None:
+                IPath._index.add(path)
             return 0
         except Exception as e:
             logger.error("Failed to create file %s\n%s: %s" % (path, type(e).__name__, e))
@@ -996,24 +1133,54 @@ class IFile(IPath):
         self.Close(path, fd)
         return 0
 
-    def TouchFiles(self, filelist, delay):
+    def TouchFiles(self, filelist, delay, workers=1, opsPerSec=None):
         """
         Touch all the files in filelist
         :param filelist: List of files to select from
-        :return: 0, 1
+        :param delay: Seconds to sleep before touching
+        :param workers: Number of threads touching in parallel
+        :param opsPerSec: Rate limit of the touches, None for no limit
+        :return: 0, or 1 if filelist is empty; raise if touching a file failed. The MetadataResult
+                 of the parallel touches (workers > 1 or opsPerSec) is in self.LastOpsResult
         """
-        logger.info('filelist %s' % (filelist))
         if delay:
             time.sleep(int(delay))
         if filelist is None or len(filelist) == 0:
             logger.warning('error filelist :%s:' % (filelist))
             return 1
-        for filepath in filelist:
-            logger.info('file %s' % (filepath))
-            ret = self.Touch(filepath)
-            if ret != 0:
-                logger.warning('error file %s ret %s' % (filepath, ret))
-                return 1
+        if workers == 1 and not opsPerSec:
+            for filepath in filelist:
+                logger.info('file %s' % (filepath))
+                ret = self.Touch(filepath)
+                if ret != 0:
+                    logger.warning('error file %s ret %s' % (filepath, ret))
+                    return 1
+            return 0
+        self.LastOpsResult = MetadataOps(workers, opsPerSec).touch(filelist)
+        if self.LastOpsResult.failures:
+            path, e = self.LastOpsResult.failures[0]
+            raise Exception('TouchFiles: %s of %s failed, %s\n%s: %s' % (
+                len(self.LastOpsResult.failures), len(filelist), path, type(e).__name__, e))
+        return 0
+
+    def ChmodFiles(self, filelist, mode="r", workers=1, opsPerSec=None):
+        """
+        Change the mode of all the files in filelist
+        :param filelist: List of files
+        :param mode: Supported mode is 'r' or 'rw', or a stat mode
+        :param workers: Number of threads in parallel
+        :param opsPerSec: Rate limit, None for no limit
+        :return: 0; the MetadataResult is in self.LastOpsResult
+        """
+        if mode == "r":
+            mode = stat.S_IREAD
+        elif mode == "rw":
+            mode = stat.S_IWRITE | stat.S_IREAD
+        self.LastOpsResult = MetadataOps(workers, opsPerSec).chmod(filelist, mode)
+        if self.LastOpsResult.failures:
+            path, e = self.LastOpsResult.failures[0]
+            raise Exception('ChmodFiles: %s of %s failed, %s\n%s: %s' % (
+                len(self.LastOpsResult.failures), len(filelist), path, type(e).__name__, e))
         return 0
 
     def TouchRandomFiles(self, filelist, cnt, seed):
@@ -1246,6 +1413,8 @@ class IFile(IPath):
             try:
                 if os.path.exists(path):
                     os.remove(path)
+                    if IPath._index is not None:
+                        IPath._index.remove(path)
                     root, ext = os.path.splitext(path)
                     logger.info('root=%s ext=%s' % (root, ext))
                     if ext != '.slog':  # To bypass windows cache, adding retry for .slog files
@@ -1270,23 +1439,36 @@ class IFile(IPath):
                 'IFile: Delete failed for %s after #%d retries\n%s: %s' % (path, retry, type(ex).__name__, ex))
         return 0
 
-    def DeleteFiles(self, fileList):
+    def DeleteFiles(self, fileList, workers=1, opsPerSec=None):
         """
         This interface Deletes the list of input files.
         :param fileList: list of files to be deleted
+        :param workers: Number of threads deleting in parallel
+        :param opsPerSec: Rate limit of the deletes, None for no limit
+        :return: 0, 1; raise if deleting a file failed. The MetadataResult of the parallel
+                 deletes (workers > 1 or opsPerSec) is in self.LastOpsResult
         """
-        logger.info('Deleting fileList %s' % fileList)
         if fileList == None or len(fileList) == 0:
             raise Exception('error fileList %s' % fileList)
-        retcodes = 0
-        for file in fileList:
-            logger.info('Deleting file %s' % file)
-            retcode = self.Delete(file)
-            retcodes += retcode
-        if retcodes > 0:
-            return 1
-        else:
-            return 0
+        if workers == 1 and not opsPerSec:
+            logger.info('Deleting fileList %s' % fileList)
+            retcodes = 0
+            for file in fileList:
+                logger.info('Deleting file %s' % file)
+                retcode = self.Delete(file)
+                retcodes += retcode
+            if retcodes > 0:
+                return 1
+            else:
+                return 0
+        logger.info('Deleting fileList len %s workers %s opsPerSec %s' % (len(fileList), workers, opsPerSec))
+        # each by Delete: the retries of sharing violation and the not exists check
+        self.LastOpsResult = MetadataOps(workers, opsPerSec).run('delete', self.Delete, fileList)
+        if self.LastOpsResult.failures:
+            path, e = self.LastOpsResult.failures[0]
+            raise Exception('DeleteFiles: %s of %s failed, %s\n%s: %s' % (
+                len(self.LastOpsResult.failures), len(fileList), path, type(e).__name__, e))
+        return 0
 
     def Extend(self, path, size, data=None):
         """
@@ -0,0 +1,250 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/8 10:15
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Batched parallel metadata operations
+Rename/touch/chmod/delete a list of paths on a thread pool, one task per
+batch of paths, optionally paced to ops_per_s. Every operation is timed into a
+per thread LatencyHistogram(microseconds), the failures are collected rather
+than raised, and only a summary is logged:
+    ops = MetadataOps(workers=32, ops_per_s=5000)
+    result = ops.rename([(src, dst), ...])
+    result.ops_per_s, result.percentiles(), result.failures
+so the same call is a metadata benchmark(ops/s at a concurrency).
+"""
+
+import os
+import time
+import errno
+import stat
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from tlib import log
+from tlib.ds import ThreadShards, LatencyHistogram
+
+# ======================
+# --- Global
+# ======================
+logger = log.get_logger()
+
+
+class RateLimiter(object):
+    """
+    Pace the callers of acquire() to ops_per_s in total, shared by threads
+    """
+
+    def __init__(self, ops_per_s):
+        self.interval = 1.0 / ops_per_s
+        self._next = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.time()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class MetadataResult(object):
+    """
+    The result of a batch of metadata operations
+    """
+
+    def __init__(self, op, total, outputs, failures, histogram, elapsed, workers, ops_per_s_limit=None):
+        """
+        :param op: rename, touch, chmod, delete, ...
+        :param total: the number of operations
+        :param outputs: the output of each succeeded operation, in the input order
+        :param failures: list of (item, error)
+        :param histogram: LatencyHistogram of the operations, in microseconds
+        :param elapsed: seconds
+        :param workers:
+        :param ops_per_s_limit:
+        """
+        self.op = op
+        self.total = total
+        self.outputs = outputs
+        self.failures = failures
+        self.histogram = histogram
+        self.elapsed = elapsed
+        self.workers = workers
+        self.ops_per_s_limit = ops_per_s_limit
+
+    @property
+    def succeeded(self):
+        return self.total - len(self.failures)
+
+    @property
+    def ok(self):
+        return not self.failures
+
+    @property
+    def ops_per_s(self):
+        return self.total / self.elapsed if self.elapsed else 0
+
+    def percentiles(self, percents=(50, 90, 99, 99.9)):
+        """:return: OrderedDict(percent -> latency in ms)"""
+        return OrderedDict((p, v / 1000.0) for p, v in self.histogram.percentiles(percents).items())
+
+    def to_dict(self):
+        return OrderedDict([
+            ('op', self.op),
+            ('total', self.total),
+            ('succeeded', self.succeeded),
+            ('failed', len(self.failures)),
+            ('workers', self.workers),
+            ('ops_per_s_limit', self.ops_per_s_limit),
+            ('elapsed', round(self.elapsed, 3)),
+            ('ops_per_s', round(self.ops_per_s, 1)),
+            ('latency_mean_ms', round(self.histogram.mean / 1000.0, 3)),
+            ('latency_max_ms', self.histogram.max / 1000.0),
+            ('latency_ms', OrderedDict(('p{0}'.format(p), v) for p, v in self.percentiles().items())),
+        ])
+
+    def __str__(self):
+        return '{0}: {1}/{2} ok in {3:.3f}s, {4:.1f} ops/s with {5} workers, latency mean {6:.3f}ms, {7}'.format(
+            self.op, self.succeeded, self.total, self.elapsed, self.ops_per_s, self.workers,
+            self.histogram.mean / 1000.0, ', '.join('p{0} {1:.3f}ms'.format(p, v) for p, v in self.percentiles().items()))
+
+
+class MetadataOps(object):
+    """
+    Run metadata operations on a thread pool
+    """
+
+    def __init__(self, workers=16, ops_per_s=None, batch_size=64, index=None):
+        """
+        :param workers: threads
+        :param ops_per_s: the rate limit of all workers, None for no limit
+        :param batch_size: paths per task
+        :param index: NamespaceIndex to update by rename/delete
+        """
+        self.workers = max(int(workers), 1)
+        self.ops_per_s = ops_per_s
+        self.batch_size = max(int(batch_size), 1)
+        self.index = index
+
+    def run(self, op, func, items):
+        """
+        Call func(item) of each item
+        :param op: the operation name
+        :param func: raise on failure, the return is the output
+        :param items:
+        :return: MetadataResult
+        """
+        items = list(items)
+        limiter = RateLimiter(self.ops_per_s) if self.ops_per_s else None
+        histograms = ThreadShards(LatencyHistogram)
+        perf_counter_ns = time.perf_counter_ns
+
+        def _run_batch(batch):
+            histogram = histograms.local()
+            outputs, failures = [], []
+            for item in batch:
+                if limiter:
+                    limiter.acquire()
+                start = perf_counter_ns()
+                try:
+                    outputs.append(func(item))
+                except Exception as e:
+                    failures.append((item, e))
+                histogram.record((perf_counter_ns() - start) // 1000)
+            return outputs, failures
+
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        outputs, failures = [], []
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch_outputs, batch_failures in pool.map(_run_batch, batches):
+                outputs.extend(batch_outputs)
+                failures.extend(batch_failures)
+        elapsed = time.time() - start
+
+        histogram = LatencyHistogram()
+        for shard in histograms.shards():
+            histogram.merge(shard)
+        result = MetadataResult(op, len(items), outputs, failures, histogram, elapsed, self.workers, self.ops_per_s)
+        logger.info(str(result))
+        if failures:
+            logger.warning('{0} failed: {1} of {2}, first: {3} {4}'.format(
+                op, len(failures), len(items), failures[0][0], failures[0][1]))
+        return result
+
+    def rename(self, pairs):
+        """
+        :param pairs: list of (path, new path)
+        :return: MetadataResult, the outputs are the new paths
+        """
+        def _rename(pair):
+            os.rename(*pair)
+            if self.index is not None:
+                self.index.rename(*pair)
+            return pair[1]
+
+        return self.run('rename', _rename, pairs)
+
+    def touch(self, paths):
+        """
+        Open and close each file, like IFile.Touch
+        :param paths:
+        :return: MetadataResult
+        """
+        def _touch(path):
+            os.close(os.open(path, os.O_RDWR))
+            return path
+
+        return self.run('touch', _touch, paths)
+
+    def utime(self, paths, times=None):
+        """
+        Set the access and modified times of each path
+        :param paths:
+        :param times: (atime, mtime), None for now
+        :return: MetadataResult
+        """
+        def _utime(path):
+            os.utime(path, times)
+            return path
+
+        return self.run('utime', _utime, paths)
+
+    def chmod(self, paths, mode):
+        """
+        :param paths:
+        :param mode: eg: stat.S_IREAD
+        :return: MetadataResult
+        """
+        def _chmod(path):
+            os.chmod(path, mode)
+            return path
+
+        return self.run('chmod', _chmod, paths)
+
+    def delete(self, paths, missing_ok=False):
+        """
+        Remove each file, clear the read only bit and retry once if denied
+        :param paths:
+        :param missing_ok: a missing file is not a failure
+        :return: MetadataResult
+        """
+        def _delete(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                if e.errno == errno.ENOENT and missing_ok:
+                    return path
+                if e.errno != errno.EACCES:
+                    raise
+                os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+                os.remove(path)
+            if self.index is not None:
+                self.index.remove(path)
+            return path
+
+        return self.run('delete', _delete, paths)
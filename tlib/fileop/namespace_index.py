@@ -0,0 +1,369 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/6 14:20
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""In-memory namespace index of a tree
+A trie of the path components(interned) under a root: each dir is a dict of
+name -> dict(sub dir) or None(file). Loaded from a tree_generator manifest or
+one parallel scan, then existence, listing, depth and random path queries are
+answered in memory, and kept up to date by add/remove/rename of the caller.
+eg:
+    index = NamespaceIndex.from_scan('/mnt/share/ns_test', workers=32)
+    IPath().SetIndex(index)
+    new_files = IPath().RenameAll(files)                 # the index follows
+    IPath().ValidateAllPathExists(new_files, useIndex=True)
+"""
+
+import os
+import sys
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from tlib import log
+
+# ======================
+# --- Global
+# ======================
+logger = log.get_logger()
+intern = sys.intern
+
+
+def _list_dir(path):
+    """
+    :return: [(name, is_dir)]
+    """
+    names = []
+    for entry in os.scandir(path):
+        try:
+            names.append((entry.name, entry.is_dir(follow_symlinks=False)))
+        except OSError:
+            # deleted while scanning
+            continue
+    return names
+
+
+class NamespaceIndex(object):
+    """
+    The dirs and files under a root, in memory
+    """
+
+    def __init__(self, root):
+        """
+        :param root: the indexed tree root, paths out of it are not indexed
+        """
+        self.root = os.path.normpath(os.path.abspath(root))
+        self._root_parts = self._split(self.root)
+        self._tree = {}
+        self._files = 0
+        self._dirs = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_manifest(cls, root, manifest_path):
+        """
+        :param root: the tree root
+        :param manifest_path: the csv manifest of tree_generator
+        :return: NamespaceIndex
+        """
+        index = cls(root)
+        index.load_manifest(manifest_path)
+        return index
+
+    @classmethod
+    def from_scan(cls, root, workers=16):
+        """
+        :param root: the tree root
+        :param workers: the dirs listed in parallel
+        :return: NamespaceIndex
+        """
+        index = cls(root)
+        index.scan(workers)
+        return index
+
+    @staticmethod
+    def _split(path):
+        return [part for part in os.path.normpath(path).split(os.sep) if part]
+
+    def _parts(self, path):
+        """
+        The components of path relative to the root, None if out of the root
+        """
+        parts = self._split(os.path.abspath(path))
+        root_len = len(self._root_parts)
+        if parts[:root_len] != self._root_parts:
+            return None
+        return parts[root_len:]
+
+    def _node(self, parts):
+        """dict of a dir, None of a file, raise KeyError if not indexed"""
+        node = self._tree
+        for part in parts:
+            node = node[part]
+        return node
+
+    def _insert(self, parts, is_dir):
+        node = self._tree
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is None:
+                child = node[intern(part)] = {}
+                self._dirs += 1
+            node = child
+        name = parts[-1]
+        if name in node:
+            return
+        if is_dir:
+            node[intern(name)] = {}
+            self._dirs += 1
+        else:
+            node[intern(name)] = None
+            self._files += 1
+
+    @staticmethod
+    def _count(node):
+        """(dirs, files) in a dir node"""
+        dirs = files = 0
+        stack = [node]
+        while stack:
+            for child in stack.pop().values():
+                if child is None:
+                    files += 1
+                else:
+                    dirs += 1
+                    stack.append(child)
+        return dirs, files
+
+    def load_manifest(self, manifest_path, root=None):
+        """
+        Add the files(and their dirs) of a tree_generator manifest
+        :param manifest_path:
+        :param root: the generated tree root, default the index root
+        :return:
+        """
+        from tlib.fileop.tree_generator import load_manifest
+        base = self._parts(root) if root else []
+        if base is None:
+            raise Exception('NamespaceIndex: {0} is out of {1}'.format(root, self.root))
+        with self._lock:
+            for path in load_manifest(manifest_path):
+                self._insert(base + self._split(path), False)
+        logger.info('Indexed {0}: {1} dirs, {2} files from {3}'.format(
+            self.root, self._dirs, self._files, manifest_path))
+
+    def scan(self, workers=16):
+        """
+        Add the tree under the root, listing dirs in parallel
+        :param workers:
+        :return:
+        """
+        with self._lock, ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_list_dir, self.root): []}
+            while futures:
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    parts = futures.pop(future)
+                    try:
+                        names = future.result()
+                    except (IOError, OSError) as e:
+                        if not parts:
+                            raise
+                        logger.debug('Scan {0} failed: {1}'.format(os.path.join(self.root, *parts), e))
+                        continue
+                    for name, is_dir in names:
+                        sub_parts = parts + [name]
+                        self._insert(sub_parts, is_dir)
+                        if is_dir:
+                            futures[pool.submit(_list_dir, os.path.join(self.root, *sub_parts))] = sub_parts
+        logger.info('Indexed {0}: {1} dirs, {2} files by scan'.format(self.root, self._dirs, self._files))
+
+    def __len__(self):
+        return self._dirs + self._files
+
+    def __contains__(self, path):
+        return self.exists(path)
+
+    @property
+    def dir_count(self):
+        return self._dirs
+
+    @property
+    def file_count(self):
+        return self._files
+
+    def add(self, path, is_dir=False):
+        """
+        Add a created path, the missing parents are added as dirs
+        :param path:
+        :param is_dir:
+        :return:
+        """
+        parts = self._parts(path)
+        if not parts:
+            return
+        with self._lock:
+            self._insert(parts, is_dir)
+
+    def remove(self, path):
+        """
+        Remove a deleted path, with the sub tree of a dir
+        :param path:
+        :return: True if it was indexed
+        """
+        parts = self._parts(path)
+        if not parts:
+            return False
+        with self._lock:
+            try:
+                parent = self._node(parts[:-1])
+                node = parent.pop(parts[-1])
+            except (KeyError, TypeError, AttributeError):
+                return False
+            if node is None:
+                self._files -= 1
+            else:
+                dirs, files = self._count(node)
+                self._dirs -= dirs + 1
+                self._files -= files
+            return True
+
+    def rename(self, path, new_path):
+        """
+        Move a renamed path(and the sub tree of a dir), an indexed new_path
+        is replaced like os.rename
+        :param path:
+        :param new_path:
+        :return: True if path was indexed
+        """
+        parts, new_parts = self._parts(path), self._parts(new_path)
+        with self._lock:
+            try:
+                node = self._node(parts[:-1])[parts[-1]]
+            except (KeyError, TypeError, IndexError):
+                # not indexed, index new_path as it is now
+                if new_parts:
+                    self._insert(new_parts, os.path.isdir(new_path))
+                return False
+            self.remove(path)
+            if new_parts:
+                self.remove(new_path)
+                self._insert(new_parts, node is not None)
+                if node is not None:
+                    self._node(new_parts[:-1])[new_parts[-1]] = node
+                    dirs, files = self._count(node)
+                    self._dirs += dirs
+                    self._files += files
+            return True
+
+    def exists(self, path):
+        parts = self._parts(path)
+        if parts is None:
+            return False
+        try:
+            self._node(parts)
+            return True
+        except (KeyError, TypeError):
+            return False
+
+    def is_dir(self, path):
+        parts = self._parts(path)
+        try:
+            return parts is not None and self._node(parts) is not None
+        except (KeyError, TypeError):
+            return False
+
+    def is_file(self, path):
+        parts = self._parts(path)
+        try:
+            return bool(parts) and self._node(parts) is None
+        except (KeyError, TypeError):
+            return False
+
+    def listdir(self, path):
+        """
+        The names in a dir, like os.listdir
+        :param path:
+        :return:
+        """
+        parts = self._parts(path)
+        try:
+            node = self._node(parts) if parts is not None else None
+        except (KeyError, TypeError):
+            node = None
+        if node is None:
+            raise Exception('NamespaceIndex: Directory {0} is not indexed'.format(path))
+        return sorted(node)
+
+    def list(self, path, inc_dir=True, recursive=True):
+        """
+        The paths under a dir, like IDir.List
+        :param path:
+        :param inc_dir: include the dirs
+        :param recursive:
+        :return: list of full paths
+        """
+        if self.is_file(path):
+            return [path]
+        node = self._node(self._parts(path)) if self.is_dir(path) else None
+        if node is None:
+            raise Exception('NamespaceIndex: Directory {0} is not indexed'.format(path))
+        paths = []
+        stack = [(os.path.join(path, name), node[name]) for name in sorted(node, reverse=True)]
+        while stack:
+            full_path, node = stack.pop()
+            if node is None:
+                paths.append(full_path)
+                continue
+            if inc_dir:
+                paths.append(full_path)
+            if recursive:
+                stack.extend((os.path.join(full_path, name), node[name]) for name in sorted(node, reverse=True))
+        return paths
+
+    def depth(self, path, start_from=None):
+        """
+        The depth of an indexed path
+        :param path:
+        :param start_from: None for the depth from the root, else relative to start_from
+        :return:
+        """
+        if not self.exists(path):
+            raise Exception('NamespaceIndex: {0} is not indexed'.format(path))
+        depth = len(self._parts(path))
+        if start_from is not None:
+            start_parts = self._parts(start_from)
+            if start_parts is None:
+                raise Exception('NamespaceIndex: {0} is out of {1}'.format(start_from, self.root))
+            depth -= len(start_parts)
+        return depth
+
+    def random_path(self, path=None, files=True, dirs=True, max_depth=None, rng=random):
+        """
+        A random indexed path under path, by a random walk down from path,
+        stopping at a dir by chance, so not uniform over the paths
+        :param path: default the root
+        :param files: may return a file
+        :param dirs: may return a dir
+        :param max_depth: the max depth relative to path
+        :param rng: random.Random
+        :return: the full path, None if nothing matches
+        """
+        path = path or self.root
+        node = self._node(self._parts(path)) if self.is_dir(path) else None
+        if node is None:
+            raise Exception('NamespaceIndex: Directory {0} is not indexed'.format(path))
+        depth = 0
+        while True:
+            names = [name for name, child in node.items() if child is not None or files]
+            if max_depth is not None and depth >= max_depth or not names:
+                return path if dirs and depth else None
+            if dirs and depth and rng.random() < 1.0 / (len(names) + 1):
+                return path
+            name = rng.choice(names)
+            path = os.path.join(path, name)
+            node = node[name]
+            depth += 1
+            if node is None:
+                return path
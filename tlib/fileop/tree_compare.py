@@ -0,0 +1,387 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/1 14:20
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+r"""Compare two directory trees, incrementally
+Both trees are walked by os.scandir on a thread pool into manifests:
+    relative path -> (is_dir, size, mtime_ns)
+The entries out of sync are kept as pending, the next compare() only
+re-checks the pending entries(and the subtrees of the dirs which were only on
+one side), so polling a replica costs the entries not synced yet, not the
+whole tree. Once the pending entries are all synced, one more full scan
+confirms it(changes out of the pending entries are found there).
+
+Like filecmp.dircmp, a name on one side only is reported once at the top
+most level, and with check_data two files are the same if (size, mtime) are
+equal, else by the content hash(cached by (size, mtime) across polls).
+
+MultiTreeComparator compares a base tree with many replicas: the base is
+scanned once per round and shared, the replicas are compared concurrently,
+a replica confirmed in sync is not compared again.
+
+Example:
+    comparator = TreeComparator(r'\\host1\share', r'\\host2\share', check_data=True)
+    while not comparator.compare().in_sync:
+        time.sleep(5)
+"""
+
+import os
+import stat
+import hashlib
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from tlib import log
+
+# ======================
+# --- Global
+# ======================
+logger = log.get_logger()
+LEFT, RIGHT = 0, 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class TreeDiff(namedtuple('TreeDiff', ['left_only', 'right_only', 'funny', 'diff_files'])):
+    """
+    The entries out of sync, relative paths:
+        left_only/right_only: on one side only
+        funny: a dir on one side, not a dir on the other
+        diff_files: the files with different data, only if check_data
+    """
+
+    @property
+    def meta_synced(self):
+        return not (self.left_only or self.right_only or self.funny)
+
+    @property
+    def in_sync(self):
+        return self.meta_synced and not self.diff_files
+
+    def __len__(self):
+        return len(self.left_only) + len(self.right_only) + len(self.funny) + len(self.diff_files)
+
+
+def file_hash(path, hash_name='md5'):
+    """
+    The hex digest of the file content
+    :param path:
+    :param hash_name: hashlib algorithm name
+    :return:
+    """
+    hash_obj = hashlib.new(hash_name)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+def _scan_dir(root, rel):
+    """
+    One level of root/rel
+    :return: (dict(relative path -> (is_dir, size, mtime_ns)), [sub dirs])
+    """
+    entries = {}
+    sub_dirs = []
+    for entry in os.scandir(os.path.join(root, rel) if rel else root):
+        path = os.path.join(rel, entry.name) if rel else entry.name
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            # deleted while scanning
+            continue
+        entries[path] = (is_dir, st.st_size, st.st_mtime_ns)
+        if is_dir:
+            sub_dirs.append(path)
+    return entries, sub_dirs
+
+
+def _parent(path):
+    return os.path.dirname(path)
+
+
+class TreeComparator(object):
+    """
+    Compare a left tree with a right tree, re-check only the pending entries
+    """
+
+    def __init__(self, left, right, check_data=False, workers=16, hash_name='md5',
+                 left_manifest=None, hashes=None):
+        """
+        :param left: the source dir
+        :param right: the replica dir
+        :param check_data: compare the file data too, not only the names
+        :param workers: the threads to scandir/stat/hash
+        :param hash_name: the content hash for files with the same size but
+            different mtime
+        :param left_manifest: the left manifest shared with other comparators
+        :param hashes: the hash cache shared with other comparators
+        """
+        self.roots = (left, right)
+        self.check_data = check_data
+        self.workers = workers
+        self.hash_name = hash_name
+        self.manifests = ({} if left_manifest is None else left_manifest, {})
+        # (root, path) -> (size, mtime_ns, digest)
+        self._hashes = {} if hashes is None else hashes
+        self.pending = None  # None until the first full scan
+        self.last_diff = None
+
+    # -- scan ------------------------------------------------------------
+    def _scan(self, pool, side_rels):
+        """
+        Scan the sub trees in parallel, update the manifests
+        :param pool: ThreadPoolExecutor
+        :param side_rels: [(side, relative dir)], '' for the root
+        :return: the scanned paths of each side
+        """
+        scanned = (set(), set())
+        futures = dict((pool.submit(_scan_dir, self.roots[side], rel), (side, rel)) for side, rel in side_rels)
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                side, rel = futures.pop(future)
+                try:
+                    entries, sub_dirs = future.result()
+                except (IOError, OSError) as e:
+                    if not rel:
+                        raise
+                    # the dir was removed while scanning
+                    logger.debug('Scan {0} failed: {1}'.format(os.path.join(self.roots[side], rel), e))
+                    continue
+                self.manifests[side].update(entries)
+                scanned[side].update(entries)
+                for sub_dir in sub_dirs:
+                    futures[pool.submit(_scan_dir, self.roots[side], sub_dir)] = (side, sub_dir)
+        return scanned
+
+    def _stat(self, side, path):
+        try:
+            st = os.lstat(os.path.join(self.roots[side], path))
+        except (IOError, OSError):
+            return None
+        return stat.S_ISDIR(st.st_mode), st.st_size, st.st_mtime_ns
+
+    def _restat(self, pool, paths):
+        """Re-stat the paths on both sides, update the manifests"""
+        jobs = [(side, path) for path in paths for side in (LEFT, RIGHT)]
+        for (side, path), entry in zip(jobs, pool.map(lambda job: self._stat(*job), jobs)):
+            if entry is None:
+                self.manifests[side].pop(path, None)
+            else:
+                self.manifests[side][path] = entry
+
+    # -- compare ---------------------------------------------------------
+    def _hash(self, side, path):
+        _, size, mtime_ns = self.manifests[side][path]
+        key = (self.roots[side], path)
+        cached = self._hashes.get(key)
+        if cached and cached[:2] == (size, mtime_ns):
+            return cached[2]
+        digest = file_hash(os.path.join(*key), self.hash_name)
+        self._hashes[key] = (size, mtime_ns, digest)
+        return digest
+
+    def _same_data(self, path):
+        left_entry, right_entry = self.manifests[LEFT][path], self.manifests[RIGHT][path]
+        if left_entry[1] != right_entry[1]:
+            return False
+        if left_entry[2] == right_entry[2]:
+            return True
+        try:
+            return self._hash(LEFT, path) == self._hash(RIGHT, path)
+        except (IOError, OSError):
+            # still being written/replicated
+            return False
+
+    def _diff(self, pool, paths):
+        """
+        Compare the paths of the manifests
+        :return: TreeDiff
+        """
+        left, right = self.manifests
+        left_only, right_only, funny, common_files = [], [], [], []
+        for path in paths:
+            in_left, in_right = path in left, path in right
+            if in_left and in_right:
+                if left[path][0] != right[path][0]:
+                    funny.append(path)
+                elif not left[path][0]:
+                    common_files.append(path)
+            elif in_left:
+                # report the top most only
+                if not _parent(path) or _parent(path) in right:
+                    left_only.append(path)
+            elif in_right:
+                if not _parent(path) or _parent(path) in left:
+                    right_only.append(path)
+        diff_files = []
+        if self.check_data and common_files:
+            diff_files = [path for path, same in zip(common_files, pool.map(self._same_data, common_files))
+                          if not same]
+        return TreeDiff(sorted(left_only), sorted(right_only), sorted(funny), sorted(diff_files))
+
+    def compare(self):
+        """
+        Full compare at the first call, then re-check the pending entries, a
+        full compare again if they are all synced
+        :return: TreeDiff
+        """
+        full = self.pending is None
+        diff = self._compare(full)
+        if diff.in_sync and not full:
+            diff = self._compare(full=True)
+        return self._set_diff(diff)
+
+    def _set_diff(self, diff):
+        self.last_diff = diff
+        self.pending = set(diff.left_only + diff.right_only + diff.funny + diff.diff_files)
+        return diff
+
+    def scan_left(self):
+        """Full scan the left tree only"""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self.manifests[LEFT].clear()
+            self._scan(pool, [(LEFT, '')])
+
+    def _compare(self, full, scan_left=True):
+        """
+        :param full: full compare, else re-check the pending entries
+        :param scan_left: scan the left tree for a full compare, False if the
+            shared left manifest is scanned already
+        :return: TreeDiff
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            if full:
+                sides = [LEFT, RIGHT] if scan_left else [RIGHT]
+                for side in sides:
+                    self.manifests[side].clear()
+                self._scan(pool, [(side, '') for side in sides])
+                paths = set(self.manifests[LEFT]) | set(self.manifests[RIGHT])
+            else:
+                self._restat(pool, self.pending)
+                paths = set(self.pending)
+                # the dirs were on one side only, their sub trees were not compared
+                one_side = self.last_diff.left_only + self.last_diff.right_only + self.last_diff.funny
+                new_dirs = [path for path in one_side
+                            if self.manifests[LEFT].get(path, (False,))[0] and
+                            self.manifests[RIGHT].get(path, (False,))[0]]
+                if new_dirs:
+                    # drop the stale entries under the dirs, then rescan
+                    prefixes = tuple(os.path.join(path, '') for path in new_dirs)
+                    for side in (LEFT, RIGHT):
+                        for stale in [p for p in list(self.manifests[side]) if p.startswith(prefixes)]:
+                            del self.manifests[side][stale]
+                    scanned = self._scan(pool, [(side, path) for path in new_dirs for side in (LEFT, RIGHT)])
+                    paths.update(scanned[LEFT] | scanned[RIGHT])
+            return self._diff(pool, paths)
+
+    def lag(self):
+        """
+        How far the right tree is behind the left, by the last compare
+        :return: dict(missing, extra, differing, bytes_behind), missing counts
+            the files under the missing dirs too
+        """
+        left, right = self.manifests
+        diff = self.last_diff
+        if diff is None:
+            return None
+        prefixes = tuple(os.path.join(path, '') for path in diff.left_only)
+        missing = bytes_behind = 0
+        for path in diff.left_only:
+            entry = left.get(path)
+            if entry and not entry[0]:
+                missing += 1
+                bytes_behind += entry[1]
+        if prefixes:
+            for path, entry in list(left.items()):
+                if not entry[0] and path.startswith(prefixes):
+                    missing += 1
+                    bytes_behind += entry[1]
+        for path in diff.diff_files:
+            entry = left.get(path)
+            if entry:
+                bytes_behind += max(entry[1] - right.get(path, (False, 0))[1], 0)
+        return dict(missing=missing, extra=len(diff.right_only), differing=len(diff.diff_files) + len(diff.funny),
+                    bytes_behind=bytes_behind)
+
+    def common_dirs(self):
+        """The relative paths of the dirs on both sides, '' for the root"""
+        left, right = self.manifests
+        return [''] + sorted(path for path, entry in left.items()
+                             if entry[0] and right.get(path, (False,))[0])
+
+
+class MultiTreeComparator(object):
+    """
+    Compare a base tree with many replicas, the base is scanned once per round
+    """
+
+    def __init__(self, base, replicas, check_data=False, workers=16, hash_name='md5'):
+        """
+        :param base: the source dir
+        :param replicas: the replica dirs
+        :param check_data:
+        :param workers: the threads to scandir/stat/hash per tree
+        :param hash_name:
+        """
+        self.base = base
+        self.base_manifest = {}
+        hashes = {}
+        self.comparators = OrderedDict(
+            (replica, TreeComparator(base, replica, check_data, workers, hash_name, self.base_manifest, hashes))
+            for replica in replicas)
+        self.diffs = OrderedDict()
+        # the replicas a full compare found in sync, not compared again
+        self.confirmed = set()
+
+    def compare(self):
+        """
+        Compare the replicas not confirmed in sync yet concurrently, full at
+        the first call, then re-check the pending entries of each replica, and
+        a full compare for the replicas whose pending entries are all synced.
+        A replica a full compare found in sync keeps its diff in later rounds.
+        :return: OrderedDict(replica -> TreeDiff)
+        """
+        comparators = self.comparators
+        active = [replica for replica in comparators if replica not in self.confirmed]
+        diffs = OrderedDict((replica, comparators[replica].last_diff) for replica in comparators)
+        if not active:
+            self.diffs = diffs
+            return diffs
+        first = all(comparators[replica].pending is None for replica in active)
+        with ThreadPoolExecutor(max_workers=len(active)) as pool:
+            if first:
+                comparators[active[0]].scan_left()
+                results = pool.map(lambda r: comparators[r]._compare(full=True, scan_left=False), active)
+            else:
+                results = pool.map(lambda r: comparators[r]._compare(full=False), active)
+            diffs.update(zip(active, results))
+
+            confirm = [replica for replica in active if diffs[replica].in_sync and not first]
+            if confirm:
+                comparators[confirm[0]].scan_left()
+                for replica, diff in zip(confirm, pool.map(
+                        lambda r: comparators[r]._compare(full=True, scan_left=False), confirm)):
+                    diffs[replica] = diff
+        for replica in active:
+            comparators[replica]._set_diff(diffs[replica])
+            if diffs[replica].in_sync:
+                # by a full compare: the first round or confirm
+                self.confirmed.add(replica)
+        self.diffs = diffs
+        return diffs
+
+    def lag_report(self):
+        """
+        :return: OrderedDict(replica -> dict(in_sync, missing, extra, differing, bytes_behind))
+        """
+        report = OrderedDict()
+        for replica, comparator in self.comparators.items():
+            lag = comparator.lag()
+            if lag is not None:
+                lag['in_sync'] = comparator.last_diff.in_sync
+            report[replica] = lag
+        return report
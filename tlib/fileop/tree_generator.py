@@ -0,0 +1,304 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/7/3 11:05
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Bulk file tree generator
+Create a tree of dirs and files by a TreeSpec(depth, fan out, files per dir,
+size distribution, content pattern) on a thread pool:
+  - all dirs are created first, level by level, without exists checks
+  - each task writes the files of one dir with os.open/os.write/os.close
+  - the content is sliced(zero copy) from one pre-built buffer per pattern
+  - only a summary is logged, every file is listed in a csv manifest
+    (path, size, md5), so validation needs no walk(see verify_manifest)
+
+Example:
+    spec = TreeSpec(depth=3, fan_out=10, files_per_dir=100, size=(1024, 65536))
+    summary = TreeGenerator(spec, workers=32).generate('/mnt/share/ns_test', 'ns_test.csv')
+"""
+
+import os
+import csv
+import time
+import random
+import string
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from tlib import log
+
+# ======================
+# --- Global
+# ======================
+logger = log.get_logger()
+BLOCK_SIZE = 1024 * 1024
+LINE_LENGTH = 80
+MANIFEST_HEADER = ('path', 'size', 'md5')
+
+
+def build_buffer(pattern, size=BLOCK_SIZE * 2, seed=None):
+    """
+    A content buffer to slice files from
+    :param pattern: random, zero, text(80 chars lines of A-Z0-9) or bytes/str
+        to repeat
+    :param size:
+    :param seed: for random and text, None: os.urandom for random
+    :return: bytes
+    """
+    if pattern == 'random':
+        if seed is None:
+            return os.urandom(size)
+        return random.Random(seed).getrandbits(size * 8).to_bytes(size, 'little')
+    if pattern == 'zero':
+        return bytes(size)
+    if pattern == 'text':
+        rng = random.Random(seed)
+        chars = (string.ascii_uppercase + string.digits).encode()
+        line = bytes(rng.choice(chars) for _ in range(LINE_LENGTH - 1)) + b'\n'
+    else:
+        line = pattern.encode() if isinstance(pattern, str) else bytes(pattern)
+        if not line:
+            raise Exception("Content pattern is empty")
+    return (line * (size // len(line) + 1))[:size]
+
+
+class TreeSpec(object):
+    """
+    The shape of a generated tree
+    """
+
+    def __init__(self, depth=1, fan_out=1, files_per_dir=10, size=4096, pattern='random',
+                 dir_prefix='dname', file_prefix='file', ext='dat', leaf_only=False, seed=None):
+        """
+        :param depth: the levels of dirs under the root, 0 for files in root only
+        :param fan_out: the sub dirs per dir
+        :param files_per_dir: the files per dir, root included
+        :param size: file size in bytes, int, (min, max) for uniform, or
+            [(size, weight), ...] for weighted sizes
+        :param pattern: the content, see build_buffer
+        :param dir_prefix: dirs are named <dir_prefix>_<n>
+        :param file_prefix: files are named <file_prefix>_<n>.<ext>
+        :param ext:
+        :param leaf_only: files in the deepest dirs only
+        :param seed: the seed of sizes and content offsets, same seed same tree
+        """
+        if depth < 0 or fan_out < 1 or files_per_dir < 0:
+            raise Exception("Invalid tree spec: depth={0}, fan_out={1}, files_per_dir={2}".format(
+                depth, fan_out, files_per_dir))
+        self.depth = depth
+        self.fan_out = fan_out
+        self.files_per_dir = files_per_dir
+        self.size = size
+        self.pattern = pattern
+        self.dir_prefix = dir_prefix
+        self.file_prefix = file_prefix
+        self.ext = ext
+        self.leaf_only = leaf_only
+        self.seed = random.randrange(1 << 30) if seed is None else seed
+
+    @property
+    def max_size(self):
+        if isinstance(self.size, int):
+            return self.size
+        if isinstance(self.size, tuple):
+            return self.size[1]
+        return max(size for size, _ in self.size)
+
+    def size_sampler(self, rng):
+        """
+        :param rng: random.Random
+        :return: a function() -> the next file size
+        """
+        if isinstance(self.size, int):
+            return lambda: self.size
+        if isinstance(self.size, tuple):
+            low, high = self.size
+            return lambda: rng.randint(low, high)
+        sizes = [size for size, _ in self.size]
+        weights = [weight for _, weight in self.size]
+        return lambda: rng.choices(sizes, weights)[0]
+
+    def iter_levels(self):
+        """
+        The relative dir paths level by level, '' for the root
+        :return: generator of [dirs of the level]
+        """
+        level = ['']
+        yield level
+        for _ in range(self.depth):
+            level = [os.path.join(parent, '{0}_{1}'.format(self.dir_prefix, n))
+                     for parent in level for n in range(self.fan_out)]
+            yield level
+
+    @property
+    def dir_count(self):
+        return sum(self.fan_out ** n for n in range(self.depth + 1))
+
+    @property
+    def file_count(self):
+        dirs = self.fan_out ** self.depth if self.leaf_only else self.dir_count
+        return dirs * self.files_per_dir
+
+
+class TreeGenerator(object):
+    """
+    Create the tree of a TreeSpec with a thread pool
+    """
+
+    def __init__(self, spec, workers=16, mode=None, checksum=False):
+        """
+        :param spec: TreeSpec
+        :param workers: writer threads
+        :param mode: chmod each file if set, eg: stat.S_IREAD
+        :param checksum: md5 each file into the manifest
+        """
+        self.spec = spec
+        self.workers = workers
+        self.mode = mode
+        self.checksum = checksum
+        self._buffer = None
+
+    def _write_dir(self, root, rel_dir, dir_index):
+        """
+        Write the files of one dir
+        :return: list of (relative path, size, md5)
+        """
+        spec = self.spec
+        rng = random.Random('{0}-{1}'.format(spec.seed, dir_index))
+        next_size = spec.size_sampler(rng)
+        view = memoryview(self._buffer)
+        window = len(self._buffer) - BLOCK_SIZE
+        rows = []
+        for n in range(spec.files_per_dir):
+            rel_path = os.path.join(rel_dir, '{0}_{1}.{2}'.format(spec.file_prefix, n, spec.ext))
+            path = os.path.join(root, rel_path)
+            size = next_size()
+            offset = rng.randrange(window) if window > 0 else 0
+            md5 = hashlib.md5() if self.checksum else None
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+            try:
+                left = size
+                while left > 0:
+                    chunk = view[offset:offset + min(left, BLOCK_SIZE)]
+                    written = os.write(fd, chunk)
+                    if md5:
+                        md5.update(chunk[:written])
+                    left -= written
+            finally:
+                os.close(fd)
+            if self.mode is not None:
+                os.chmod(path, self.mode)
+            rows.append((rel_path, size, md5.hexdigest() if md5 else ''))
+        return rows
+
+    def generate(self, root, manifest_path=None):
+        """
+        Create the tree under root
+        :param root: the dir to create the tree in
+        :param manifest_path: the csv manifest, default <root>.manifest.csv
+        :return: OrderedDict(root, manifest, dirs, files, bytes, elapsed,
+            files_per_s, mb_per_s)
+        """
+        spec = self.spec
+        manifest_path = manifest_path or root.rstrip('/\\') + '.manifest.csv'
+        self._buffer = build_buffer(spec.pattern, BLOCK_SIZE + max(min(spec.max_size, BLOCK_SIZE), 1),
+                                    spec.seed)
+        start = time.time()
+        levels = list(spec.iter_levels())
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        files = total_bytes = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, open(manifest_path, 'w') as manifest_file:
+            # dirs, level by level so the parents exist
+            for level in levels[1:]:
+                list(pool.map(lambda rel: os.mkdir(os.path.join(root, rel)), level))
+
+            writer = csv.writer(manifest_file)
+            writer.writerow(MANIFEST_HEADER)
+            file_dirs = levels[-1] if spec.leaf_only else [rel for level in levels for rel in level]
+            if spec.files_per_dir:
+                # a bounded window of tasks, the rows of 10M files are never all in memory
+                tasks = iter(enumerate(file_dirs))
+                futures = set()
+                while True:
+                    for dir_index, rel_dir in tasks:
+                        futures.add(pool.submit(self._write_dir, root, rel_dir, dir_index))
+                        if len(futures) >= self.workers * 4:
+                            break
+                    if not futures:
+                        break
+                    done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        rows = future.result()
+                        writer.writerows(rows)
+                        files += len(rows)
+                        total_bytes += sum(row[1] for row in rows)
+        elapsed = time.time() - start
+        summary = OrderedDict([
+            ('root', root),
+            ('manifest', manifest_path),
+            ('dirs', spec.dir_count - 1),
+            ('files', files),
+            ('bytes', total_bytes),
+            ('elapsed', round(elapsed, 3)),
+            ('files_per_s', round(files / elapsed, 1) if elapsed else 0),
+            ('mb_per_s', round(total_bytes / 1024.0 / 1024 / elapsed, 1) if elapsed else 0),
+        ])
+        logger.info('Generated tree {root}: {dirs} dirs, {files} files, {bytes} bytes in {elapsed}s '
+                    '({files_per_s} files/s, {mb_per_s} MB/s), manifest: {manifest}'.format(**summary))
+        return summary
+
+
+def load_manifest(manifest_path):
+    """
+    :param manifest_path: the csv manifest of TreeGenerator.generate
+    :return: OrderedDict(relative path -> (size, md5))
+    """
+    manifest = OrderedDict()
+    with open(manifest_path, 'r') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for path, size, md5 in reader:
+            manifest[path] = (int(size), md5)
+    return manifest
+
+
+def verify_manifest(root, manifest_path, workers=16, check_data=False):
+    """
+    Check the files of a manifest by stat(and md5 if check_data), no walk
+    :param root: the tree root
+    :param manifest_path:
+    :param workers:
+    :param check_data: compare the md5 if the manifest has
+    :return: dict(missing=[paths], wrong_size=[paths], wrong_data=[paths])
+    """
+    manifest = load_manifest(manifest_path)
+
+    def _check(item):
+        path, (size, md5) = item
+        full_path = os.path.join(root, path)
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return 'missing'
+        if st.st_size != size:
+            return 'wrong_size'
+        if check_data and md5:
+            hash_md5 = hashlib.md5()
+            with open(full_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(BLOCK_SIZE), b''):
+                    hash_md5.update(chunk)
+            if hash_md5.hexdigest() != md5:
+                return 'wrong_data'
+        return None
+
+    result = dict(missing=[], wrong_size=[], wrong_data=[])
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path, error in zip(manifest, pool.map(_check, manifest.items(), chunksize=256)):
+            if error:
+                result[error].append(path)
+    logger.info('Verified {0} files of {1}: {2}'.format(
+        len(manifest), manifest_path, ', '.join('{0} {1}'.format(k, len(v)) for k, v in sorted(result.items()))))
+    return result
@@ -16,6 +16,7 @@ from kubernetes.stream import stream
 from kubernetes.client.rest import ApiException
 
 from tlib import log
+from tlib import decorators
 from tlib.utils import util
 from tlib.retry import retry
 
@@ -325,6 +326,7 @@ class KubernetesApi(object):
 
         return node_ips_list
 
+    @decorators.Memoize(expire_sec=300)
     def get_node_ip_by_name(self, node_name, ip_type='ExternalIP'):
         node_data = self.corev1api.read_node(node_name)
         for ip_info in node_data.status.addresses:
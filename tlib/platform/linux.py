@@ -342,7 +342,8 @@ def get_cpu_usage(intvl_in_sec=1):
     namedtuple CPUInfo
     """
     decorators.needlinux(True)
-    unittest.TestCase.assertGreater(intvl_in_sec, 0)
+    if intvl_in_sec <= 0:
+        raise ValueError('intvl_in_sec should be greater than 0')
     ret = []
     for i in range(0, len(_CPU_COLUMNS)):
         ret.append(0)
@@ -366,7 +367,8 @@ def get_cpu_core_usage(coreindex, intvl_in_sec=1):
         cpu core index
     """
     decorators.needlinux(True)
-    unittest.TestCase.assertGreater(intvl_in_sec, 0)
+    if intvl_in_sec <= 0:
+        raise ValueError('intvl_in_sec should be greater than 0')
     ret = []
     ret = [0 for _ in _CPU_COLUMNS]
     cpu_info0 = _get_cput_by_stat(coreindex)
@@ -549,6 +551,40 @@ def net_io_counters():
     return retdict
 
 
+def disk_io_counters(all_devices=False):
+    """
+    get disk I/O statistics from /proc/diskstats, a tuple per disk
+    (read_count, write_count, read_bytes, write_bytes, read_time, write_time),
+    times in ms
+    :param all_devices: include partitions, loop, ram, dm and md devices, which
+        count the I/O of the disks again, default whole disks only
+    example
+    ::
+       {
+           'sda': (1032113, 2836511, 31457402880, 118623199232, 2238061, 7302234)
+       }
+    """
+    decorators.needlinux(True)
+    fhandle = open("/proc/diskstats", "r")
+    try:
+        lines = fhandle.readlines()
+    finally:
+        fhandle.close()
+    disks = None if all_devices else set(os.listdir('/sys/block'))
+    retdict = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 14:
+            continue
+        name = fields[2]
+        if disks is not None and (name not in disks or name.startswith(('loop', 'ram', 'zram', 'dm-', 'md'))):
+            continue
+        # sectors are 512 bytes in /proc/diskstats whatever the device sector size
+        retdict[name] = (int(fields[3]), int(fields[7]), int(fields[5]) * 512, int(fields[9]) * 512,
+                         int(fields[6]), int(fields[10]))
+    return retdict
+
+
 def get_net_through(str_interface):
     """
     get network interface statistics by a interface (eth0, e,g,)
@@ -7,5 +7,7 @@
 """StressRunner inherit from TextTestRunner"""
 
 from tlib.stressrunner.runner import StressRunner
+from tlib.stressrunner.benchmark import BenchmarkCase, benchmark
+from tlib.stressrunner.scheduler import priority
 
-__all__ = ['StressRunner']
+__all__ = ['StressRunner', 'BenchmarkCase', 'benchmark', 'priority']
@@ -0,0 +1,203 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/23 9:40
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Benchmark test cases for StressRunner
+Run a callable warmup times(not measured), then repeat times measured by
+time.perf_counter_ns, the statistics go to self.metrics of the test case so
+StressRunner shows them in the report, the json lines file and the history:
+    time_mean_ms, time_stdev_ms, time_min_ms, time_max_ms, time_p50_ms, ...
+    ops_per_s  if ops(the operations per repetition) is set
+    mb_per_s   if nbytes(the bytes per repetition) is set
+
+Example:
+    class WriteBench(BenchmarkCase):
+        def test_write(self):
+            self.benchmark(self.write_file, warmup=2, repeat=20, nbytes=64 * 1024 * 1024)
+
+        @benchmark(warmup=1, repeat=10, ops=1000)
+        def test_stat(self):
+            for path in self.paths:
+                os.stat(path)
+"""
+
+import time
+import math
+import logging
+import functools
+import statistics
+import unittest
+from collections import OrderedDict
+
+# =============================
+# --- Global
+# =============================
+logger = logging.getLogger('StressRunner')
+PERCENTS = (50, 90, 99)
+MB = 1024.0 * 1024
+
+
+class BenchmarkResult(object):
+    """Measured repetitions of a benchmark and the statistics"""
+
+    def __init__(self, name, samples_ns, ops=None, nbytes=None, percents=PERCENTS):
+        """
+        :param name: prefix of the metric names, '' for none
+        :param samples_ns: the elapsed of each repetition in nanoseconds
+        :param ops: operations per repetition
+        :param nbytes: bytes per repetition
+        :param percents:
+        """
+        if not samples_ns:
+            raise Exception("No benchmark samples of {0}".format(name or 'test'))
+        self.name = name
+        self.samples_ns = list(samples_ns)
+        self.ops = ops
+        self.nbytes = nbytes
+        ordered = sorted(self.samples_ns)
+        self.mean_ns = sum(ordered) / float(len(ordered))
+        self.stdev_ns = statistics.stdev(ordered) if len(ordered) > 1 else 0.0
+        self.min_ns = ordered[0]
+        self.max_ns = ordered[-1]
+        self.percentiles_ns = OrderedDict()
+        for percent in percents:
+            rank = max(int(math.ceil(percent / 100.0 * len(ordered))) - 1, 0)
+            self.percentiles_ns[percent] = ordered[rank]
+
+    @property
+    def repeat(self):
+        return len(self.samples_ns)
+
+    @property
+    def ops_per_s(self):
+        return self.ops * 1e9 / self.mean_ns if self.ops and self.mean_ns else None
+
+    @property
+    def bytes_per_s(self):
+        return self.nbytes * 1e9 / self.mean_ns if self.nbytes and self.mean_ns else None
+
+    @property
+    def metrics(self):
+        """
+        The statistics as metrics, time in ms
+        :return: OrderedDict(metric -> value)
+        """
+        prefix = self.name + '_' if self.name else ''
+        metrics = OrderedDict()
+        metrics[prefix + 'time_mean_ms'] = self.mean_ns / 1e6
+        metrics[prefix + 'time_stdev_ms'] = self.stdev_ns / 1e6
+        metrics[prefix + 'time_min_ms'] = self.min_ns / 1e6
+        metrics[prefix + 'time_max_ms'] = self.max_ns / 1e6
+        for percent, value in self.percentiles_ns.items():
+            metrics['{0}time_p{1}_ms'.format(prefix, percent)] = value / 1e6
+        if self.ops_per_s is not None:
+            metrics[prefix + 'ops_per_s'] = self.ops_per_s
+        if self.bytes_per_s is not None:
+            metrics[prefix + 'mb_per_s'] = self.bytes_per_s / MB
+        return metrics
+
+    def __str__(self):
+        text = '{0}: {1} runs, mean {2:.3f}ms, stdev {3:.3f}ms, min {4:.3f}ms, {5}'.format(
+            self.name or 'benchmark', self.repeat, self.mean_ns / 1e6, self.stdev_ns / 1e6, self.min_ns / 1e6,
+            ', '.join('p{0} {1:.3f}ms'.format(p, v / 1e6) for p, v in self.percentiles_ns.items()))
+        if self.ops_per_s is not None:
+            text += ', {0:.1f} ops/s'.format(self.ops_per_s)
+        if self.bytes_per_s is not None:
+            text += ', {0:.1f} MB/s'.format(self.bytes_per_s / MB)
+        return text
+
+
+def run_benchmark(func, warmup=1, repeat=10, ops=None, nbytes=None, name='', percents=PERCENTS):
+    """
+    Run func() warmup times, then repeat times measured
+    :param func: the callable to measure
+    :param warmup: not measured rounds
+    :param repeat: measured rounds
+    :param ops: operations per round, for ops/s
+    :param nbytes: bytes per round, for MB/s
+    :param name: prefix of the metric names
+    :param percents:
+    :return: BenchmarkResult
+    """
+    if repeat < 1:
+        raise Exception("Benchmark repeat must >= 1, got {0}".format(repeat))
+    for _ in range(warmup):
+        func()
+    samples_ns = []
+    perf_counter_ns = time.perf_counter_ns
+    for _ in range(repeat):
+        start = perf_counter_ns()
+        func()
+        samples_ns.append(perf_counter_ns() - start)
+    return BenchmarkResult(name, samples_ns, ops, nbytes, percents)
+
+
+def _add_result(test, result):
+    logger.info('{0} {1}'.format(test.id(), result))
+    metrics = getattr(test, 'metrics', None)
+    if metrics is None:
+        metrics = test.metrics = OrderedDict()
+    metrics.update(result.metrics)
+    results = getattr(test, 'benchmark_results', None)
+    if results is None:
+        results = test.benchmark_results = []
+    results.append(result)
+
+
+def benchmark(warmup=1, repeat=10, ops=None, nbytes=None, percents=PERCENTS):
+    """
+    Decorator of a test method: run the method body as a benchmark, setUp
+    and tearDown run once
+    :param warmup:
+    :param repeat:
+    :param ops: operations per round, or a callable(test) -> ops
+    :param nbytes: bytes per round, or a callable(test) -> bytes
+    :param percents:
+    :return:
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            result = run_benchmark(lambda: method(self, *args, **kwargs), warmup, repeat,
+                                   ops(self) if callable(ops) else ops,
+                                   nbytes(self) if callable(nbytes) else nbytes,
+                                   percents=percents)
+            _add_result(self, result)
+        return wrapper
+
+    return decorator
+
+
+class BenchmarkCase(unittest.TestCase):
+    """
+    unittest.TestCase with benchmark(), the class attributes are the defaults
+    """
+    warmup = 1
+    repeat = 10
+    percents = PERCENTS
+
+    def benchmark(self, func, *args, **kwargs):
+        """
+        Benchmark func(*args, **kwargs), add the statistics to self.metrics
+        :param func:
+        :param args:
+        :param kwargs: the func kwargs, and warmup, repeat, ops, nbytes, name
+            for the benchmark, name is required if more than one benchmark
+            in a test
+        :return: BenchmarkResult
+        """
+        warmup = kwargs.pop('warmup', self.warmup)
+        repeat = kwargs.pop('repeat', self.repeat)
+        ops = kwargs.pop('ops', None)
+        nbytes = kwargs.pop('nbytes', None)
+        name = kwargs.pop('name', '')
+        result = run_benchmark(lambda: func(*args, **kwargs), warmup, repeat, ops, nbytes, name, self.percents)
+        _add_result(self, result)
+        return result
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,271 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/15 16:05
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Per-test output capture for StressRunner
+sys.stdout/sys.stderr are replaced once by a CaptureRouter instead of being
+swapped for every test. A write is routed to the OutputSpool bound to the
+current context (contextvar), else to the spool bound to the current thread,
+else to the spool of the running test, so threads spawned by a test still
+write into that test's spool. A spool keeps up to max_memory bytes in memory
+and rolls over to a temp file, the report reads it lazily.
+"""
+
+import io
+import os
+import re
+import codecs
+import sys
+import tempfile
+import threading
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+# =============================
+# --- Global
+# =============================
+POSIX = os.name == "posix"
+WINDOWS = os.name == "nt"
+DEFAULT_SPOOL_MEMORY = 1024 * 1024  # 1MB
+READ_CHUNK_SIZE = 1024 * 1024
+
+_context_spool = contextvars.ContextVar('stressrunner_spool', default=None) if contextvars else None
+_thread_spools = {}
+_active_spool = [None]
+
+
+class OutputSpool(object):
+    """
+    Captured output of one test, in memory up to max_memory bytes then spooled
+    to a temp file. After finish() the file descriptor is closed, read() opens
+    the file again only when the output is needed, iter_text()/head() read it
+    in chunks. A pickled spool(eg: sent by a worker process) carries the
+    memory buffer or the temp file path, the receiver cleans it up.
+    """
+
+    def __init__(self, max_memory=DEFAULT_SPOOL_MEMORY, spool_dir=None):
+        self.max_memory = max_memory
+        self.spool_dir = spool_dir
+        self.path = None
+        self.size = 0
+        self._buffer = io.BytesIO()
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self._lock:
+            if self._buffer is not None and self.size + len(data) > self.max_memory:
+                self._fd, self.path = tempfile.mkstemp(prefix='stressrunner_', suffix='.out', dir=self.spool_dir)
+                os.write(self._fd, self._buffer.getvalue())
+                self._buffer = None
+            if self._buffer is not None:
+                self._buffer.write(data)
+            elif self._fd is not None:
+                os.write(self._fd, data)
+            else:
+                with open(self.path, 'ab') as f:
+                    f.write(data)
+            self.size += len(data)
+
+    def finish(self):
+        """Done writing, release the file descriptor"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def read(self):
+        with self._lock:
+            if self._buffer is not None:
+                data = self._buffer.getvalue()
+            else:
+                if self._fd is not None:
+                    os.fsync(self._fd)
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+        return data.decode('utf-8', 'replace')
+
+    def iter_text(self, chunk_size=READ_CHUNK_SIZE):
+        """
+        The output in text chunks, never all in memory
+        :param chunk_size: bytes per read
+        :return: generator of str
+        """
+        with self._lock:
+            if self._buffer is not None:
+                data = self._buffer.getvalue()
+                path = None
+            else:
+                data = None
+                path = self.path
+                if self._fd is not None:
+                    os.fsync(self._fd)
+        if path is None:
+            if data:
+                yield data.decode('utf-8', 'replace')
+            return
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+    def head(self, limit):
+        """
+        The first limit bytes of the output as text
+        :param limit: bytes
+        :return: (text, truncated)
+        """
+        with self._lock:
+            if self._buffer is not None:
+                data = self._buffer.getbuffer()[:limit].tobytes()
+            else:
+                if self._fd is not None:
+                    os.fsync(self._fd)
+                with open(self.path, 'rb') as f:
+                    data = f.read(limit)
+        return data.decode('utf-8', 'ignore' if self.size > limit else 'replace'), self.size > limit
+
+    def __getstate__(self):
+        self.finish()
+        state = self.__dict__.copy()
+        state['_buffer'] = self._buffer.getvalue() if self._buffer is not None else None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._buffer is not None:
+            self._buffer = io.BytesIO(self._buffer)
+            self._buffer.seek(0, io.SEEK_END)
+        self._lock = threading.Lock()
+
+    def cleanup(self):
+        self.finish()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self._buffer = io.BytesIO()
+        self.path = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    __nonzero__ = __bool__
+
+    def __str__(self):
+        return self.read()
+
+    def __add__(self, other):
+        return self.read() + other
+
+
+def start_capture(spool):
+    """
+    Route the output of current context/thread, and of the threads without own
+    binding, to spool
+    :param spool: OutputSpool
+    :return: token for stop_capture
+    """
+    token = _context_spool.set(spool) if _context_spool is not None else None
+    _thread_spools[threading.current_thread().ident] = spool
+    _active_spool[0] = spool
+    return token
+
+
+def stop_capture(token):
+    if _context_spool is not None and token is not None:
+        _context_spool.reset(token)
+    _thread_spools.pop(threading.current_thread().ident, None)
+    _active_spool[0] = None
+
+
+def bind_thread(spool, thread=None):
+    """Route the output of thread(default current) to spool, eg: a thread shared by tests"""
+    _thread_spools[(thread or threading.current_thread()).ident] = spool
+
+
+def current_spool():
+    spool = _context_spool.get() if _context_spool is not None else None
+    if spool is None:
+        spool = _thread_spools.get(threading.current_thread().ident)
+    if spool is None:
+        spool = _active_spool[0]
+    return spool
+
+
+class CaptureRouter(object):
+    """ Installed as stdout or stderr, write to the console and the current spool """
+
+    def __init__(self, console):
+        self.__console__ = console
+
+    @staticmethod
+    def _filter(s):
+        """Only the error and describe messages are kept in the report"""
+        s_mesg = ''
+        if 'ERROR:' in s:
+            if WINDOWS:
+                pattern = re.compile(r'[^a]\W\d+[m]')
+            elif POSIX:
+                pattern = re.compile(r'[^a]\W\d+[m]\W?')
+            else:
+                pattern = re.compile(r'')
+            s_mesg += pattern.sub('', s)
+
+        if 'DESCRIBE:' in s:
+            pattern = re.compile(r'.+DESCRIBE:\W+\d+[m]\s')
+            s_mesg += pattern.sub('', s)
+        return s_mesg
+
+    def write(self, s):
+        spool = current_spool()
+        if spool is not None:
+            s_mesg = self._filter(s)
+            if s_mesg:
+                spool.write(s_mesg)
+        self.__console__.write(str(s))
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self.__console__.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.__console__, name)
+
+
+stdout_router = CaptureRouter(sys.stdout)
+stderr_router = CaptureRouter(sys.stderr)
+
+
+def install():
+    """Replace sys.stdout/sys.stderr by the routers, once"""
+    if sys.stdout is not stdout_router:
+        stdout_router.__console__ = sys.stdout
+        sys.stdout = stdout_router
+    if sys.stderr is not stderr_router:
+        stderr_router.__console__ = sys.stderr
+        sys.stderr = stderr_router
+
+
+def uninstall():
+    if sys.stdout is stdout_router:
+        sys.stdout = stdout_router.__console__
+    if sys.stderr is stderr_router:
+        sys.stderr = stderr_router.__console__
@@ -0,0 +1,207 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/22 10:05
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Performance history of StressRunner test cases
+HistoryStore saves the duration and the metrics of every test case per run
+into a local SQLite db(by tlib.db.sqlite_api), keyed by version, suite and
+test case. RegressionComparator compares a new value with the median of the
+last N runs: a value worse than median +/- max(mad_k * 1.4826 * MAD,
+min_delta * median) is flagged as a regression.
+
+A test case emits metrics by setting a dict on itself, eg:
+    self.metrics = {'write_mb_per_s': 512.3, 'p99_latency_ms': 8.1}
+The direction is decided by the unit suffix of the metric name: lower is
+better for duration and *_ms/*_s/*_latency/*_time..., higher is better for
+*_per_s/*_iops... and the others(eg: throughput), so read_latency_ops_per_s
+is a throughput.
+"""
+
+import statistics
+from collections import OrderedDict, defaultdict
+
+from tlib.stressrunner.sinks import ResultSink, close_db
+
+# =============================
+# --- Global
+# =============================
+DURATION = 'duration'
+# checked first, '_per_s' would match '_s' else
+HIGHER_IS_BETTER_SUFFIXES = ('_per_s', '_per_sec', 'iops', 'ops', 'throughput')
+LOWER_IS_BETTER_SUFFIXES = ('_ns', '_us', '_ms', '_s', '_sec', 'duration', 'elapsed', 'time', 'latency')
+MAD_SCALE = 1.4826  # MAD -> stdev for normal distribution
+
+
+def lower_is_better(metric):
+    """
+    By the unit suffix of the metric name, not a keyword anywhere in it, the
+    names of BenchmarkCase metrics are prefixed by the benchmark name
+    :param metric:
+    :return:
+    """
+    metric = metric.lower()
+    if metric.endswith(HIGHER_IS_BETTER_SUFFIXES):
+        return False
+    return metric.endswith(LOWER_IS_BETTER_SUFFIXES)
+
+
+class HistoryStore(object):
+    """
+    Per-case duration/metrics history in a SQLite db
+    """
+
+    def __init__(self, db_path, table='case_history'):
+        self.db_path = db_path
+        self.table = table
+
+    def _connect(self):
+        """The db with the history table, closed by close_db after a batch"""
+        from tlib.db.sqlite_api import SQLiteAPI
+
+        sqlite_obj = SQLiteAPI(self.db_path, show=False, create_db=True)
+        sqlite_obj.cur.execute(
+            'CREATE TABLE IF NOT EXISTS {0} (RunId TEXT, Version TEXT, Suite TEXT, TestCase TEXT, '
+            'Metric TEXT, Value REAL, Runs INTEGER)'.format(self.table))
+        sqlite_obj.cur.execute('CREATE INDEX IF NOT EXISTS {0}_case ON {0} (Suite, TestCase, Metric)'.format(
+            self.table))
+        sqlite_obj.conn.commit()
+        return sqlite_obj
+
+    def save_run(self, run_id, version, suite, cases):
+        """
+        Save the per-case values of a run, in one batch
+        :param run_id:
+        :param version:
+        :param suite:
+        :param cases: list of dict(test, pass, duration_avg, metrics), the
+            duration_avg of the passed runs
+        :return: rows saved
+        """
+        rows = []
+        for case in cases:
+            if not case.get('pass'):
+                continue
+            values = [(DURATION, case['duration_avg'])] + list((case.get('metrics') or {}).items())
+            for metric, value in values:
+                rows.append((run_id, version, suite, case['test'], metric, value, case['pass']))
+        if rows:
+            sqlite_obj = self._connect()
+            try:
+                sqlite_obj.executemany('INSERT INTO {0} (RunId, Version, Suite, TestCase, Metric, Value, Runs) '
+                                       'values (?, ?, ?, ?, ?, ?, ?)'.format(self.table), rows)
+            finally:
+                close_db(sqlite_obj)
+        return len(rows)
+
+    def load_baseline(self, suite, last_runs=10):
+        """
+        The values of the last N runs of suite
+        :param suite:
+        :param last_runs:
+        :return: dict((test case, metric) -> [values])
+        """
+        sqlite_obj = self._connect()
+        baseline = defaultdict(list)
+        try:
+            run_ids = [row[0] for row in sqlite_obj.cur.execute(
+                'SELECT RunId FROM {0} WHERE Suite = ? GROUP BY RunId ORDER BY MAX(rowid) DESC LIMIT ?'.format(
+                    self.table), (suite, last_runs)).fetchall()]
+            if run_ids:
+                rows = sqlite_obj.cur.execute(
+                    'SELECT TestCase, Metric, Value FROM {0} WHERE Suite = ? AND RunId IN ({1})'.format(
+                        self.table, ', '.join('?' * len(run_ids))), [suite] + run_ids).fetchall()
+                for test_case, metric, value in rows:
+                    baseline[(test_case, metric)].append(value)
+        finally:
+            close_db(sqlite_obj)
+        return dict(baseline)
+
+
+def median_durations(baseline):
+    """
+    The median duration of each test case in the baseline
+    :param baseline: see HistoryStore.load_baseline
+    :return: dict(test case -> seconds)
+    """
+    return dict((test_case, statistics.median(values))
+                for (test_case, metric), values in baseline.items() if metric == DURATION and values)
+
+
+class RegressionComparator(object):
+    """
+    Compare the values of this run with the baseline by median + MAD
+    """
+
+    def __init__(self, baseline, min_runs=3, mad_k=3.0, min_delta=0.1):
+        """
+        :param baseline: dict((test case, metric) -> [values]), see HistoryStore.load_baseline
+        :param min_runs: compare only if the baseline has N values at least
+        :param mad_k: the threshold in scaled MAD
+        :param min_delta: and in relative delta to the median, so a very
+            stable history does not flag the noise
+        """
+        self.min_runs = min_runs
+        self.mad_k = mad_k
+        self.min_delta = min_delta
+        # (test case, metric) -> (median, scaled MAD, runs)
+        self.stats = {}
+        for key, values in baseline.items():
+            if len(values) >= min_runs:
+                median = statistics.median(values)
+                mad = statistics.median([abs(v - median) for v in values])
+                self.stats[key] = (median, MAD_SCALE * mad, len(values))
+        self.regressions = OrderedDict()
+
+    def compare(self, test_id, metric, value):
+        """
+        :return: dict(metric, value, median, delta, runs, regression) or None
+            if no enough history
+        """
+        stats = self.stats.get((test_id, metric))
+        if stats is None or value is None:
+            return None
+        median, scaled_mad, runs = stats
+        threshold = max(self.mad_k * scaled_mad, self.min_delta * abs(median))
+        if lower_is_better(metric):
+            regression = value > median + threshold
+        else:
+            regression = value < median - threshold
+        delta = (value - median) / median if median else 0.0
+        if regression:
+            self.regressions[(test_id, metric)] = delta
+        return dict(metric=metric, value=value, median=median, delta=delta, runs=runs, regression=regression)
+
+    def compare_case(self, test_id, duration, metrics=None):
+        """
+        Compare the duration and the metrics of a test record
+        :return: list of compare results
+        """
+        values = [(DURATION, duration)] + list((metrics or {}).items())
+        results = [self.compare(test_id, metric, value) for metric, value in values]
+        return [r for r in results if r is not None]
+
+
+def format_deltas(deltas):
+    """Text table of the compare results"""
+    if not deltas:
+        return ''
+    lines = ['History(this/median of last runs):']
+    for d in deltas:
+        lines.append('  {0:<16} {1:.3f}/{2:.3f}  {3:+.1%} (runs: {4}){5}'.format(
+            d['metric'], d['value'], d['median'], d['delta'], d['runs'],
+            '  REGRESSION' if d['regression'] else ''))
+    return '\n'.join(lines) + '\n'
+
+
+class HistorySink(ResultSink):
+    """Save the per-case duration and metrics of the run into the history db"""
+    name = 'history'
+
+    def __init__(self, store, timeout=30):
+        super(HistorySink, self).__init__(timeout)
+        self.store = store
+
+    def publish(self, summary):
+        return self.store.save_run(summary['run_id'], summary['version'], summary['suite'], summary['cases'])
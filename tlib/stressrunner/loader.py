@@ -0,0 +1,99 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/17 10:12
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Test case factory for StressRunner
+Each iteration/loop runs fresh test cases rebuilt from their class and method
+name, instead of a deepcopy of the whole suite (fixtures may hold ssh/es
+connections or large data which are slow or impossible to copy).
+"""
+
+import sys
+import copy
+import importlib
+import unittest
+
+
+def iter_cases(test):
+    """
+    Flatten a test suite into its test cases, in suite order
+    :param test: unittest.TestSuite or unittest.TestCase
+    :return:
+    """
+    if isinstance(test, unittest.TestSuite):
+        for sub_test in test:
+            for case in iter_cases(sub_test):
+                yield case
+    else:
+        yield test
+
+
+def is_rebuildable(test):
+    """
+    The test case can be rebuilt by its class and method name only: not a
+    FunctionTestCase/DocTestCase or a case with a custom __init__ (eg:
+    parametrized args), which hold per instance state
+    :param test: unittest.TestCase
+    :return:
+    """
+    return isinstance(test, unittest.TestCase) and type(test).__init__ is unittest.TestCase.__init__
+
+
+def get_case_id(test):
+    """
+    The picklable id of a test case: (module, class name, method name), the
+    method name is test.id() if the case is not rebuildable
+    :param test: unittest.TestCase
+    :return:
+    """
+    cls = test.__class__
+    if not is_rebuildable(test):
+        return cls.__module__, cls.__name__, test.id()
+    return cls.__module__, cls.__name__, test._testMethodName
+
+
+def build_case(case_id, test=None):
+    """
+    Rebuild a fresh test case from its id, or a shallow copy of test if it is
+    not rebuildable
+    :param case_id: (module, class name, method name)
+    :param test: the test case of case_id, required if not rebuildable
+    :return: unittest.TestCase
+    """
+    if test is not None and not is_rebuildable(test):
+        return copy.copy(test)
+    module_name, class_name, method_name = case_id
+    module = sys.modules.get(module_name) or importlib.import_module(module_name)
+    cls = getattr(module, class_name)
+    if cls.__init__ is not unittest.TestCase.__init__:
+        raise Exception("Test case {0} can't be rebuilt by its id, the case is required".format('.'.join(case_id)))
+    return cls(method_name)
+
+
+def rebuild_case(test):
+    """
+    A fresh instance of the test case by its class and method name, a shallow
+    copy if the class can't be built by method name only
+    :param test: unittest.TestCase
+    :return:
+    """
+    method_name = getattr(test, '_testMethodName', None)
+    if method_name is None or not is_rebuildable(test):
+        return copy.copy(test)
+    try:
+        return test.__class__(method_name)
+    except TypeError:
+        return copy.copy(test)
+
+
+def rebuild_suite(test, case_factory=rebuild_case):
+    """
+    A flat suite of fresh test cases, in the same order(so class and module
+    fixtures run as before)
+    :param test: unittest.TestSuite
+    :param case_factory: case_factory(test) -> new test case
+    :return:
+    """
+    return unittest.TestSuite([case_factory(case) for case in iter_cases(test)])
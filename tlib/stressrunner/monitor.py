@@ -0,0 +1,166 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/24 16:05
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Live progress endpoint for StressRunner
+An HTTP server(stdlib, on a daemon thread) serving the progress of the running
+test(see StressRunner.get_progress), built at each request:
+    GET /metrics   Prometheus text format
+    GET /, /status JSON
+eg: StressRunner(..., metrics_port=9108), then
+    curl http://<test host>:9108/status
+"""
+
+import json
+import logging
+import threading
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+# =============================
+# --- Global
+# =============================
+logger = logging.getLogger('StressRunner')
+PREFIX = 'stressrunner'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+STATUS_NAMES = ('pass', 'fail', 'error', 'skip', 'canceled')
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _sample(name, value, labels=None):
+    if labels:
+        name += '{' + ','.join('{0}="{1}"'.format(k, _escape_label(v)) for k, v in labels) + '}'
+    return '{0} {1}'.format(name, float(value))
+
+
+def format_prometheus(progress):
+    """
+    The progress in Prometheus text format
+    :param progress: dict, see StressRunner.get_progress
+    :return:
+    """
+    lines = []
+
+    def add(name, metric_type, help_text, samples):
+        name = '{0}_{1}'.format(PREFIX, name)
+        lines.append('# HELP {0} {1}'.format(name, help_text))
+        lines.append('# TYPE {0} {1}'.format(name, metric_type))
+        for value, labels in samples:
+            lines.append(_sample(name, value, labels))
+
+    suite = [('suite', progress['suite'])]
+    add('up', 'gauge', 'The test is running(1) or finished(0)',
+        [(int(progress['running']), suite)])
+    add('elapsed_seconds', 'gauge', 'Seconds since the test started',
+        [(progress['elapsed_seconds'], suite)])
+    add('iteration', 'gauge', 'The running test suite iteration',
+        [(progress['iteration'], suite)])
+    add('tests_total', 'counter', 'Finished test records by status',
+        [(progress['counts'][status], suite + [('status', status)]) for status in STATUS_NAMES])
+    add('current_case_info', 'gauge', 'The running test cases',
+        [(1, suite + [('test', test_id)]) for test_id in progress['current']])
+
+    cases = progress['cases']
+    add('case_runs_total', 'counter', 'Finished test records by test case and status',
+        [(case[status], suite + [('test', case['test']), ('status', status)])
+         for case in cases for status in STATUS_NAMES if case[status]])
+    add('case_elapsed_seconds_avg', 'gauge', 'The average elapsed of all records by test case',
+        [(case['elapsed_avg'], suite + [('test', case['test'])]) for case in cases])
+    add('case_duration_seconds_avg', 'gauge', 'The average elapsed of passed records by test case',
+        [(case['duration_avg'], suite + [('test', case['test'])]) for case in cases if case['pass']])
+    add('case_elapsed_seconds_last', 'gauge', 'The elapsed of the last record by test case',
+        [(case['last_elapsed'], suite + [('test', case['test'])]) for case in cases])
+    add('case_metric', 'gauge', 'The average metrics emitted by test case',
+        [(value, suite + [('test', case['test']), ('metric', metric)])
+         for case in cases for metric, value in sorted(case['metrics'].items())])
+
+    resources = progress['resources']
+    if resources:
+        add('resource', 'gauge', 'The newest resource sample, see ResourceSampler',
+            [(value, suite + [('field', field)]) for field, value in resources['values'].items()])
+    return '\n'.join(lines) + '\n'
+
+
+class _ProgressHandler(BaseHTTPRequestHandler):
+    """GET /metrics or /status"""
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path not in ('', '/status', '/metrics'):
+            self.send_error(404, 'Not Found, try /status or /metrics')
+            return
+        try:
+            progress = self.server.get_progress()
+            if path == '/metrics':
+                body = format_prometheus(progress)
+                content_type = PROMETHEUS_CONTENT_TYPE
+            else:
+                body = json.dumps(progress, indent=2, default=str)
+                content_type = 'application/json'
+        except Exception as e:
+            logger.warning('Serve {0} failed: {1}'.format(self.path, e))
+            self.send_error(500, str(e))
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('Progress server: ' + format % args)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ProgressServer(object):
+    """
+    Serve the progress of a running test over HTTP
+    """
+
+    def __init__(self, get_progress, port=0, host='0.0.0.0'):
+        """
+        :param get_progress: get_progress() -> dict, see StressRunner.get_progress
+        :param port: 0 for any free port
+        :param host:
+        """
+        self.get_progress = get_progress
+        self.port = port
+        self.host = host
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(self.host, self.port)
+
+    def start(self):
+        self._server = _ThreadingHTTPServer((self.host, self.port), _ProgressHandler)
+        self._server.get_progress = self.get_progress
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='ProgressServer')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info('Progress: {0}/status, {0}/metrics'.format(self.url))
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
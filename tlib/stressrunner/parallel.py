@@ -0,0 +1,169 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/12 10:21
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Parallel test execution for StressRunner
+The test cases of a suite are sent by id (module, class, method) to a pool of
+worker processes, pickled if they can't be rebuilt from the id(eg:
+FunctionTestCase). Each worker rebuilds the case, runs it with its own
+_TestResult (so the stdout/stderr capture of one worker never mixes with
+another) and streams every finished result record back to the parent, which
+merges them into one _TestResult for the report. The output spool of a
+record is sent as is(the memory buffer or the temp file path), the parent
+reads it lazily.
+"""
+
+import pickle
+import signal
+import traceback
+import unittest
+import multiprocessing
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from tlib.stressrunner.loader import iter_cases, get_case_id, build_case, is_rebuildable
+
+
+def _worker_main(worker_id, task_queue, result_queue, result_kwargs):
+    """
+    Worker process: run the cases from task_queue, one _TestResult per worker
+    :param worker_id:
+    :param task_queue: (task_id, ts_loop, case_id, pickled case if not rebuildable
+        else None), None to exit
+    :param result_queue: ('result', worker_id, record) per finished test,
+        ('done', worker_id, task_id) per finished task
+    :param result_kwargs: kwargs of _TestResult
+    :return:
+    """
+    from tlib.stressrunner.runner import _TestResult
+
+    # the parent handles Ctrl-c and terminates the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    result = _TestResult(**result_kwargs)
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, ts_loop, case_id, case = task
+        result.ts_loop = ts_loop
+        # the previous task tore its class/module fixtures down, forget them
+        # so the suite of this task sets them up again
+        result._previousTestClass = None
+        result._moduleSetUpFailed = False
+        try:
+            # a suite of one case, so class/module fixtures still run
+            unittest.TestSuite([build_case(case_id, pickle.loads(case) if case else None)])(result)
+            for n, t, o, e, d, lp in result.result:
+                # the spool is pickled with its memory buffer or temp file
+                # path, never read here, the parent reports and cleans it up
+                metrics = dict(getattr(t, 'metrics', None) or {})
+                result_queue.put(('result', worker_id, (n, get_case_id(t), o, e, d, lp, metrics)))
+        except Exception:
+            result_queue.put(('result', worker_id, (2, case_id, '', traceback.format_exc(), '0:00:00', ts_loop, {})))
+        # only the records of running task are kept by the worker
+        del result.result[:]
+        del result.errors[:]
+        del result.failures[:]
+        del result.skipped[:]
+        result_queue.put(('done', worker_id, task_id))
+
+
+class ParallelExecutor(object):
+    """
+    A pool of worker processes running test cases for StressRunner
+    """
+
+    def __init__(self, workers, result_kwargs):
+        """
+        :param workers: number of worker processes
+        :param result_kwargs: kwargs of the worker _TestResult
+        """
+        self.workers = workers
+        self.result_kwargs = result_kwargs
+        self._task_queue = None
+        self._result_queue = None
+        self._processes = []
+        self._task_id = 0
+        # task id -> case id, the tasks not finished yet
+        self._pending = {}
+
+    def start(self):
+        self._task_queue = multiprocessing.Queue()
+        self._result_queue = multiprocessing.Queue()
+        for worker_id in range(self.workers):
+            process = multiprocessing.Process(
+                target=_worker_main,
+                args=(worker_id, self._task_queue, self._result_queue, self.result_kwargs))
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+
+    @property
+    def pids(self):
+        return [process.pid for process in self._processes]
+
+    @property
+    def pending_cases(self):
+        """The ids of the queued or running test cases"""
+        return ['.'.join(case_id) for _, case_id in sorted(list(self._pending.items()))]
+
+    def stop(self, terminate=False):
+        """
+        :param terminate: kill the workers, else they exit after the queued tasks
+        """
+        for process in self._processes:
+            if terminate:
+                process.terminate()
+            else:
+                # any worker may take any None, one per worker whether alive
+                # or not, else a worker exits early on another's None
+                self._task_queue.put(None)
+        if terminate and self._task_queue is not None:
+            # nobody reads the queued tasks any more, don't block exit flushing them
+            self._task_queue.cancel_join_thread()
+        for process in self._processes:
+            process.join()
+        self._processes = []
+
+    def run_iteration(self, test, ts_loop, merge_record):
+        """
+        Run all cases of the suite once across the workers, merge_record is
+        called in the parent for every finished result record
+        :param test: unittest.TestSuite
+        :param ts_loop: the test suite iteration
+        :param merge_record: merge_record(status, test, output, err, elapsed, ts_loop, metrics)
+        :return:
+        """
+        self._pending.clear()
+        # case id -> the cases which can't be rebuilt from the id
+        cases = {}
+        for case in iter_cases(test):
+            case_id = get_case_id(case)
+            payload = None
+            if not is_rebuildable(case):
+                cases[case_id] = case
+                try:
+                    payload = pickle.dumps(case)
+                except Exception as e:
+                    raise Exception("Test case {0} can't be sent to the workers: {1}".format(case.id(), e))
+            self._task_id += 1
+            self._pending[self._task_id] = case_id
+            self._task_queue.put((self._task_id, ts_loop, case_id, payload))
+
+        while self._pending:
+            try:
+                msg_type, worker_id, data = self._result_queue.get(timeout=5)
+            except queue.Empty:
+                dead = [p.pid for p in self._processes if not p.is_alive()]
+                if dead:
+                    raise Exception('StressRunner worker processes {0} exited unexpectedly'.format(dead))
+                continue
+            if msg_type == 'done':
+                self._pending.pop(data, None)
+                continue
+            n, case_id, o, e, d, lp, metrics = data
+            merge_record(n, build_case(case_id, cases.get(case_id)), o, e, d, lp, metrics)
@@ -0,0 +1,396 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/16 14:40
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Incremental report writer for StressRunner
+Every finished test record is written at once to:
+    <report>.jsonl  one JSON object per record, the output capped
+    <report>.html   rows appended in finish order, readable while running
+    <report>.html.parts/c<N>.html  rows grouped by test class
+the captured output streamed from its spool in chunks, and then dropped
+from memory, only the compact per-case counters (CaseStats) are kept.
+finish() assembles the final grouped report from the class parts and
+replaces the progressive html.
+"""
+
+import os
+import json
+import shutil
+import statistics
+from collections import OrderedDict, deque
+from datetime import datetime
+from xml.sax import saxutils
+
+from tlib.stressrunner import template
+from tlib.stressrunner.sampler import format_resources
+from tlib.stressrunner.history import format_deltas
+
+# =============================
+# --- Global
+# =============================
+HTML_HEAD, HTML_TAIL = template.HTML_TEMPLATE.split('%(report)s')
+REPORT_HEAD, REPORT_TAIL = template.REPORT_TEMPLATE.split('%(test_list)s')
+JSONL_OUTPUT_LIMIT = 64 * 1024  # the output kept in a json line, bytes
+_SCRIPT_MARK = '\0script\0'
+PASS_ELAPSED_WINDOW = 99  # the passed runs of a case kept for the median
+
+
+def format_elapsed(delta):
+    """
+    timedelta -> '1:02:03.456', in milliseconds so sub-second changes show
+    :param delta: datetime.timedelta
+    :return:
+    """
+    elapsed = str(delta)
+    if '.' in elapsed:
+        elapsed = elapsed[:-3]
+    return elapsed
+
+
+def elapsed_seconds(elapsed):
+    """
+    '1:02:03' -> 3723
+    :param elapsed: str(timedelta) without microseconds
+    :return:
+    """
+    seconds = 0
+    try:
+        days = 0
+        if 'day' in elapsed:
+            day_str, elapsed = elapsed.split(',')
+            days = int(day_str.split()[0])
+        for part in elapsed.strip().split(':'):
+            seconds = seconds * 60 + float(part)
+        return days * 86400 + seconds
+    except (ValueError, AttributeError):
+        return 0
+
+
+class CaseStats(object):
+    """Compact counters of one test case across all loops/iterations"""
+    __slots__ = ('test_id', 'counts', 'runs', 'elapsed_sum',
+                 'last_status', 'last_iteration', 'last_elapsed', 'metrics', 'pass_elapsed_sum',
+                 'pass_elapsed_recent')
+
+    def __init__(self, test_id):
+        self.test_id = test_id
+        # by status: pass, fail, error, skip, canceled
+        self.counts = [0] * len(template.STATUS)
+        self.runs = 0
+        self.elapsed_sum = 0.0
+        self.pass_elapsed_sum = 0.0
+        # the seconds of the last passed runs, for the median
+        self.pass_elapsed_recent = deque(maxlen=PASS_ELAPSED_WINDOW)
+        self.last_status = None
+        self.last_iteration = None
+        self.last_elapsed = ''
+        # metric -> [sum, count]
+        self.metrics = {}
+
+    def add(self, status, elapsed, iteration, metrics=None):
+        self.counts[status] += 1
+        self.runs += 1
+        seconds = elapsed_seconds(elapsed)
+        self.elapsed_sum += seconds
+        if status == 0:
+            self.pass_elapsed_sum += seconds
+            self.pass_elapsed_recent.append(seconds)
+        self.last_status = status
+        self.last_iteration = iteration
+        self.last_elapsed = elapsed
+        for metric, value in (metrics or {}).items():
+            metric_sum = self.metrics.setdefault(metric, [0.0, 0])
+            metric_sum[0] += value
+            metric_sum[1] += 1
+
+    @property
+    def metrics_avg(self):
+        return dict((metric, s / c) for metric, (s, c) in self.metrics.items() if c)
+
+    @property
+    def elapsed_avg(self):
+        return self.elapsed_sum / self.runs if self.runs else 0
+
+    @property
+    def pass_elapsed_avg(self):
+        return self.pass_elapsed_sum / self.counts[0] if self.counts[0] else 0
+
+    @property
+    def pass_elapsed_median(self):
+        """The median seconds of the last PASS_ELAPSED_WINDOW passed runs"""
+        return statistics.median(self.pass_elapsed_recent) if self.pass_elapsed_recent else 0
+
+    def __repr__(self):
+        return 'CaseStats({0}: {1})'.format(self.test_id, ', '.join(
+            '{0}={1}'.format(template.STATUS[n], c) for n, c in enumerate(self.counts) if c))
+
+
+def iter_output(o):
+    """The output of a record in text chunks, a spool is read lazily"""
+    if hasattr(o, 'iter_text'):
+        return o.iter_text()
+    return iter([str(o)] if o else [])
+
+
+def render_test_row(cid, tid, n, t, o, e, d, l):
+    """
+    The html row of a test record
+    :param cid: class index
+    :param tid: test index in the class
+    :param n: status
+    :param t: unittest.TestCase
+    :param o: output
+    :param e: stack trace or skip reason
+    :param d: elapsed
+    :param l: iteration
+    :return:
+    """
+    head, tail = _render_test_row_parts(cid, tid, n, t, bool(o), bool(e), d, l)
+    return head + saxutils.escape(str(o) + e) + tail
+
+
+def write_test_row(fps, cid, tid, n, t, o, e, d, l, prefix=''):
+    """
+    Write the html row of a test record to the files, the output is streamed
+    in chunks instead of being read into one string
+    :param fps: the files to write
+    :param prefix: the text before the output
+    :return:
+    """
+    head, tail = _render_test_row_parts(cid, tid, n, t, bool(o) or bool(prefix), bool(e), d, l)
+    for text in [head, saxutils.escape(prefix)]:
+        for fp in fps:
+            fp.write(text)
+    for chunk in iter_output(o):
+        chunk = saxutils.escape(chunk)
+        for fp in fps:
+            fp.write(chunk)
+    for text in [saxutils.escape(e), tail]:
+        for fp in fps:
+            fp.write(text)
+
+
+def _render_test_row_parts(cid, tid, n, t, has_output, has_err, d, l):
+    """
+    The html row of a test record split at the output
+    :return: (head, tail)
+    """
+    tid = template.STATUS[n][0].lower() + 't{0}_{1}'.format(cid+1, tid+1)
+    name = t.id().split('.')[-1]
+    doc = t.shortDescription() or ""
+    desc = doc and ('%s: %s' % (name, doc)) or name
+    tmpl = (n == 3 and template.REPORT_SKIP_TEMPLATE or
+            (has_err and template.REPORT_WITH_ERROR_TEMPLATE or
+             (has_output and template.REPORT_WITH_OUTPUT_TEMPLATE or
+              template.REPORT_NO_OUTPUT_TEMPLATE
+              )
+             )
+            )
+
+    script = template.REPORT_OUTPUT_TEMPLATE % dict(
+        # id = tid,
+        output=_SCRIPT_MARK,
+    )
+
+    row_value = dict(
+        tid=tid,
+        Class=(n == 0 and 'none' or 'none'),
+        # (n == 0 and 'hiddenRow' or 'none'),
+        style=(n == 1 and 'failCase' or
+               (n == 2 and 'errorCase' or
+                (n == 3 and 'skipCase'
+                 or 'passCase' or 'none'))),
+        desc=desc,
+        iteration=l,
+        elapsedtime=d,
+        script=script,
+        status=template.STATUS[n],
+    )
+    row = tmpl % row_value
+    if _SCRIPT_MARK not in row:
+        # REPORT_NO_OUTPUT_TEMPLATE
+        return row, ''
+    head, tail = row.split(_SCRIPT_MARK)
+    return head, tail
+
+
+def render_class_row(cls, cid, counts):
+    """
+    The html row of a test class
+    :param cls: unittest.TestCase class
+    :param cid: class index
+    :param counts: counts by status
+    :return:
+    """
+    np = counts[0] + counts[4]
+    nf, ne, ns = counts[1], counts[2], counts[3]
+    if cls.__module__ == "__main__":
+        name = cls.__name__
+    else:
+        name = "%s.%s" % (cls.__module__, cls.__name__)
+    doc = cls.__doc__ and cls.__doc__.split("\n")[0] or ""
+    desc = doc and '%s: %s' % (name, doc) or name
+
+    return template.REPORT_CLASS_TEMPLATE % dict(
+        style=ne > 0 and 'errorClass' or nf > 0 and 'failClass' or 'passClass',
+        desc=desc,
+        count=np + nf + ne + ns,
+        Pass=np,
+        fail=nf,
+        error=ne,
+        skip=ns,
+        cid='c%s' % (cid + 1),
+    )
+
+
+class _ClassPart(object):
+    """Rows of one test class, spooled to a part file"""
+
+    def __init__(self, cls, cid, path):
+        self.cls = cls
+        self.cid = cid
+        self.path = path
+        self.counts = [0] * len(template.STATUS)
+        self.rows = 0
+        self.fp = open(path, 'w', encoding='utf-8')
+
+
+class IncrementalReporter(object):
+    """
+    Write the report as the test records finish
+    """
+
+    def __init__(self, report_path, title='', stylesheet=template.STYLESHEET_TEMPLATE):
+        """
+        :param report_path: the html report path, the json lines file is saved
+            next to it with suffix .jsonl
+        :param title:
+        :param stylesheet:
+        """
+        self.report_path = report_path
+        self.jsonl_path = os.path.splitext(report_path)[0] + '.jsonl'
+        self.parts_dir = report_path + '.parts'
+        self.title = title
+        self.stylesheet = stylesheet
+        self.records = 0
+        self._parts = {}
+        self._html = None
+        self._jsonl = None
+
+    def start(self, heading):
+        """
+        Create the json lines file and the progressive html report
+        :param heading: the html heading while running
+        :return:
+        """
+        report_path_dir = os.path.dirname(self.report_path)
+        for path in (report_path_dir, self.parts_dir):
+            if path and not os.path.isdir(path):
+                os.makedirs(path)
+        self._jsonl = open(self.jsonl_path, 'w', encoding='utf-8')
+        self._html = open(self.report_path, 'w', encoding='utf-8')
+        self._html.write(HTML_HEAD % dict(
+            title=saxutils.escape(self.title),
+            stylesheet=self.stylesheet,
+            heading=heading,
+        ))
+        running = dict(count='-', Pass='-', fail='-', error='-', skip='-', passrate='Running')
+        self._html.write(REPORT_HEAD % running)
+        self._html.flush()
+
+    def _get_part(self, cls):
+        part = self._parts.get(cls)
+        if part is None:
+            cid = len(self._parts)
+            path = os.path.join(self.parts_dir, 'c{0}.html'.format(cid + 1))
+            part = _ClassPart(cls, cid, path)
+            self._parts[cls] = part
+        return part
+
+    def add_record(self, record, resources=None, metrics=None, deltas=None):
+        """
+        Write a finished test record, the captured output is released after
+        :param record: (status, test, output, err, elapsed, iteration)
+        :param resources: OrderedDict(field -> (min, avg, max, p95)) sampled
+            while the test was running
+        :param metrics: dict(metric -> value) the test emitted
+        :param deltas: the history compare results, see RegressionComparator
+        :return:
+        """
+        n, t, o, e, d, l = record
+        part = self._get_part(t.__class__)
+        metrics_text = ''
+        if metrics:
+            metrics_text = 'Metrics: {0}\n'.format(', '.join(
+                '{0}={1}'.format(k, v) for k, v in sorted(metrics.items())))
+        # the output is streamed to the html files, only its head to the json line
+        write_test_row([part.fp, self._html], part.cid, part.rows, n, t, o, e, d, l,
+                       prefix=format_deltas(deltas) + metrics_text + format_resources(resources))
+        if hasattr(o, 'head'):
+            output, truncated = o.head(JSONL_OUTPUT_LIMIT)
+            output_size = len(o)
+        else:
+            output = str(o)
+            output_size = len(output)
+            truncated = output_size > JSONL_OUTPUT_LIMIT
+            output = output[:JSONL_OUTPUT_LIMIT]
+        if hasattr(o, 'cleanup'):
+            o.cleanup()
+        part.counts[n] += 1
+        part.rows += 1
+        part.fp.flush()
+
+        self._jsonl.write(json.dumps(dict(
+            time=str(datetime.now()).split('.')[0],
+            test=t.id(),
+            status=template.STATUS[n],
+            iteration=l,
+            elapsed=d,
+            output=output,
+            output_size=output_size,
+            output_truncated=truncated,
+            err=e,
+            metrics=metrics or {},
+            history=deltas or [],
+            resources=OrderedDict(
+                (field, dict(zip(('min', 'avg', 'max', 'p95'), values)))
+                for field, values in (resources or {}).items()),
+        )) + '\n')
+        self._jsonl.flush()
+        self._html.flush()
+        self.records += 1
+
+    def finish(self, title, heading, summary):
+        """
+        Assemble the final report grouped by test class, replace the
+        progressive html report
+        :param title:
+        :param heading: the final html heading
+        :param summary: dict(count, Pass, fail, error, skip, passrate)
+        :return:
+        """
+        self.close()
+        tmp_path = self.report_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(HTML_HEAD % dict(
+                title=saxutils.escape(title),
+                stylesheet=self.stylesheet,
+                heading=heading,
+            ))
+            f.write(REPORT_HEAD % summary)
+            for part in sorted(self._parts.values(), key=lambda p: p.cid):
+                f.write(render_class_row(part.cls, part.cid, part.counts))
+                with open(part.path, 'r', encoding='utf-8') as part_fp:
+                    shutil.copyfileobj(part_fp, f)
+            f.write(REPORT_TAIL % summary)
+            f.write(HTML_TAIL)
+        os.replace(tmp_path, self.report_path)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        return True
+
+    def close(self):
+        for fp in [self._jsonl, self._html] + [p.fp for p in self._parts.values()]:
+            if fp is not None and not fp.closed:
+                fp.close()
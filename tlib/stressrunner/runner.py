@@ -60,19 +60,28 @@ Version in 1.2 -- Tao.Xu(tao.xu2008@outlook.com)
 
 import logging
 import coloredlogs
-import copy
-import re
+import collections
 import os
 import sys
 from datetime import date, datetime
-import io
+import time
 import socket
 import traceback
 from xml.sax import saxutils
 import unittest
 
-from tlib.mail import SmtpServer, Mail
 from tlib.stressrunner import template
+from tlib.stressrunner import capture
+from tlib.stressrunner.reporter import IncrementalReporter, CaseStats, elapsed_seconds, format_elapsed
+from tlib.stressrunner.history import HistoryStore, HistorySink, RegressionComparator, median_durations
+from tlib.stressrunner.loader import iter_cases, rebuild_case, rebuild_suite
+from tlib.stressrunner.monitor import ProgressServer
+from tlib.stressrunner.parallel import ParallelExecutor
+from tlib.stressrunner.sampler import ResourceSampler
+from tlib.stressrunner.scheduler import DeadlineScheduler
+# send_mail moved to sinks, kept importable as tlib.stressrunner.runner.send_mail
+from tlib.stressrunner.sinks import send_mail  # noqa: F401
+from tlib.stressrunner.sinks import SinkDispatcher, MailSink
 
 
 # =============================
@@ -100,37 +109,6 @@ DEFAULT_DESCRIPTION = ''
 DEFAULT_TESTER = __author__
 
 
-def send_mail(subject, content, address_from, address_to, attach, host, user,
-              password, port, tls):
-    """
-
-    :param subject:
-    :param content:
-    :param address_from:
-    :param address_to:"txu1@test.com;txu2@test.com"
-    :param attach:
-    :param host:"smtp.gmail.com"
-    :param user:"stress@test.com"
-    :param password:"password"
-    :param port:465
-    :param tls:True
-    :return:
-    """
-
-    try:
-        print('preparing mail...')
-        mail = Mail(subject, content, address_from, address_to)
-        print('preparing attachments...')
-        mail.attach(attach)
-
-        print('preparing SMTP server...')
-        smtp = SmtpServer(host, user, password, port, tls)
-        print('sending mail to {0}...'.format(address_to))
-        smtp.sendmail(mail)
-    except Exception as e:
-        raise Exception('Error in sending email. [Exception]%s' % e)
-
-
 def get_local_ip():
     """
     Get the local ip address --linux/windows
@@ -190,46 +168,14 @@ def escape(value):
 # e.g.
 #   >>> logging.basicConfig(stream=HTMLTestRunner.stdout_redirector)
 #   >>>
+#
+# The redirectors are installed once, the output is routed to the spool of
+# the running test by context/thread, see tlib.stressrunner.capture
 
 
-class OutputRedirector(object):
-    """ Wrapper to redirect stdout or stderr """
-
-    def __init__(self, fp):
-        self.fp = fp
-        self.__console__ = sys.stdout
-
-    def write(self, s):
-        if 'ERROR:' in s:
-            if WINDOWS:
-                pattern = re.compile(r'[^a]\W\d+[m]')
-            elif POSIX:
-                pattern = re.compile(r'[^a]\W\d+[m]\W?')
-            else:
-                pattern = re.compile(r'')
-            s_mesg = pattern.sub('', s)
-            s_mesg = s_mesg.encode(encoding="utf-8")
-            self.fp.write(s_mesg)
-
-        if 'DESCRIBE:' in s:
-            pattern = re.compile(r'.+DESCRIBE:\W+\d+[m]\s')
-            s_mesg = pattern.sub('', s)
-            s_mesg = s_mesg.encode(encoding="utf-8")
-            self.fp.write(s_mesg)
-        self.__console__.write(str(s))
-
-    def writelines(self, lines):
-        if 'ERROR' in lines:
-            self.fp.writelines(lines)
-        self.__console__.write(str(lines))
-
-    def flush(self):
-        self.fp.flush()
-        self.__console__.flush()
-
-
-stdout_redirector = OutputRedirector(sys.stdout)
-stderr_redirector = OutputRedirector(sys.stderr)
+OutputRedirector = capture.CaptureRouter
+stdout_redirector = capture.stdout_router
+stderr_redirector = capture.stderr_router
 STDOUT_LINE = '\nStdout:\n%s'
 STDERR_LINE = '\nStderr:\n%s'
 
@@ -247,14 +193,28 @@ class _TestResult(unittest.TestResult):
     s_msg = "[ SKIP ] {0} -- iteration: {1} --Elapsed Time: {2}"
 
     def __init__(self, logger=DEFAULT_LOGGER, verbosity=2, tc_loop_limit=1,
-                 tc_elapsed_limit=None, save_last_result=False):
+                 tc_elapsed_limit=None, save_last_result=False,
+                 output_spool_mb=1, output_spool_dir=None, reporter=None,
+                 case_factory=rebuild_case, sampler=None, comparator=None):
         """
         _TestResult inherit from unittest TestResult
         :param logger: default is logging.get_logger()
         :param verbosity: 1-dots, 2-showStatus, 3-showAll
         :param tc_loop_limit: the max loop running for each test case
-        :param tc_elapsed_limit:None means no limit
+        :param tc_elapsed_limit: keep looping each test case until it has run
+            for N seconds, None means no limit
         :param save_last_result: just save the last loop result
+        :param output_spool_mb: the captured output of each test is kept in
+            memory up to N MB, then spooled to a temp file
+        :param output_spool_dir: the dir of spooled files, default tempdir
+        :param reporter: IncrementalReporter, finished records are written to
+            it instead of kept in self.result
+        :param case_factory: case_factory(test) -> a fresh test case for the
+            next loop, default rebuilt by class and method name
+        :param sampler: ResourceSampler, the resources sampled while a test
+            was running are attached to its record in the report
+        :param comparator: history.RegressionComparator, the duration and metrics
+            of passed records are compared with the history in the report
         """
 
         super(_TestResult, self).__init__()
@@ -264,6 +224,9 @@ class _TestResult(unittest.TestResult):
         self.tc_loop_limit = tc_loop_limit
         self.tc_elapsed_limit = tc_elapsed_limit
         self.save_last_result = save_last_result
+        self.case_factory = case_factory
+        self.sampler = sampler
+        self.comparator = comparator
 
         self.showAll = verbosity >= 3
         self.showStatus = verbosity == 2
@@ -271,8 +234,10 @@ class _TestResult(unittest.TestResult):
         self.stdout0 = None
         self.stderr0 = None
 
-        self._stdout_buffer = None
-        self._stderr_buffer = None
+        self.output_spool_size = int(output_spool_mb * 1024 * 1024)
+        self.output_spool_dir = output_spool_dir
+        self._spool = None
+        self._capture_token = None
         self._original_stdout = sys.stdout
         self._original_stderr = sys.stderr
         self.success_count = 0
@@ -292,64 +257,82 @@ class _TestResult(unittest.TestResult):
         '''
         self.status = 0
         self.result = []
+        self.reporter = reporter
+        # test id -> CaseStats
+        self.case_stats = collections.OrderedDict()
         self.outputBuffer = ''
 
         self.tc_loop = 0
         self.ts_loop = 1
         self.tc_start_time = datetime.now()
+        self.tc_start_ts = None
+        self.tc_loop_start_time = datetime.now()  # the first loop start time of test case
+        self._loop_pending = False
+        self._looping = False
         self.ts_start_time = datetime.now()  # test suite start time
+        self.current_test = None  # the running test case id
+
+    def add_record(self, record, start_time=None, metrics=None):
+        """
+        Count a finished test record, then hand it to the reporter(or keep it
+        in self.result if no reporter)
+        :param record: (status, test, output, err, elapsed, iteration)
+        :param start_time: time.time() the test started, default by elapsed
+        :param metrics: dict(metric -> value), default test.metrics
+        :return:
+        """
+        n, t, o, e, d, lp = record
+        if metrics is None:
+            metrics = getattr(t, 'metrics', None) or {}
+        test_id = t.id()
+        stats = self.case_stats.get(test_id)
+        if stats is None:
+            stats = self.case_stats[test_id] = CaseStats(test_id)
+        stats.add(n, d, lp, metrics)
+        if self.reporter is None:
+            self.result.append(record)
+        else:
+            resources = deltas = None
+            if self.sampler:
+                if start_time is None:
+                    start_time = time.time() - elapsed_seconds(d)
+                resources = self.sampler.summary(start_time)
+            if self.comparator and n == 0:
+                deltas = self.comparator.compare_case(test_id, elapsed_seconds(d), metrics)
+            self.reporter.add_record(record, resources, metrics, deltas)
 
     @staticmethod
     def _get_description(test):
         return test.shortDescription() or str(test)
 
     def _setup_output(self):
-        if self._stderr_buffer is None:
-            self._stderr_buffer = io.BytesIO()
-            self._stdout_buffer = io.BytesIO()
-            self._stdout_buffer.seek(0)
-            self._stdout_buffer.truncate()
-            self._stderr_buffer.seek(0)
-            self._stderr_buffer.truncate()
-        stdout_redirector.fp = self._stdout_buffer
-        stderr_redirector.fp = self._stderr_buffer
-        sys.stdout = stdout_redirector
-        sys.stderr = stderr_redirector
+        capture.install()
+        self._spool = capture.OutputSpool(self.output_spool_size, self.output_spool_dir)
+        self._capture_token = capture.start_capture(self._spool)
 
     def _restore_output(self, test):
         """
-        Disconnect output redirection and return buffer.
-        Safe to call multiple times.
+        Disconnect output routing and return the spool of the test, the
+        report reads the spool lazily.
         """
         # remove the running record
         self.result.pop(-1)
 
-        output = sys.stdout.fp.getvalue().decode('UTF-8')
-        error = sys.stderr.fp.getvalue().decode('UTF-8')
-        output_info = ''
-        if output:
-            if not output.endswith('\n'):
-                output += '\n'
-            output_info += output
-            # self._original_stdout.write(STDOUT_LINE % output)
-        if error:
-            if not error.endswith('\n'):
-                error += '\n'
-            output_info += error
-            # self._original_stderr.write(STDERR_LINE % error)
-        sys.stdout = self._original_stdout
-        sys.stderr = self._original_stderr
-        self._stdout_buffer.seek(0)
-        self._stdout_buffer.truncate()
-        self._stderr_buffer.seek(0)
-        self._stderr_buffer.truncate()
+        output_info = self._spool
+        if output_info is not None:
+            capture.stop_capture(self._capture_token)
+            self._spool = None
+            self._capture_token = None
+            for test_item, err in (self.errors + self.failures):
+                if test_item == test:
+                    output_info.write("{test_info}:".format(test_info=test))
+            output_info.finish()
+        else:
+            output_info = ''
 
         tc_stop_time = datetime.now()
-        tc_elapsedtime = str(tc_stop_time - self.tc_start_time).split('.')[0]
+        tc_elapsedtime = format_elapsed(tc_stop_time - self.tc_start_time)
         ts_elapsedtime = str(tc_stop_time - self.ts_start_time).split('.')[0]
-        for test_item, err in (self.errors + self.failures):
-            if test_item == test:
-                output_info += "{test_info}:".format(test_info=test)
 
         return output_info, tc_elapsedtime, ts_elapsedtime
 
@@ -358,6 +341,10 @@ class _TestResult(unittest.TestResult):
             str(test), self.ts_loop))
         self.result.append((4, test, '', '', '', self.ts_loop))
         self.tc_start_time = datetime.now()
+        self.tc_start_ts = time.time()
+        self.current_test = test.id()
+        if self.tc_loop == 0:
+            self.tc_loop_start_time = self.tc_start_time
         unittest.TestResult.startTest(self, test)
         self._setup_output()
 
@@ -369,23 +356,56 @@ class _TestResult(unittest.TestResult):
         called. But there are some path in unittest that would bypass this.
         We must disconnect stdout in stopTest(), which is guaranteed to be
         called.
+        Loop the test case here if addSuccess asked for, with a fresh case
+        from case_factory. The nested runs return before the next loop, so
+        the stack does not grow with the loops.
         :param test:
         :return:
         """
-        pass
-        # unittest.TestResult.stopTest(self, test)
-        # self.complete_output(test)
+        if self._looping:
+            return
+        self._looping = True
+        try:
+            while self._loop_pending:
+                self._loop_pending = False
+                test = self.case_factory(test)
+                test(self)
+        finally:
+            self._looping = False
+            self._loop_pending = False
+            self.current_test = None
+
+    def _should_loop(self):
+        """Loop the test case again or not, by tc_loop_limit and tc_elapsed_limit"""
+        if (self.tc_loop_limit == 0) or (self.tc_loop_limit > self.tc_loop):
+            return True
+        if self.tc_elapsed_limit:
+            limit = self.tc_elapsed_limit
+            if hasattr(limit, 'total_seconds'):
+                limit = limit.total_seconds()
+            tc_loop_elapsed = datetime.now() - self.tc_loop_start_time
+            return tc_loop_elapsed.total_seconds() < float(limit)
+        return False
 
     def addSuccess(self, test):
         self.status = 0
         self.tc_loop += 1
-        self.success_count += 1
         unittest.TestResult.addSuccess(self, test)
         
         output, tc_elapsedtime, ts_elapsedtime = self._restore_output(test)
-        self.result.append(
-            (self.status, test, output, '', tc_elapsedtime, self.ts_loop)
-        )
+
+        # calculate retry or not
+        retry_flag = self._should_loop()
+
+        if retry_flag and self.save_last_result:
+            # only the last loop is saved
+            if hasattr(output, 'cleanup'):
+                output.cleanup()
+        else:
+            self.success_count += 1
+            self.add_record(
+                (self.status, test, output, '', tc_elapsedtime, self.ts_loop), self.tc_start_ts
+            )
         if self.showAll:
             self.logger.info(
                 self.p_msg.format(str(test), self.ts_loop, tc_elapsedtime))
@@ -397,24 +417,9 @@ class _TestResult(unittest.TestResult):
         else:
             pass
 
-        # calculate retry or not
-        if (self.tc_loop_limit == 0) or (self.tc_loop_limit > self.tc_loop):
-            retry_flag = True
-        elif self.tc_elapsed_limit:
-            retry_flag = True
-            self.tc_elapsed_limit -= tc_elapsedtime
-        else:
-            retry_flag = False
-
-        # recursive retry test
-        if retry_flag:
-            if self.save_last_result:
-                self.result.pop(-1)
-                self.success_count -= 1
-            test = copy.copy(test)
-            self.tc_start_time = datetime.now()
-            test(self)
-        else:
+        # the next loop is run by stopTest
+        self._loop_pending = retry_flag
+        if not retry_flag:
             self.tc_loop = 0  # update for next test case loop=0
 
     def addError(self, test, err):
@@ -423,8 +428,8 @@ class _TestResult(unittest.TestResult):
         unittest.TestResult.addError(self, test, err)
         _, str_e = self.errors[-1]
         output, tc_elapsedtime, ts_elapsedtime = self._restore_output(test)
-        self.result.append(
-            (self.status, test, output, str_e, tc_elapsedtime, self.ts_loop)
+        self.add_record(
+            (self.status, test, output, str_e, tc_elapsedtime, self.ts_loop), self.tc_start_ts
         )
         if self.showAll:
             self.logger.critical(
@@ -442,8 +447,8 @@ class _TestResult(unittest.TestResult):
         unittest.TestResult.addFailure(self, test, err)
         _, str_e = self.failures[-1]
         output, tc_elapsedtime, ts_elapsedtime = self._restore_output(test)
-        self.result.append(
-            (self.status, test, output, str_e, tc_elapsedtime, self.ts_loop)
+        self.add_record(
+            (self.status, test, output, str_e, tc_elapsedtime, self.ts_loop), self.tc_start_ts
         )
         if self.showAll:
             self.logger.critical(
@@ -460,8 +465,8 @@ class _TestResult(unittest.TestResult):
         self.skipped_count += 1
         unittest.TestResult.addSkip(self, test, reason)
         output, tc_elapsedtime, ts_elapsedtime = self._restore_output(test)
-        self.result.append(
-            (self.status, test, output, reason, tc_elapsedtime, self.ts_loop)
+        self.add_record(
+            (self.status, test, output, reason, tc_elapsedtime, self.ts_loop), self.tc_start_ts
         )
         if self.showAll:
             self.logger.warning(
@@ -473,6 +478,36 @@ class _TestResult(unittest.TestResult):
             self.logger.warning("\nS")
         self.tc_loop = 0
 
+    def merge_record(self, status, test, output, err, elapsed, ts_loop, metrics=None):
+        """
+        Merge a result record finished by another _TestResult(eg: a worker process)
+        :param status: 0: success; 1: fail; 2: error; 3: skip
+        :param test: unittest.TestCase
+        :param output:
+        :param err: stack trace or skip reason
+        :param elapsed:
+        :param ts_loop:
+        :param metrics: dict(metric -> value) the test emitted
+        :return:
+        """
+        self.testsRun += 1
+        if status == 1:
+            self.failure_count += 1
+            self.failures.append((test, err))
+            self.logger.critical(self.f_msg.format(str(test), ts_loop, elapsed))
+        elif status == 2:
+            self.error_count += 1
+            self.errors.append((test, err))
+            self.logger.critical(self.e_msg.format(str(test), ts_loop, elapsed))
+        elif status == 3:
+            self.skipped_count += 1
+            self.skipped.append((test, err))
+            self.logger.warning(self.s_msg.format(str(test), ts_loop, elapsed))
+        else:
+            self.success_count += 1
+            self.logger.info(self.p_msg.format(str(test), ts_loop, elapsed))
+        self.add_record((status, test, output, err, elapsed, ts_loop), metrics=metrics)
+
     def print_error_list(self, flavour, errors):
         for test, err in errors:
             self.logger.error("{0}: {1}\n{2}".format(
@@ -508,7 +543,18 @@ class StressRunner(object):
                  tc_elapsed_limit=None,
                  save_last_result=False,
                  mail_info=None,
-                 user_args=None
+                 user_args=None,
+                 workers=1,
+                 output_spool_mb=1,
+                 resource_interval=None,
+                 resource_pids=None,
+                 result_sinks=None,
+                 history_db=None,
+                 history_runs=10,
+                 metrics_port=None,
+                 metrics_host='0.0.0.0',
+                 deadline=None,
+                 schedule='suite'
                  ):
         """
         :param report_path: default ./report.html
@@ -530,9 +576,33 @@ class StressRunner(object):
                 port=465,
                 tls = True
                 )
-        :param tc_elapsed_limit: the test case run time limit
+        :param tc_elapsed_limit: loop each test case until it has run for N seconds
         :param save_last_result: Save only the last iteration results if true
         :param user_args: the user inout args
+        :param workers: run the test cases on N worker processes if > 1
+        :param output_spool_mb: the captured output of each test is kept in
+            memory up to N MB, then spooled to a temp file
+        :param resource_interval: sample the host and test processes resources
+            every N seconds while running, None means disabled
+        :param resource_pids: more processes to sample, eg: the service under test
+        :param result_sinks: list of sinks.ResultSink the run summary is published
+            to when finished, eg: [SQLiteSink('results.db'), MySQLSink(...)],
+            a MailSink is added if mail_info
+        :param history_db: the SQLite db of the per-case duration/metrics history,
+            each passed record is compared with the last history_runs runs in
+            the report, and this run is saved into it when finished
+        :param history_runs: compare with the last N runs
+        :param metrics_port: serve the live progress over HTTP on the port while
+            running, /status in JSON and /metrics in Prometheus text format,
+            0 for any free port, None means disabled
+        :param metrics_host: the address the progress server binds
+        :param deadline: the seconds this run must finish in, before each
+            iteration the cases expected(by history_db and this run) to
+            overrun are deferred and reported as skipped, and it is the last
+            iteration, None means no limit
+        :param schedule: the case order of each iteration,
+            suite: the suite order, lpt: the longest expected first
+            higher priority first in both, see scheduler.priority
         """
 
         if test_env is None:
@@ -544,6 +614,31 @@ class StressRunner(object):
         self.verbosity = verbosity
         self.tc_elapsed_limit = tc_elapsed_limit
         self.save_last_result = save_last_result
+        self.workers = workers
+        self.output_spool_mb = output_spool_mb
+        self.resource_interval = resource_interval
+        self.resource_pids = resource_pids or []
+        self.reporter = None
+        self.sampler = None
+        self.result_sinks = list(result_sinks or [])
+        if mail_info:
+            attach = []
+            if user_args is not None and 'attach' in user_args:
+                attach.append(os.path.join(CUR_DIR, user_args.attach))
+            self.result_sinks.append(MailSink(mail_info, attach))
+        self.history_store = HistoryStore(history_db) if history_db else None
+        self.history_runs = history_runs
+        self.comparator = None
+        if self.history_store:
+            self.result_sinks.append(HistorySink(self.history_store))
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.progress_server = None
+        self.deadline = deadline
+        self.schedule = schedule
+        self.scheduler = None
+        if deadline is not None or schedule != 'suite':
+            self.scheduler = DeadlineScheduler(workers=workers, lpt=schedule == 'lpt')
 
         self.title = title + '-' + test_version
         self.description = description
@@ -573,25 +668,73 @@ class StressRunner(object):
         :return:
         """
         tc_loop_limit = 1  # each case run only 1 loop in one iteration
+        self.reporter = IncrementalReporter(self.report_path, self.title,
+                                            self._generate_stylesheet())
+        self.reporter.start(self._generate_heading(self._get_running_attributes()))
+        if self.resource_interval:
+            self.sampler = ResourceSampler(
+                self.resource_interval, [os.getpid()] + list(self.resource_pids),
+                csv_path=os.path.splitext(self.report_path)[0] + '.resources.csv')
+        if self.history_store:
+            try:
+                baseline = self.history_store.load_baseline(self.suite, self.history_runs)
+                self.comparator = RegressionComparator(baseline)
+                if self.scheduler:
+                    self.scheduler.update(median_durations(baseline))
+            except Exception as e:
+                self.logger.warning('Load history from {0} failed: {1}'.format(self.history_store.db_path, e))
         _result = _TestResult(self.logger, self.verbosity, tc_loop_limit,
-                              self.tc_elapsed_limit, self.save_last_result)
+                              self.tc_elapsed_limit, self.save_last_result,
+                              self.output_spool_mb, reporter=self.reporter,
+                              sampler=self.sampler, comparator=self.comparator)
         test_status = 'ERROR'
         retry_flag = True
+        executor = None
+        if self.workers > 1:
+            executor = ParallelExecutor(self.workers, dict(
+                logger=self.logger, verbosity=self.verbosity, tc_loop_limit=tc_loop_limit,
+                tc_elapsed_limit=self.tc_elapsed_limit, save_last_result=self.save_last_result,
+                output_spool_mb=self.output_spool_mb))
+        if self.metrics_port is not None:
+            self.progress_server = ProgressServer(
+                lambda: self.get_progress(_result, executor), self.metrics_port, self.metrics_host)
         # result.ts_loop = 1
         try:
+            if self.progress_server:
+                self.progress_server.start()
+            if executor:
+                executor.start()
+            if self.sampler:
+                if executor:
+                    self.sampler.add_pids(executor.pids)
+                self.sampler.start()
             while retry_flag:
                 # retry test suite by iteration
-                running_test = copy.deepcopy(test)
-                self.logger.info("Test Case List:")
-                for _test in running_test._tests:
-                    self.logger.info(_test)
+                iteration_test = test
+                deferred = False
+                if self.scheduler:
+                    iteration_test, deferred = self._schedule_iteration(test, _result)
+                    if not iteration_test.countTestCases():
+                        self.logger.warning('No test case fits in the deadline, stop iterating')
+                        break
+                if executor:
+                    self.logger.info("Test Case List(run on {0} workers):".format(self.workers))
+                    for _test in iteration_test._tests:
+                        self.logger.info(_test)
+                    executor.run_iteration(iteration_test, _result.ts_loop, _result.merge_record)
+                else:
+                    running_test = rebuild_suite(iteration_test)
+                    self.logger.info("Test Case List:")
+                    for _test in running_test._tests:
+                        self.logger.info(_test)
 
-                running_test(_result)
+                    running_test(_result)
                 _result.ts_loop += 1
                 fail_count = _result.failure_count + _result.error_count
                 test_status = 'FAILED' if fail_count > 0 else 'PASSED'
 
-                if fail_count > 0:
+                if fail_count > 0 or deferred:
+                    # the deadline is near if any case deferred, no more iteration
                     retry_flag = False
                 elif self.iteration == 0 or self.iteration > _result.ts_loop:
                     retry_flag = True
@@ -600,6 +743,9 @@ class StressRunner(object):
 
         except KeyboardInterrupt:
             self.logger.info("Script stoped by user --> ^C")
+            if executor:
+                executor.stop(terminate=True)
+                executor = None
             if (_result.failure_count + _result.error_count) > 0:
                 test_status = 'FAILED'
             elif _result.success_count <= 0:
@@ -607,22 +753,34 @@ class StressRunner(object):
             else:
                 test_status = 'PASSED'
             _result.canceled_count += 1
-            cancled_time = str(datetime.now() - _result.tc_start_time).split('.')[0]
-            n, t, o, e, d, lp = _result.result[-1]
+            cancled_time = format_elapsed(datetime.now() - _result.tc_start_time)
+            n, t, o, e, d, lp = _result.result[-1] if _result.result else (None,) * 6
             if n == 4:
                 _result.result.pop(-1)
-                _result.result.append((n, t, o, e, cancled_time, lp))
+                _result.add_record((n, t, o, e, cancled_time, lp))
         except Exception as e:
             self.logger.error(e)
             self.logger.error('{err}'.format(err=traceback.format_exc()))
-            failed_time = str(datetime.now() - _result.tc_start_time).split('.')[0]
-            n, t, o, e, d, lp = _result.result[-1]
+            if executor:
+                # the queued tasks of the iteration are not wanted any more
+                executor.stop(terminate=True)
+                executor = None
+            failed_time = format_elapsed(datetime.now() - _result.tc_start_time)
+            n, t, o, e, d, lp = _result.result[-1] if _result.result else (None,) * 6
             if n == 4:
                 _result.result.pop(-1)
-                _result.result.append((2, t, o, e, failed_time, lp))
+                _result.add_record((2, t, o, e, failed_time, lp))
         finally:
+            if executor:
+                executor.stop()
+            if self.sampler:
+                self.sampler.stop()
+            if self.progress_server:
+                self.progress_server.stop()
+            capture.uninstall()
             self.logger.info(_result)
             if _result.testsRun < 1:
+                self.reporter.close()
                 return _result
             self.stop_time = datetime.now()
             self.elapsedtime = str(self.stop_time - self.start_time).split('.')[0]
@@ -634,17 +792,17 @@ class StressRunner(object):
             # _result.printErrors()
 
             self.logger.info('=' * 50)
-            for res in _result.result:
+            for stats in _result.case_stats.values():
                 msg = "{stat} - {tc} - Iteration: {iter} " \
-                      "- Last Iteration Elapsed Time: {elapsed}"\
-                    .format(stat=template.STATUS[res[0]], tc=res[1],
-                            iter=res[5], elapsed=res[4])
+                      "- Last Iteration Elapsed Time: {elapsed} - {counts}"\
+                    .format(stat=template.STATUS[stats.last_status], tc=stats.test_id,
+                            iter=stats.last_iteration, elapsed=stats.last_elapsed,
+                            counts=', '.join('{0}: {1}'.format(template.STATUS[n], c)
+                                             for n, c in enumerate(stats.counts) if c))
                 self.logger.info(msg)
-                # res[2].strip('\n') + res[3].strip('\n')
-                err_failure = res[3].strip('\n')
-                if err_failure:
-                    self.logger.error(err_failure)
-            if not _result.result:
+            for _, err_failure in _result.errors + _result.failures:
+                self.logger.error(err_failure.strip('\n'))
+            if not _result.case_stats:
                 for _test in test._tests:
                     self.logger.info(_test)
 
@@ -672,29 +830,6 @@ class StressRunner(object):
             # eg: tar and backup test logs
             # eg: send email
 
-            # send email
-            if self.mail_info:
-                subject = self.title
-                with open(self.report_path, 'rb') as f:
-                    content = f.read()
-                address_from = self.mail_info['m_from']
-                address_to = self.mail_info['m_to']
-                host = self.mail_info['host']
-                user = self.mail_info['user']
-                password = self.mail_info['password']
-                port = self.mail_info['port']
-                tls = self.mail_info['tls']
-                attach = [self.report_path]
-                log_path = self.report_path.replace('.html', '.log')
-                if os.path.getsize(log_path) < 2048 * 1000:
-                    attach.append(log_path)
-                if 'attach' in self.user_args:
-                    attach.append(os.path.join(CUR_DIR, self.user_args.attach))
-
-                send_mail(subject, content, address_from, address_to, attach,
-                          host, user, password, port, tls)
-                print(">> Send mail done.")
-
             # tar logs
             skip_tar_test_suite = ['deploy', 'maintenance', 'tools']
             if (_result.failure_count + _result.error_count) > 0 \
@@ -702,77 +837,146 @@ class StressRunner(object):
                 # TODO
                 pass
 
-            # write test result mysql
-            try:
-                from tlib.utils import util
-                util.remote_scp_put('10.25.119.1', self.report_path, '/sdb/log', 'root', 'password')
-                from tlib.db.pymysql_api import MySQLAPI
-                mysql_obj = MySQLAPI('10.25.119.1', 'test', 'password', port=3306, database='test')
-                insert_sql = '''INSERT INTO test_results 
-                        (Version, Suite, Test, Status, Results, StartTime, Elapsed, Tester, Report) 
-                        values (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        '''
-                data = [
-                    (self.test_version,
-                     self.suite,
-                     self.tc,
-                     test_status,
-                     self.result_overview,
-                     str(self.start_time).split('.')[0],
-                     self.elapsedtime,
-                     self.tester,
-                     os.path.basename(self.report_path)
-                     )
-                ]
-                mysql_obj.insert_update_delete(insert_sql, data)
-            except Exception as e:
-                self.logger.warning(e)
+            # publish the result to sinks: mail, sqlite, mysql ...
+            if self.result_sinks:
+                SinkDispatcher(self.result_sinks).publish(self.get_run_summary(_result, test_status))
 
             return _result, test_status
 
-    @staticmethod
-    def sort_result(result_list):
+    def get_run_summary(self, result, test_status):
+        """
+        The run summary for result sinks
+        :param result: _TestResult
+        :param test_status: PASSED/FAILED/CANCELED/ERROR
+        :return: dict
         """
-        unittest does not seems to run in any particular order.
-        Here at least we want to group them together by class.
+        cases = [self._get_case_summary(stats) for stats in list(result.case_stats.values())]
+        return dict(
+            run_id=str(self.start_time),
+            title=self.title,
+            version=self.test_version,
+            suite=self.suite,
+            test=self.tc,
+            status=test_status,
+            results=self.result_overview,
+            start_time=str(self.start_time).split('.')[0],
+            elapsed=self.elapsedtime,
+            tester=self.tester,
+            report=os.path.basename(self.report_path),
+            report_path=self.report_path,
+            jsonl_path=self.reporter.jsonl_path,
+            cases=cases,
+        )
 
-        :param result_list:
-        :return:
+    def _schedule_iteration(self, test, result):
+        """
+        Plan the cases of the next iteration by the scheduler, the deferred
+        cases are recorded as skipped
+        :param test: unittest.TestSuite
+        :param result: _TestResult
+        :return: (unittest.TestSuite of the planned cases, any case deferred)
         """
+        self.scheduler.update(dict((test_id, stats.pass_elapsed_median)
+                                   for test_id, stats in result.case_stats.items() if stats.counts[0]))
+        budget = None
+        if self.deadline is not None:
+            budget = self.deadline - (datetime.now() - self.start_time).total_seconds()
+        planned, deferred, makespan = self.scheduler.plan(list(iter_cases(test)), budget)
+        self.logger.info('Iteration {0}: {1} cases planned, expected {2:.1f}s{3}'.format(
+            result.ts_loop, len(planned), makespan,
+            '' if budget is None else ', {0:.1f}s left before deadline'.format(budget)))
+        for case, expected in deferred:
+            result.merge_record(3, case, '', 'Deferred: expected {0:.1f}s, {1:.1f}s left before deadline'.format(
+                expected, budget), '0:00:00', result.ts_loop)
+        return unittest.TestSuite(planned), bool(deferred)
 
-        rmap = {}
-        classes = []
-        for n, t, o, e, d, l in result_list:
-            cls = t.__class__
-            if cls not in rmap:
-                rmap[cls] = []
-                classes.append(cls)
-            rmap[cls].append((n, t, o, e, d, l))
-        r = [(cls, rmap[cls]) for cls in classes]
-        return r
+    @staticmethod
+    def _get_case_summary(stats):
+        """
+        :param stats: reporter.CaseStats
+        :return: dict
+        """
+        counts = stats.counts
+        return {
+            'test': stats.test_id,
+            'runs': stats.runs,
+            'pass': counts[0],
+            'fail': counts[1],
+            'error': counts[2],
+            'skip': counts[3],
+            'canceled': counts[4],
+            'elapsed_avg': round(stats.elapsed_avg, 3),
+            'duration_avg': stats.pass_elapsed_avg,
+            'metrics': stats.metrics_avg,
+            'last_status': template.STATUS[stats.last_status],
+        }
+
+    def get_progress(self, result, executor=None):
+        """
+        The live progress of the running test, for the progress server
+        :param result: _TestResult
+        :param executor: ParallelExecutor if running on workers
+        :return: dict
+        """
+        cases = []
+        for stats in list(result.case_stats.values()):
+            case = self._get_case_summary(stats)
+            case['last_iteration'] = stats.last_iteration
+            case['last_elapsed'] = elapsed_seconds(stats.last_elapsed)
+            cases.append(case)
+        if executor:
+            current = executor.pending_cases
+        else:
+            current = [result.current_test] if result.current_test else []
+        resources = None
+        if self.sampler:
+            latest = self.sampler.latest()
+            if latest:
+                resources = dict(time=latest[0], values=latest[1])
+        return dict(
+            title=self.title,
+            version=self.test_version,
+            suite=self.suite,
+            test=self.tc,
+            running=self.stop_time == '',
+            start_time=str(self.start_time).split('.')[0],
+            elapsed_seconds=round((datetime.now() - self.start_time).total_seconds(), 3),
+            iteration=result.ts_loop,
+            counts={
+                'total': result.testsRun,
+                'pass': result.success_count,
+                'fail': result.failure_count,
+                'error': result.error_count,
+                'skip': result.skipped_count,
+                'canceled': result.canceled_count,
+            },
+            current=current,
+            cases=cases,
+            resources=resources,
+            report_path=self.report_path,
+        )
 
     def generate_report(self, result):
+        """
+        Finish the incremental report with the final heading and summary
+        :param result: _TestResult
+        :return:
+        """
         heading_attrs = self._get_heading_attributes(result)
-        stylesheet = self._generate_stylesheet()
         heading = self._generate_heading(heading_attrs)
-        report = self._generate_report(result)
-        output = template.HTML_TEMPLATE % dict(
-            title=saxutils.escape(self.title),
-            stylesheet=stylesheet,
-            heading=heading,
-            report=report,
+        summary = dict(
+            count=str(sum([
+                result.success_count,
+                result.failure_count,
+                result.error_count,
+                result.skipped_count])),
+            Pass=str(result.success_count),
+            fail=str(result.failure_count),
+            error=str(result.error_count),
+            skip=str(result.skipped_count),
+            passrate=self.passrate,
         )
-
-        report_path_dir = os.path.dirname(self.report_path)
-        if not os.path.isdir(report_path_dir):
-            try:
-                os.makedirs(report_path_dir)
-            except OSError as e:
-                raise Exception(e)
-        with open(self.report_path, 'wb') as f:
-            f.write(output.encode('UTF-8'))
-
-        return True
+        return self.reporter.finish(self.title, heading, summary)
 
     def _generate_heading(self, heading_attrs):
         a_lines = []
@@ -838,119 +1042,37 @@ class StressRunner(object):
             ('Report Path', self.report_path),
             ('Test Cmd', self.test_input),
         ]
+        if self.sampler:
+            attr_list.append(('Resources CSV', self.sampler.csv_path))
+        if self.comparator:
+            regressions = ['{0}({1} {2:+.1%})'.format(test_id, metric, delta)
+                           for (test_id, metric), delta in self.comparator.regressions.items()]
+            attr_list.append(('Regressions', ', '.join(regressions) or 'None'))
         attr_list.extend(self.test_env)
         if self.comment:
             attr_list.append(('Comment', self.comment))
 
         return attr_list
 
+    def _get_running_attributes(self):
+        """
+        Report attributes of the progressive report while running
+        :return:
+        """
+        return [
+            ('Tester', self.tester),
+            ('Version', self.test_version),
+            ('Start Time', str(self.start_time).split('.')[0]),
+            ('Status', 'Running'),
+            ('Test Location', '{0}({1})'.format(self.local_hostname, self.local_ip)),
+            ('Report Path', self.report_path),
+            ('Test Cmd', self.test_input),
+        ]
+
     @staticmethod
     def _generate_stylesheet():
         return template.STYLESHEET_TEMPLATE
 
-    def _generate_report(self, result):
-        rows = []
-        sorted_result = self.sort_result(result.result)
-        for cid, (cls, cls_results) in enumerate(sorted_result):
-            # subtotal for a class
-            np = nf = ne = ns = 0
-            for n, t, o, e, d, l in cls_results:
-                if n == 0:
-                    np += 1
-                elif n == 1:
-                    nf += 1
-                elif n == 3:
-                    ns += 1
-                elif n == 4:
-                    np += 1
-                else:
-                    ne += 1
-
-            # format class description
-            if cls.__module__ == "__main__":
-                name = cls.__name__
-            else:
-                name = "%s.%s" % (cls.__module__, cls.__name__)
-            doc = cls.__doc__ and cls.__doc__.split("\n")[0] or ""
-            desc = doc and '%s: %s' % (name, doc) or name
-
-            row = template.REPORT_CLASS_TEMPLATE % dict(
-                style=ne > 0 and 'errorClass' or nf > 0 and 'failClass' or 'passClass',
-                desc=desc,
-                count=np + nf + ne + ns,
-                Pass=np,
-                fail=nf,
-                error=ne,
-                skip=ns,
-                cid='c%s' % (cid + 1),
-            )
-            rows.append(row)
-
-            for tid, (n, t, o, e, d, l) in enumerate(cls_results):
-                self._generate_report_test(rows, cid, tid, n, t, o, e, d, l)
-
-        total_count = sum([
-            result.success_count,
-            result.failure_count,
-            result.error_count,
-            result.skipped_count]
-        )
-        report = template.REPORT_TEMPLATE % dict(
-            test_list=''.join(rows),
-            count=str(total_count),
-            Pass=str(result.success_count),
-            fail=str(result.failure_count),
-            error=str(result.error_count),
-            skip=str(result.skipped_count),
-            passrate=self.passrate,
-        )
-
-        return report
-
-    @staticmethod
-    def _generate_report_test(rows, cid, tid, n, t, o, e, d, l):
-        has_output = bool(o)
-        has_err = bool(e)
-        tid = template.STATUS[n][0].lower() + 't{0}_{1}'.format(cid+1, tid+1)
-        name = t.id().split('.')[-1]
-        doc = t.shortDescription() or ""
-        desc = doc and ('%s: %s' % (name, doc)) or name
-        tmpl = (n == 3 and template.REPORT_SKIP_TEMPLATE or
-                (has_err and template.REPORT_WITH_ERROR_TEMPLATE or
-                 (has_output and template.REPORT_WITH_OUTPUT_TEMPLATE or
-                  template.REPORT_NO_OUTPUT_TEMPLATE
-                  )
-                 )
-                )
-
-        uo = o  # escape(o)
-        ue = e  # escape(e)
-        ud = d  # escape(d)
-        script = template.REPORT_OUTPUT_TEMPLATE % dict(
-            # id = tid,
-            output=saxutils.escape(uo + ue),
-        )
-
-        row_value = dict(
-            tid=tid,
-            Class=(n == 0 and 'none' or 'none'),
-            # (n == 0 and 'hiddenRow' or 'none'),
-            style=(n == 1 and 'failCase' or
-                   (n == 2 and 'errorCase' or
-                    (n == 3 and 'skipCase'
-                     or 'passCase' or 'none'))),
-            desc=desc,
-            iteration=l,
-            elapsedtime=ud,
-            script=script,
-            status=template.STATUS[n],
-        )
-
-        row = tmpl % row_value
-        rows.append(row)
-        if not has_output:
-            return
-
 
 ##############################################################################
 # Facilities for running tests from the command line
@@ -0,0 +1,206 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/18 15:30
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Resource sampler for StressRunner
+A background thread samples host and process CPU, memory, network and disk
+I/O(host by /proc/diskstats, process by /proc/<pid>/io) every interval seconds
+(by tlib.platform.linux) into a RingBuffer, each sample is also appended to a
+CSV file. The report gets min/avg/max/p95 of the samples taken while a test
+case was running.
+"""
+
+import os
+import csv
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from tlib.ds import RingBuffer
+from tlib.platform import linux
+
+# =============================
+# --- Global
+# =============================
+logger = logging.getLogger('StressRunner')
+# field -> unit
+SAMPLE_FIELDS = OrderedDict([
+    ('cpu_busy', '%'),
+    ('cpu_usr', '%'),
+    ('cpu_sys', '%'),
+    ('cpu_iowait', '%'),
+    ('mem_percent', '%'),
+    ('mem_used', 'B'),
+    ('net_sent', 'B/s'),
+    ('net_recv', 'B/s'),
+    ('disk_used', 'B'),
+    ('disk_read', 'B/s'),
+    ('disk_write', 'B/s'),
+    ('disk_read_iops', 'ops/s'),
+    ('disk_write_iops', 'ops/s'),
+    ('proc_cpu', '%'),
+    ('proc_rss', 'B'),
+    ('proc_read', 'B/s'),
+    ('proc_write', 'B/s'),
+])
+MB = 1024.0 * 1024
+
+
+def format_resources(summary):
+    """
+    Text table of a resource summary, B and B/s values in MB and MB/s
+    :param summary: OrderedDict(field -> (min, avg, max, p95))
+    :return:
+    """
+    if not summary:
+        return ''
+    lines = ['Resources(min/avg/max/p95):']
+    for field, values in summary.items():
+        unit = SAMPLE_FIELDS.get(field, '')
+        if unit.startswith('B'):
+            values = [v / MB for v in values]
+            unit = 'M' + unit
+        lines.append('  {0:<15} {1}  {2}'.format(field, '/'.join('{0:.1f}'.format(v) for v in values), unit))
+    return '\n'.join(lines) + '\n'
+
+
+class ResourceSampler(object):
+    """
+    Sample host and process resources in a background thread
+    """
+
+    def __init__(self, interval=1, pids=None, capacity=3600, csv_path=None):
+        """
+        :param interval: sample interval in seconds
+        :param pids: the processes to sample, default the current process
+        :param capacity: the max samples kept in memory
+        :param csv_path: append every sample to the csv file if set
+        """
+        self.interval = interval
+        self.pids = list(pids or [os.getpid()])
+        self.csv_path = csv_path
+        self.ring = RingBuffer(SAMPLE_FIELDS.keys(), capacity)
+        self._processes = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def add_pids(self, pids):
+        for pid in pids:
+            if pid not in self.pids:
+                self.pids.append(pid)
+
+    def _get_process(self, pid):
+        process = self._processes.get(pid)
+        if process is None:
+            process = self._processes[pid] = linux.Process(pid)
+        return process
+
+    def _read_counters(self):
+        """The cumulative counters, rates are the deltas of two reads"""
+        net_sent = net_recv = 0
+        for name, counters in linux.net_io_counters().items():
+            if name != 'lo':
+                net_sent += counters[0]
+                net_recv += counters[1]
+        disk_read = disk_write = disk_read_ops = disk_write_ops = 0
+        for counters in linux.disk_io_counters().values():
+            disk_read_ops += counters[0]
+            disk_write_ops += counters[1]
+            disk_read += counters[2]
+            disk_write += counters[3]
+        proc_cpu = proc_rss = proc_read = proc_write = 0
+        for pid in list(self.pids):
+            try:
+                process = self._get_process(pid)
+                cpu_times = process.get_cpu_times()
+                io_counters = process.get_process_io_counters()
+                proc_cpu += cpu_times.utime + cpu_times.stime
+                proc_rss += process.get_memory_info().rss
+                proc_read += io_counters.rbytes
+                proc_write += io_counters.wbytes
+            except Exception as e:
+                # the process exited
+                logger.debug('Stop sampling process {0}: {1}'.format(pid, e))
+                self.pids.remove(pid)
+                self._processes.pop(pid, None)
+        return dict(time=time.time(), net_sent=net_sent, net_recv=net_recv,
+                    disk_read=disk_read, disk_write=disk_write,
+                    disk_read_ops=disk_read_ops, disk_write_ops=disk_write_ops,
+                    proc_cpu=proc_cpu, proc_rss=proc_rss,
+                    proc_read=proc_read, proc_write=proc_write)
+
+    def _sample(self, previous):
+        cpu = linux.get_cpu_usage(self.interval)  # sleeps interval
+        current = self._read_counters()
+        elapsed = max(current['time'] - previous['time'], 1e-6)
+        mem = linux.get_meminfo()
+        disk = linux.get_disk_usage_all(raw=True)
+
+        def rate(name):
+            return max(current[name] - previous[name], 0) / elapsed
+
+        values = (
+            100 - cpu.idle, cpu.usr, cpu.system, cpu.iowait,
+            mem.percent, mem.used,
+            rate('net_sent'), rate('net_recv'),
+            disk['usedSpace'],
+            rate('disk_read'), rate('disk_write'), rate('disk_read_ops'), rate('disk_write_ops'),
+            rate('proc_cpu') * 100, current['proc_rss'],
+            rate('proc_read'), rate('proc_write'),
+        )
+        return current, values
+
+    def _run(self):
+        csv_file = writer = None
+        if self.csv_path:
+            csv_file = open(self.csv_path, 'w')
+            writer = csv.writer(csv_file)
+            writer.writerow(['time'] + list(SAMPLE_FIELDS.keys()))
+        try:
+            previous = self._read_counters()
+            while not self._stop_event.is_set():
+                try:
+                    previous, values = self._sample(previous)
+                except Exception as e:
+                    logger.warning('Sample resources failed: {0}'.format(e))
+                    self._stop_event.wait(self.interval)
+                    continue
+                self.ring.append(previous['time'], values)
+                if writer:
+                    writer.writerow(['{0:.3f}'.format(previous['time'])] + ['{0:.2f}'.format(v) for v in values])
+                    csv_file.flush()
+        finally:
+            if csv_file:
+                csv_file.close()
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='ResourceSampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(self.interval * 2 + 1)
+            self._thread = None
+
+    def latest(self):
+        """
+        :return: (time, OrderedDict(field -> value)) of the newest sample, None if no sample
+        """
+        return self.ring.latest()
+
+    def summary(self, start, end=None):
+        """
+        min/avg/max/p95 of the samples in [start, end], at least the last
+        interval before end so a short test case still gets a sample
+        :param start: time.time() the test case started
+        :param end: time.time() the test case finished, default now
+        :return: OrderedDict(field -> (min, avg, max, p95))
+        """
+        end = end or time.time()
+        return self.ring.summary(min(start, end - self.interval), end)
@@ -0,0 +1,107 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/28 10:30
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Deadline-aware test scheduling for StressRunner
+Before each iteration the cases are ordered by priority(higher first), then
+by the expected duration(longest first, LPT), and packed onto the workers:
+each case goes to the worker which frees up first. A case that would finish
+after the time left before the deadline is deferred(reported as skipped),
+the smaller ones after it may still fit.
+
+The expected duration of a case is the median of its passed runs in the
+history db, updated by the median of its recent passed runs in this run,
+else default_duration.
+Priority is set on the test method or class:
+    @priority(10)
+    def test_critical(self): ...
+
+Note: cases of different classes may interleave when reordered, so class
+fixtures can run more than once per iteration.
+"""
+
+import heapq
+import statistics
+
+
+def priority(level):
+    """
+    Decorator of a test method, set its schedule priority, default 0
+    :param level: higher runs first
+    :return:
+    """
+
+    def decorator(method):
+        method.priority = level
+        return method
+
+    return decorator
+
+
+def get_priority(test):
+    method = getattr(test, getattr(test, '_testMethodName', ''), None)
+    return getattr(method, 'priority', getattr(test, 'priority', 0))
+
+
+class DeadlineScheduler(object):
+    """
+    Plan each iteration by the expected durations of the cases
+    """
+
+    def __init__(self, durations=None, workers=1, lpt=True, default_duration=None):
+        """
+        :param durations: dict(test id -> expected seconds), eg: history.median_durations
+        :param workers: the number of workers running the cases
+        :param lpt: order by expected duration(longest first) after priority,
+            else keep the suite order
+        :param default_duration: the expected seconds of a case without
+            duration, default the median of the known cases
+        """
+        self.durations = dict(durations or {})
+        self.workers = max(workers, 1)
+        self.lpt = lpt
+        self.default_duration = default_duration
+
+    def update(self, durations):
+        """
+        Update the expected durations, eg: by the passed runs of this run
+        :param durations: dict(test id -> seconds)
+        :return:
+        """
+        self.durations.update(durations)
+
+    def expected(self, test):
+        """The expected seconds of a test case"""
+        duration = self.durations.get(test.id())
+        if duration is not None:
+            return duration
+        if self.default_duration is not None:
+            return self.default_duration
+        return statistics.median(self.durations.values()) if self.durations else 0
+
+    def plan(self, cases, budget=None):
+        """
+        Order the cases and pack them into the time budget
+        :param cases: list of unittest.TestCase, in suite order
+        :param budget: the seconds left before the deadline, None means no limit
+        :return: (the cases to run in order, list of (deferred case, expected
+            seconds), the expected seconds to run the planned cases)
+        """
+        items = [(get_priority(case), self.expected(case), n, case) for n, case in enumerate(cases)]
+        if self.lpt:
+            items.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        else:
+            items.sort(key=lambda item: (-item[0], item[2]))
+
+        planned, deferred = [], []
+        loads = [0.0] * self.workers  # heap of the worker busy seconds
+        for _, expected, _, case in items:
+            load = loads[0]
+            if budget is not None and load + expected > budget:
+                deferred.append((case, expected))
+                continue
+            heapq.heapreplace(loads, load + expected)
+            planned.append(case)
+        return planned, deferred, max(loads)
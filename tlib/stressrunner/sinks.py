@@ -0,0 +1,286 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Time    : 2020/6/19 11:20
+# @Author  : Tao.Xu
+# @Email   : tao.xu2008@outlook.com
+
+"""Result sinks for StressRunner
+When a run finished, the run summary(a dict, see StressRunner.get_run_summary)
+is published to every sink on its own daemon thread. The runner waits for
+each sink at most its timeout, so the teardown takes about as long as the
+slowest sink and a sink which hangs(eg: unreachable host) never blocks exit.
+
+Custom sinks inherit ResultSink and implement publish(summary).
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+from tlib.mail import SmtpServer, Mail
+
+# =============================
+# --- Global
+# =============================
+logger = logging.getLogger('StressRunner')
+RUN_COLUMNS = ('Version', 'Suite', 'Test', 'Status', 'Results', 'StartTime', 'Elapsed', 'Tester', 'Report')
+RUN_KEYS = ('version', 'suite', 'test', 'status', 'results', 'start_time', 'elapsed', 'tester', 'report')
+CASE_COLUMNS = ('TestCase', 'Runs', 'Pass', 'Fail', 'Error', 'Skip', 'Canceled', 'ElapsedAvg', 'LastStatus')
+CASE_KEYS = ('test', 'runs', 'pass', 'fail', 'error', 'skip', 'canceled', 'elapsed_avg', 'last_status')
+CASE_TYPES = ('TEXT', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'REAL', 'TEXT')
+
+
+def close_db(db_obj):
+    """
+    Close the cursor and the connection of a SQLiteAPI/MySQLAPI now, not at
+    garbage collection
+    :param db_obj:
+    :return:
+    """
+    for name in ('cur', 'conn'):
+        handle = getattr(db_obj, name, None)
+        if handle is not None:
+            try:
+                handle.close()
+            except Exception as e:
+                logger.debug('Close db {0} failed: {1}'.format(name, e))
+            setattr(db_obj, name, None)
+
+
+def send_mail(subject, content, address_from, address_to, attach, host, user,
+              password, port, tls):
+    """
+
+    :param subject:
+    :param content:
+    :param address_from:
+    :param address_to:"txu1@test.com;txu2@test.com"
+    :param attach:
+    :param host:"smtp.gmail.com"
+    :param user:"stress@test.com"
+    :param password:"password"
+    :param port:465
+    :param tls:True
+    :return:
+    """
+
+    try:
+        print('preparing mail...')
+        mail = Mail(subject, content, address_from, address_to)
+        print('preparing attachments...')
+        mail.attach(attach)
+
+        print('preparing SMTP server...')
+        smtp = SmtpServer(host, user, password, port, tls)
+        print('sending mail to {0}...'.format(address_to))
+        smtp.sendmail(mail)
+    except Exception as e:
+        raise Exception('Error in sending email. [Exception]%s' % e)
+
+
+def run_row(summary):
+    return tuple(summary[key] for key in RUN_KEYS)
+
+
+def case_rows(summary, run_id=None):
+    rows = [tuple(case[key] for key in CASE_KEYS) for case in summary['cases']]
+    if run_id is not None:
+        rows = [(run_id,) + row for row in rows]
+    return rows
+
+
+class ResultSink(object):
+    """
+    Base class of result sinks
+    """
+    name = 'sink'
+
+    def __init__(self, timeout=60):
+        """
+        :param timeout: the max seconds the runner waits for this sink
+        """
+        self.timeout = timeout
+
+    def publish(self, summary):
+        """
+        Save/send the run summary
+        :param summary: dict, see StressRunner.get_run_summary
+        :return:
+        """
+        raise NotImplementedError
+
+
+class JsonFileSink(ResultSink):
+    """Write the run summary to a json file"""
+    name = 'json'
+
+    def __init__(self, path, timeout=10):
+        super(JsonFileSink, self).__init__(timeout)
+        self.path = path
+
+    def publish(self, summary):
+        path_dir = os.path.dirname(self.path)
+        if path_dir and not os.path.isdir(path_dir):
+            os.makedirs(path_dir)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(summary, f, indent=2, default=str)
+        os.replace(tmp_path, self.path)
+
+
+class SQLiteSink(ResultSink):
+    """Insert the run and its per-case rows(in one batch) into a SQLite db"""
+    name = 'sqlite'
+
+    def __init__(self, db_path, table='test_results', case_table='test_case_results', timeout=30):
+        super(SQLiteSink, self).__init__(timeout)
+        self.db_path = db_path
+        self.table = table
+        self.case_table = case_table
+
+    def publish(self, summary):
+        from tlib.db.sqlite_api import SQLiteAPI
+
+        sqlite_obj = SQLiteAPI(self.db_path, show=False, create_db=True)
+        try:
+            sqlite_obj.create_table('CREATE TABLE IF NOT EXISTS {0} (id INTEGER PRIMARY KEY AUTOINCREMENT, {1})'.format(
+                self.table, ', '.join('{0} TEXT'.format(c) for c in RUN_COLUMNS)))
+            sqlite_obj.create_table('CREATE TABLE IF NOT EXISTS {0} (RunId INTEGER, {1})'.format(
+                self.case_table, ', '.join('{0} {1}'.format(c, t) for c, t in zip(CASE_COLUMNS, CASE_TYPES))))
+            sqlite_obj.cur.execute('INSERT INTO {0} ({1}) values ({2})'.format(
+                self.table, ', '.join(RUN_COLUMNS), ', '.join('?' * len(RUN_COLUMNS))), run_row(summary))
+            run_id = sqlite_obj.cur.lastrowid
+            sqlite_obj.executemany('INSERT INTO {0} (RunId, {1}) values ({2})'.format(
+                self.case_table, ', '.join(CASE_COLUMNS), ', '.join('?' * (len(CASE_COLUMNS) + 1))),
+                case_rows(summary, run_id))
+        finally:
+            close_db(sqlite_obj)
+        return run_id
+
+
+class MySQLSink(ResultSink):
+    """Insert the run into MySQL test_results, the per-case rows(in one batch) if case_table"""
+    name = 'mysql'
+
+    def __init__(self, host, user, password, port=3306, database='test',
+                 table='test_results', case_table=None, timeout=30):
+        super(MySQLSink, self).__init__(timeout)
+        self.host = host
+        self.user = user
+        self.password = password
+        self.port = port
+        self.database = database
+        self.table = table
+        self.case_table = case_table
+
+    def publish(self, summary):
+        from tlib.db.pymysql_api import MySQLAPI
+
+        mysql_obj = MySQLAPI(self.host, self.user, self.password, port=self.port,
+                             database=self.database, connect_timeout=min(self.timeout, 10))
+        try:
+            mysql_obj.cur.execute('INSERT INTO {0} ({1}) values ({2})'.format(
+                self.table, ', '.join(RUN_COLUMNS), ', '.join(['%s'] * len(RUN_COLUMNS))), run_row(summary))
+            run_id = mysql_obj.cur.lastrowid
+            mysql_obj.conn.commit()
+            if self.case_table:
+                mysql_obj.executemany('INSERT INTO {0} (RunId, {1}) values ({2})'.format(
+                    self.case_table, ', '.join(CASE_COLUMNS), ', '.join(['%s'] * (len(CASE_COLUMNS) + 1))),
+                    case_rows(summary, run_id))
+        finally:
+            close_db(mysql_obj)
+        return run_id
+
+
+class ScpSink(ResultSink):
+    """Upload the html report by scp"""
+    name = 'scp'
+
+    def __init__(self, host, remote_path, user, password, key_file=None, timeout=60):
+        super(ScpSink, self).__init__(timeout)
+        self.host = host
+        self.remote_path = remote_path
+        self.user = user
+        self.password = password
+        self.key_file = key_file
+
+    def publish(self, summary):
+        from tlib.utils import util
+
+        return util.remote_scp_put(self.host, summary['report_path'], self.remote_path,
+                                   self.user, self.password, self.key_file, timeout=self.timeout)
+
+
+class MailSink(ResultSink):
+    """Mail the html report, the log(if < 2MB) and more attachments"""
+    name = 'mail'
+
+    def __init__(self, mail_info, attach=None, timeout=120):
+        """
+        :param mail_info: dict(m_from, m_to, host, user, password, port, tls)
+        :param attach: more files to attach
+        :param timeout:
+        """
+        super(MailSink, self).__init__(timeout)
+        self.mail_info = mail_info
+        self.attach = attach or []
+
+    def publish(self, summary):
+        report_path = summary['report_path']
+        with open(report_path, 'rb') as f:
+            content = f.read()
+        attach = [report_path]
+        log_path = report_path.replace('.html', '.log')
+        if os.path.isfile(log_path) and os.path.getsize(log_path) < 2048 * 1000:
+            attach.append(log_path)
+        attach.extend(self.attach)
+
+        send_mail(summary['title'], content, self.mail_info['m_from'], self.mail_info['m_to'], attach,
+                  self.mail_info['host'], self.mail_info['user'], self.mail_info['password'],
+                  self.mail_info['port'], self.mail_info['tls'])
+        print(">> Send mail done.")
+
+
+class SinkDispatcher(object):
+    """
+    Publish a run summary to the sinks concurrently
+    """
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks or [])
+
+    def publish(self, summary):
+        """
+        :param summary:
+        :return: dict(sink name -> 'done' / 'timeout' / error)
+        """
+        status = {}
+        threads = []
+        for sink in self.sinks:
+            name = sink.name
+            while name in status:
+                name += '+'
+            status[name] = 'timeout'
+
+            def _publish(_sink=sink, _name=name):
+                start = time.time()
+                try:
+                    _sink.publish(summary)
+                    status[_name] = 'done'
+                    logger.info('Result sink {0} done in {1:.1f}s'.format(_name, time.time() - start))
+                except Exception as e:
+                    status[_name] = str(e) or repr(e)
+                    logger.warning('Result sink {0} failed: {1}'.format(_name, e))
+
+            thread = threading.Thread(target=_publish, name='ResultSink-{0}'.format(name))
+            thread.daemon = True
+            thread.start()
+            threads.append((name, sink, thread, time.time() + sink.timeout))
+
+        for name, sink, thread, deadline in threads:
+            thread.join(max(deadline - time.time(), 0))
+            if thread.is_alive():
+                logger.warning('Result sink {0} timeout after {1}s, skipped'.format(name, sink.timeout))
+        return status
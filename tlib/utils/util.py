@@ -8,8 +8,13 @@
 import os
 import sys
 import string
+import contextlib
 import random
 import time
+import math
+import mmap
+import threading
+import struct
 import hashlib
 import socket
 import subprocess
@@ -17,7 +22,7 @@ import scp
 import inspect
 import paramiko
 from functools import wraps
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from progressbar import ProgressBar, Percentage, Bar, RotatingMarker, ETA
 try:
     import pexpect
@@ -40,6 +45,14 @@ PY2 = sys.version_info[0] == 2
 ENCODING = None if PY2 else 'utf-8'
 DD_BINARY = os.path.join(os.getcwd(), r'bin\dd\dd.exe') if WINDOWS else 'dd'
 MD5SUM_BINARY = os.path.join(os.getcwd(), r'bin\git\md5sum.exe') if WINDOWS else 'md5sum'
+# --- file hash: read chunk size, mmap the files larger than the threshold
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_MMAP_THRESHOLD = 64 * 1024 * 1024
+# --- random data file write block size
+WRITE_BLOCK_SIZE = 1024 * 1024
+# --- O_DIRECT buffers/offsets alignment
+DIRECT_IO_ALIGN = 4096
+FILE_SIZE_DISTRIBUTIONS = ('uniform', 'fixed', 'log_uniform')
 
 
 # parameters that apply to all methods
@@ -163,6 +176,80 @@ def create_file(path_name, total_size='4k', line_size=128, mode='w+'):
     return file_md5
 
 
+def generate_random_bytes(size, seed=None):
+    """
+    generate random bytes, os.urandom or reproducible by seed
+    :param size: byte
+    :param seed: None: os.urandom, else: random.Random(seed)
+    :return:random bytes
+    """
+
+    if seed is None:
+        return os.urandom(size)
+    rand = random.Random(seed)
+    if hasattr(rand, 'randbytes'):
+        return rand.randbytes(size)
+    return rand.getrandbits(size * 8).to_bytes(size, 'little') if size else b''
+
+
+def write_random_file(path_name, total_size='4k', block_size=WRITE_BLOCK_SIZE, seed=None, mode='w'):
+    """
+    write random data file: one random block generated per file, every block
+    written is the block stamped with (salt, block number) so blocks differ,
+    md5 computed inline while writing, fsync at the end
+    :param path_name:
+    :param total_size:
+    :param block_size: write size of each os.write
+    :param seed: None: random data, else: the same seed writes the same file
+    :param mode: w / w+ truncate the file, a / a+ append to the file,
+        r+ overwrite the existing file from the top, no truncate
+    :return: file md5
+    """
+
+    original_path = os.path.split(path_name)[0]
+    if original_path and not os.path.isdir(original_path):
+        try:
+            os.makedirs(original_path)
+        except OSError as e:
+            if not os.path.isdir(original_path):
+                raise Exception(e)
+
+    size = strsize_to_byte(total_size)
+    block_size = min(strsize_to_byte(block_size), size) or 1
+    block = bytearray(generate_random_bytes(block_size, seed))
+    salt = struct.unpack('<Q', bytes(block[:8].ljust(8, b'\0')))[0]
+    stamp_size = min(16, block_size)
+
+    append = mode.startswith('a')
+    overwrite = mode.startswith('r')
+    flags = os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+    if append:
+        flags |= os.O_CREAT | os.O_APPEND
+    elif not overwrite:
+        flags |= os.O_CREAT | os.O_TRUNC
+    h_md5 = hashlib.md5()
+    fd = os.open(path_name, flags, 0o644)
+    try:
+        view = memoryview(block)
+        written = 0
+        block_num = 0
+        while written < size:
+            block[:stamp_size] = struct.pack('<QQ', salt, block_num)[:stamp_size]
+            chunk = view[:min(block_size, size - written)]
+            h_md5.update(chunk)
+            while chunk:
+                n = os.write(fd, chunk)
+                chunk = chunk[n:]
+            written += min(block_size, size - written)
+            block_num += 1
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    # the inline md5 only covers the data written in append/overwrite mode
+    return hash_md5(path_name) if append or overwrite else h_md5.hexdigest()
+
+
 def dd_read_write(if_path, of_path, bs, count, skip='', seek='', oflag='', timeout=1800):
     """
     dd read write
@@ -204,6 +291,38 @@ def md5sum(f_name):
     return output.split(' ')[0].split('\\')[-1]
 
 
+def hash_file(f_name, algorithms=('md5',), chunk_size=HASH_CHUNK_SIZE):
+    """
+    returns the hashes of the file, read once in chunks and fed to all digests,
+    files larger than HASH_MMAP_THRESHOLD are mmap'ed
+    :param f_name: file full path
+    :param algorithms: hashlib algorithm names, eg: ('md5', 'sha1', 'sha256')
+    :param chunk_size: read chunk size
+    :return:(dict) {algorithm: hexadecimal string}
+    """
+    hashes = [hashlib.new(algorithm) for algorithm in algorithms]
+    with open(f_name, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= HASH_MMAP_THRESHOLD:
+            with contextlib.closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as mm:
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, size, chunk_size):
+                        chunk = view[offset:offset + chunk_size]
+                        for h in hashes:
+                            h.update(chunk)
+                        chunk.release()
+                finally:
+                    view.release()
+        else:
+            buf = bytearray(chunk_size)
+            view = memoryview(buf)
+            for n in iter(lambda: f.readinto(buf), 0):
+                for h in hashes:
+                    h.update(view[:n])
+    return dict((algorithm, h.hexdigest()) for algorithm, h in zip(algorithms, hashes))
+
+
 @retry(tries=2, delay=3)
 def hash_md5(f_name):
     """
@@ -213,11 +332,7 @@ def hash_md5(f_name):
     """
     logger.debug('Get MD5: {0}'.format(f_name))
     try:
-        h_md5 = hashlib.md5()
-        with open(f_name, "rb") as f:
-            for chunk in iter(lambda: f.read(), b""):
-                h_md5.update(chunk)
-        return h_md5.hexdigest()
+        return hash_file(f_name, ('md5',))['md5']
     except Exception as e:
         raise Exception(e)
 
@@ -230,11 +345,7 @@ def hash_sha1(f_name):
     :return:(string) sha1_value 40-bit hexadecimal string.
     """
     try:
-        h_sha1 = hashlib.sha1()
-        with open(f_name, "rb") as f:
-            for chunk in iter(lambda: f.read(), b""):
-                h_sha1.update(chunk)
-        return h_sha1.hexdigest()
+        return hash_file(f_name, ('sha1',))['sha1']
     except Exception as e:
         raise Exception(e)
 
@@ -247,11 +358,7 @@ def hash_sha256(f_name):
     :return: (string) sha256_value 64-bit hexadecimal string.
     """
     try:
-        h_sha256 = hashlib.sha256()
-        with open(f_name, "rb") as f:
-            for chunk in iter(lambda: f.read(), b""):
-                h_sha256.update(chunk)
-        return h_sha256.hexdigest()
+        return hash_file(f_name, ('sha256',))['sha256']
     except Exception as e:
         raise Exception(e)
 
@@ -752,39 +859,152 @@ def centos_enable_root(ip, username='centos', password=None, key_file=None,
 
 # =============== multi thread / process ===============
 
-def multi_dd_w(file_list, file_min_size=1024, file_max_size=1024):
+def get_random_file_size(min_size, max_size, distribution='uniform'):
+    """
+    get a random file size by distribution
+    :param min_size: byte
+    :param max_size: byte
+    :param distribution: uniform / fixed(min_size) / log_uniform(small sizes as likely as big
+        ones per order of magnitude) / callable(min_size, max_size) -> size
+    :return: size byte
+    """
+
+    if callable(distribution):
+        return int(distribution(min_size, max_size))
+    if distribution == 'fixed' or min_size >= max_size:
+        return min_size
+    if distribution == 'log_uniform':
+        return int(math.exp(random.uniform(math.log(max(min_size, 1)), math.log(max_size))))
+    if distribution == 'uniform':
+        return random.randint(min_size, max_size)
+    raise Exception('Not support file size distribution {0}, choices: {1}'.format(
+        distribution, FILE_SIZE_DISTRIBUTIONS))
+
+
+_WRITE_BUFFERS = threading.local()
+
+
+def _get_write_buffer(block_size):
+    """page aligned(mmap) random buffer of the current thread, usable by O_DIRECT"""
+    buf = getattr(_WRITE_BUFFERS, 'buf', None)
+    if buf is None or len(buf) < block_size:
+        buf = mmap.mmap(-1, block_size)
+        buf.write(os.urandom(block_size))
+        _WRITE_BUFFERS.buf = buf
+    return buf
+
+
+def _stamp_block(view, length, salt, block_num):
+    """stamp (salt, block number) into the first bytes of the block so blocks differ"""
+    stamp_size = min(16, length)
+    view[:stamp_size] = struct.pack('<QQ', salt, block_num)[:stamp_size]
+
+
+def direct_write_file(path_name, size, block_size=WRITE_BLOCK_SIZE, direct=False):
     """
-    multi thread dd write
+    write a file with block_size writes from an aligned random buffer, in process,
+    every block written is stamped with (salt, block number) as write_random_file
+    :param path_name:
+    :param size: byte
+    :param block_size: byte, a multiple of DIRECT_IO_ALIGN if direct
+    :param direct: open with O_DIRECT(Linux), the unaligned tail is written without it
+    :return: dict(path, size, writes, elapsed, mb_per_s, iops)
+    """
+
+    block_size = strsize_to_byte(block_size)
+    if direct and block_size % DIRECT_IO_ALIGN:
+        raise Exception('O_DIRECT block size {0} is not aligned to {1}'.format(block_size, DIRECT_IO_ALIGN))
+    view = memoryview(_get_write_buffer(block_size))
+    salt = random.getrandbits(64)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    aligned_size = size - size % DIRECT_IO_ALIGN if direct else size
+    writes = 0
+    start = time.time()
+    fd = os.open(path_name, flags | (getattr(os, 'O_DIRECT', 0) if direct else 0), 0o644)
+    try:
+        written = 0
+        while written < aligned_size:
+            length = min(block_size, aligned_size - written)
+            _stamp_block(view, length, salt, writes)
+            written += os.write(fd, view[:length])
+            writes += 1
+        if written < size:
+            os.close(fd)
+            # not closed again if the open fails, the number may be reused by then
+            fd = None
+            fd = os.open(path_name, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+            os.lseek(fd, written, os.SEEK_SET)
+            while written < size:
+                _stamp_block(view, size - written, salt, writes)
+                written += os.write(fd, view[:size - written])
+                writes += 1
+        os.fsync(fd)
+    finally:
+        if fd is not None:
+            os.close(fd)
+        view.release()
+    elapsed = time.time() - start
+    return dict(path=path_name, size=size, writes=writes, elapsed=elapsed,
+                mb_per_s=size / 1024.0 / 1024 / elapsed if elapsed else 0,
+                iops=writes / elapsed if elapsed else 0)
+
+
+def multi_write_files(file_list, file_min_size=1024, file_max_size=1024, block_size='1M',
+                      direct=False, queue_depth=10, size_distribution='uniform'):
+    """
+    in process writer pool, no fork/exec per file
     :param file_list: file full path name list
     :param file_min_size:
     :param file_max_size:
-    :return:
+    :param block_size: write size of each os.write
+    :param direct: write with O_DIRECT
+    :param queue_depth: number of files written in parallel
+    :param size_distribution: see get_random_file_size
+    :return: dict(files: per file results, failed, size, writes, elapsed, mb_per_s, iops)
     """
 
     f_min_size = strsize_to_byte(file_min_size)
     f_max_size = strsize_to_byte(file_max_size)
-    block_size_list = ['512', '1k', '4k', '16k', '64k', '512k', '1M']
-
-    bs = random.choice(block_size_list)
-    bs_size = strsize_to_byte(bs)
-    i_path = '/dev/random' if WINDOWS else '/dev/urandom'
 
-    pool = ThreadPoolExecutor(max_workers=10)
+    start = time.time()
+    pool = ThreadPoolExecutor(max_workers=queue_depth)
     futures = []
     for f_path_name in file_list:
-        rand_f_size = random.randint(f_min_size, f_max_size)
-        # logger.debug('FILE SIZE: %s byte' % str(rand_f_size))
-        if rand_f_size < 1024*1024:
-            bs = rand_f_size
-            dd_count = 1
-        else:
-            dd_count = rand_f_size // bs_size
-        futures.append(pool.submit(dd_read_write, i_path, f_path_name, bs, str(dd_count)))
-
+        rand_f_size = get_random_file_size(f_min_size, f_max_size, size_distribution)
+        futures.append(pool.submit(direct_write_file, f_path_name, rand_f_size, block_size, direct))
     pool.shutdown()
-    future_result = [future.result() for future in futures]
-    result = False if False in future_result else True
-    return result
+
+    files, failed = [], 0
+    for future in futures:
+        try:
+            files.append(future.result())
+        except Exception as e:
+            logger.error(e)
+            failed += 1
+    elapsed = time.time() - start
+    size = sum(f['size'] for f in files)
+    writes = sum(f['writes'] for f in files)
+    summary = dict(files=files, failed=failed, size=size, writes=writes, elapsed=elapsed,
+                   mb_per_s=size / 1024.0 / 1024 / elapsed if elapsed else 0,
+                   iops=writes / elapsed if elapsed else 0)
+    logger.info('Write {0} files({1} failed), {2} bytes, {3:.2f} MB/s, {4:.0f} IOPS'.format(
+        len(files), failed, size, summary['mb_per_s'], summary['iops']))
+    return summary
+
+
+def multi_dd_w(file_list, file_min_size=1024, file_max_size=1024):
+    """
+    multi thread dd write, by the in process writer pool
+    :param file_list: file full path name list
+    :param file_min_size:
+    :param file_max_size:
+    :return:
+    """
+
+    block_size_list = ['512', '1k', '4k', '16k', '64k', '512k', '1M']
+    bs = random.choice(block_size_list)
+    summary = multi_write_files(file_list, file_min_size, file_max_size, bs)
+    return summary['failed'] == 0
 
 
 def multi_xls_w():
@@ -794,7 +1014,7 @@ def multi_xls_w():
 
 def multi_file_w(file_list, file_min_size=1024, file_max_size=1024, mode='w+'):
     """
-    Multi Write files by "with open as f: f.write()"
+    Multi Write random data files by write_random_file
     r 只能读
     r+ 可读可写 不会创建不存在的文件 从顶部开始写 会覆盖之前此位置的内容
     w+ 可读可写 如果文件存在 则覆盖整个文件不存在则创建
@@ -816,7 +1036,7 @@ def multi_file_w(file_list, file_min_size=1024, file_max_size=1024, mode='w+'):
     for f_path_name in file_list:
         rand_f_size = random.randint(f_min_size, f_max_size)
         # logger.debug('FILE SIZE: %s byte' % str(rand_f_size))
-        futures.append(pool.submit(create_file, f_path_name, rand_f_size, 128, mode))
+        futures.append(pool.submit(write_random_file, f_path_name, rand_f_size, WRITE_BLOCK_SIZE, None, mode))
 
     pool.shutdown()
     future_result = [future.result() for future in futures]
@@ -824,23 +1044,45 @@ def multi_file_w(file_list, file_min_size=1024, file_max_size=1024, mode='w+'):
     return result
 
 
+def multi_hash_files(file_list, algorithms=('md5',), max_workers=8,
+                     chunk_size=HASH_CHUNK_SIZE):
+    """
+    hash files on a thread pool (hashlib releases the GIL), at most
+    max_workers * 2 files are in flight whatever the file_list length
+    :param file_list: iterable of file full path
+    :param algorithms: hashlib algorithm names
+    :param max_workers:
+    :param chunk_size:
+    :return: generator of (file full path, {algorithm: hexadecimal string}), in completion order
+    """
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {}
+    try:
+        for f_name in file_list:
+            if len(futures) >= max_workers * 2:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield futures.pop(future), future.result()
+            futures[pool.submit(hash_file, f_name, algorithms, chunk_size)] = f_name
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future.result()
+    finally:
+        pool.shutdown()
+
+
 def multi_get_md5(file_list):
     """
     get file_list md5
     :param file_list:
-    :return:
+    :return: dict {file_name: md5}
     """
 
-    pool = ThreadPoolExecutor(max_workers=5)
-    results = pool.map(get_file_md5, file_list)
-    pool.shutdown()
-
     files_md5 = {}
-    for rtn in results:
-        if not rtn:
-            return False
-        else:
-            files_md5.update(rtn)
+    for f_name, hashes in multi_hash_files(file_list, ('md5',)):
+        files_md5[os.path.split(f_name)[-1]] = hashes['md5']
 
     return files_md5
 
@@ -30,6 +30,7 @@ from pyVmomi import vim
 from pyVmomi import vmodl
 
 from tlib import log
+from tlib import decorators
 from tlib.retry import retry
 from tlib.utils import util
 from tlib.ds import sort_dict
@@ -269,6 +270,7 @@ class VsphereApi(object):
 
         return vm
 
+    @decorators.Memoize(expire_sec=300)
     def get_vm_by_name(self, name):
         """
         get vm object by name
@@ -513,6 +515,9 @@ class VsphereApi(object):
                 raise Exception('Destroy vm {0} failed'.format(vm_name))
             logger.info('Destroy vm {0} failed'.format(vm_name))
             return True
+        finally:
+            # the cached vm may be gone
+            self.get_vm_by_name.cache_delete(self, vm_name)
 
     def power_ops(self, vm, ops):
         support_power_opt = [
@@ -1170,6 +1175,8 @@ class VsphereApi(object):
         task = vm_template.Clone(folder=destfolder, name=new_vm_name,
                                  spec=clonespec)
         self.wait_for_tasks([task])
+        # a cached vm of the same name is gone
+        self.get_vm_by_name.cache_delete(self, new_vm_name)
 
         vm = self.get_obj([vim.VirtualMachine], new_vm_name)
         self.add_nic(vm, nic_network)